@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Scaling benchmarks for the pipeline stages on synthetic corpora.
+
+For every scale a synthetic transliteration is generated (see
+synthetic_corpus.py) in a scratch directory laid out like the repository
+(data/takeshi.txt, logs/). Every stage then runs in its own fresh process
+with that directory as working directory, so wall time, CPU time and peak
+RSS belong to that stage alone. The analysis stages run compute-only
+(plot=False) unless --plot is given; each gets a new Workspace and starts
+with the on-disk caches removed (see clear_caches), so corpus loading,
+derived tables and glyph/embedding artifacts are part of its cost in every
+repeat.
+
+Results are written as JSON (one record per scale and stage); --compare
+prints the ratios against an earlier result file.
+
+Usage:
+    python -m benchmarks.run_benchmarks                      # scales 1 10 100
+    python -m benchmarks.run_benchmarks --scales 1 10 --repeat 3 --compare logs/benchmarks/<earlier>.json
+"""
+
+import argparse
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.synthetic_corpus import generate
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = ROOT / "logs" / "benchmarks"
+REGRESSION_RATIO = 1.2
+
+# name -> (module, function); parse_file and clean_token are the in-memory parser on its own
+STAGES = {
+    "clean_token": ("benchmarks.run_benchmarks", "bench_clean_token"),
+    "parse_file": ("benchmarks.run_benchmarks", "bench_parse_file"),
+    "parse": ("benchmarks.run_benchmarks", "bench_parse"),
+    "basic_statistics": ("exploratory_analysis.basic_statistics", "main"),
+    "word_ocurrence": ("exploratory_analysis.word_ocurrence", "main"),
+    "structural_patterns": ("exploratory_analysis.structural_patterns", "main"),
+    "word_embeddings": ("embeddings_and_models.word_embeddings", "main"),
+}
+PARSE_STAGES = {"clean_token", "parse_file", "parse"}
+# Caches written by the analysis stages, relative to the benchmark directory
+CACHE_GLOBS = ["data/cache", "data/*/glyphs_*.npz", "data/*/morphology_*.npz", "data/embeddings"]
+
+
+def bench_clean_token():
+    from parse_takeshi import INPUT, clean_token
+    words = INPUT.read_text(encoding="utf-8").split()
+    for w in words:
+        clean_token(w)
+    return len(words)
+
+
+def bench_parse_file():
+    from parse_takeshi import INPUT, parse_file
+    return len(parse_file(INPUT)[0])
+
+
+def bench_parse():
+    # full=True: every repeat must parse, not stop at "Up to date" after the first one
+    from parse_takeshi import main
+    main(full=True)
+
+
+def clear_caches(workdir: Path):
+    """
+    Remove every on-disk cache the analysis stages keep (embedding artifacts,
+    glyph encodings, morphology, saved vectors and layout), so each run of
+    an analysis stage starts cold instead of timing a cache hit left by an
+    earlier repeat or stage.
+    """
+    for pattern in CACHE_GLOBS:
+        for path in Path(workdir).glob(pattern):
+            if path.is_dir():
+                shutil.rmtree(path)
+            else:
+                path.unlink()
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def _run_stage(workdir, stage, plot):
+    """Runs in a fresh worker process; returns the measurements of one stage."""
+    sys.path.insert(0, str(ROOT))
+    os.chdir(workdir)
+    module_name, func_name = STAGES[stage]
+    func = getattr(importlib.import_module(module_name), func_name)
+    if plot:
+        import matplotlib
+        matplotlib.use("Agg")
+    baseline = _peak_rss_mb()
+    wall, cpu = time.perf_counter(), time.process_time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if stage in PARSE_STAGES:
+            items = func()
+        else:
+            func(plot=plot)
+            items = None
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    if stage == "parse":
+        items = json.loads(Path("data/takeshi_corpus/meta.json").read_text(encoding="utf-8"))["n_tokens"]
+    return {"wall_s": wall, "cpu_s": cpu, "items": items,
+            "baseline_rss_mb": baseline, "peak_rss_mb": _peak_rss_mb()}
+
+
+def run_scale(scale, stages, plot=False, seed=0, repeat=1, keep_dir=None):
+    records = []
+    with tempfile.TemporaryDirectory(prefix=f"voynich_bench_x{scale}_") as tmp:
+        workdir = Path(keep_dir or tmp)
+        (workdir / "logs").mkdir(parents=True, exist_ok=True)
+        start = time.perf_counter()
+        info = generate(workdir / "data" / "takeshi.txt", scale, source=ROOT / "data" / "takeshi.txt", seed=seed)
+        print(f"x{scale}: {info['words']} words, {info['lines']} lines "
+              f"(generated in {time.perf_counter() - start:.1f}s)")
+        # analysis stages need the corpus even when only they are benchmarked
+        needed = stages if "parse" in stages or not set(stages) - PARSE_STAGES else ["parse"] + stages
+        for stage in needed:
+            runs = repeat if stage in stages else 1
+            m = None
+            for _ in range(runs):  # best of `repeat` runs, each in a fresh process and with cold caches
+                if stage not in PARSE_STAGES:
+                    clear_caches(workdir)
+                with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                    run = pool.submit(_run_stage, str(workdir), stage, plot).result()
+                if m is None or run["wall_s"] < m["wall_s"]:
+                    m = run
+            if stage not in stages:
+                continue
+            rate = m["items"] / m["wall_s"] if m["items"] and m["wall_s"] > 0 else None
+            records.append(dict(scale=scale, stage=stage, words=info["words"], items_per_s=rate, **m))
+            print(f"  {stage:22} {m['wall_s']:8.2f}s wall {m['cpu_s']:8.2f}s cpu "
+                  f"{m['peak_rss_mb']:8.1f} MB peak RSS")
+    return records
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "cpus": os.cpu_count(), "commit": commit, "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+
+def compare(records, baseline_path):
+    """Print wall-time / peak-RSS ratios against an earlier result file."""
+    old = {(r["scale"], r["stage"]): r for r in json.loads(Path(baseline_path).read_text())["results"]}
+    print(f"\nCompared with {baseline_path}:")
+    for r in records:
+        before = old.get((r["scale"], r["stage"]))
+        if before is None:
+            continue
+        time_ratio = r["wall_s"] / max(before["wall_s"], 1e-9)
+        mem_ratio = r["peak_rss_mb"] / max(before["peak_rss_mb"], 1e-9)
+        flag = "  <-- slower" if time_ratio > REGRESSION_RATIO else ""
+        print(f"  x{r['scale']:<4} {r['stage']:22} time x{time_ratio:5.2f}  memory x{mem_ratio:5.2f}{flag}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic corpora")
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--plot", action="store_true", help="include the plots (and t-SNE) in the analysis stages")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage; the fastest one is kept")
+    parser.add_argument("--out", type=Path, help="result file (default: logs/benchmarks/<time>.json)")
+    parser.add_argument("--compare", type=Path, help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    records = []
+    for scale in args.scales:
+        records.extend(run_scale(scale, args.stages, plot=args.plot, seed=args.seed, repeat=args.repeat))
+
+    out = args.out or RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"environment": environment(), "plot": args.plot, "repeat": args.repeat,
+                               "results": records}, indent=2),
+                   encoding="utf-8")
+    print(f"\nResults: {out}")
+    if args.compare:
+        compare(records, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Synthetic Voynich-like transliterations in the takeshi.txt format.
+
+generate() rewrites the real file `scale` times over: every folio keeps its
+header and position, and its lines are repeated `scale` times with fresh
+line numbers. Each synthetic line has the length (in words) of the line it
+copies; its words are drawn from the same folio's words (so sections and
+Currier languages keep their vocabulary and the markup rate is preserved),
+and a fraction of them are new words generated by a character Markov chain
+fitted on the whole file, so the vocabulary keeps growing with the corpus.
+
+Usage:
+    python -m benchmarks.synthetic_corpus --scale 10 data/takeshi_x10.txt
+"""
+
+import argparse
+import re
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+from parse_takeshi import INPUT, TAG_LINE_RE
+
+NEW_WORD_RATE = 0.05
+WORD_SPLIT_RE = re.compile(r'[.\s]+')
+LETTERS_RE = re.compile(r'[a-z]+')
+
+
+def read_folios(path: Path):
+    """[(folio, header_line, [(unit, scribal, [words])...])] in file order."""
+    folios, by_name = [], {}
+    with path.open("r", encoding="utf-8", errors="replace") as fh:
+        for raw_line in fh:
+            m = TAG_LINE_RE.match(raw_line.rstrip("\n"))
+            if not m:
+                continue
+            tag, content = m.group("tag").strip(), m.group("content").strip()
+            left, _, scribal = tag.partition(";")
+            parts = left.split(".")
+            folio = parts[0]
+            if folio not in by_name:
+                by_name[folio] = (folio, f"<{folio}>", [])
+                folios.append(by_name[folio])
+            if len(parts) < 3 or not content:
+                continue
+            words = [w for w in WORD_SPLIT_RE.split(content) if w]
+            if words:
+                by_name[folio][2].append((parts[1], scribal or "H", words))
+    return folios
+
+
+class WordModel:
+    """First-order character Markov chain over lowercase letters ('^' starts, '$' ends a word)."""
+
+    def __init__(self, words):
+        letters = sorted({c for w in words for c in w})
+        self.symbols = ["$"] + letters
+        index = {c: i for i, c in enumerate(self.symbols)}
+        n = len(self.symbols)
+        counts = np.zeros((n, n))  # row 0 doubles as the start state
+        for w in words:
+            ids = [index[c] for c in w]
+            for a, b in zip([0] + ids, ids + [0]):
+                counts[a, b] += 1
+        counts[0, 0] = 0  # no empty words
+        self.cumulative = np.cumsum(counts, axis=1) / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+
+    def sample(self, rng, max_length=12):
+        state, out = 0, []
+        for _ in range(max_length):
+            state = int(np.searchsorted(self.cumulative[state], rng.random(), side="right"))
+            state = min(state, len(self.symbols) - 1)
+            if state == 0:
+                break
+            out.append(self.symbols[state])
+        return "".join(out)
+
+
+def generate(out_path: Path, scale: int = 1, source: Path = INPUT, seed: int = 0,
+             new_word_rate: float = NEW_WORD_RATE):
+    """Write a transliteration `scale` times the size of `source`; returns line/word counts."""
+    rng = np.random.default_rng(seed)
+    folios = read_folios(source)
+    model = WordModel([m for _, _, lines in folios for _, _, words in lines
+                       for w in words for m in LETTERS_RE.findall(w.lower())])
+    n_lines = n_words = 0
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    with out_path.open("w", encoding="utf-8") as out:
+        for folio, header, lines in folios:
+            out.write(header + "\n")
+            pool = np.array([w for _, _, words in lines for w in words] or [model.sample(rng)], dtype=object)
+            line_no = defaultdict(int)
+            for _ in range(scale):
+                for unit, scribal, words in lines:
+                    k = len(words)
+                    picked = pool[rng.integers(0, len(pool), size=k)]
+                    for i in np.flatnonzero(rng.random(k) < new_word_rate):
+                        picked[i] = model.sample(rng) or picked[i]
+                    line_no[folio] += 1
+                    out.write(f"<{folio}.{unit}.{line_no[folio]};{scribal}>".ljust(19) + ".".join(picked) + "\n")
+                    n_lines += 1
+                    n_words += k
+    return {"path": str(out_path), "scale": scale, "lines": n_lines, "words": n_words}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic Voynich-like transliteration")
+    parser.add_argument("out", type=Path)
+    parser.add_argument("--scale", type=int, default=1, help="size as a multiple of data/takeshi.txt")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    info = generate(args.out, args.scale, seed=args.seed)
+    print(f"{info['path']}: {info['lines']} lines, {info['words']} words")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Compact columnar corpus written next to the word-level CSV.
+
+Layout of a corpus directory (every array is a plain .npy file, so it can be
+memory-mapped with np.load(..., mmap_mode="r")):
+ - tokens.npy        flat int32 token-id stream for the whole transliteration
+ - line_offsets.npy  int64, len = n_lines + 1; line i is tokens[off[i]:off[i+1]]
+ - line_folio.npy    int32 folio id of every line
+ - vocab, folios, line_meta_left, line_scribal
+                     string tables stored Arrow-style as a utf-8 byte blob
+                     (<name>.npy) plus int64 offsets (<name>_offsets.npy)
+ - meta.json         source file and counts
+ - folio_checksums.json
+                     written by parse_takeshi.stream_file: checksum and line
+                     range of every folio block of the source (parse summaries
+                     in folio_summaries.json), so unchanged folios can be
+                     copied instead of parsed again
+"""
+
+import hashlib
+import json
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+CORPUS_DIR = Path("data/takeshi_corpus")
+STORE_DIR = Path("data/corpora")
+MANIFEST_NAME = "sources.json"
+TOKEN_DTYPE = np.int32
+TOKEN_FLUSH_SIZE = 65536
+
+
+def split_words(cleaned_word):
+    """Split a cleaned CSV cell ("word.word.word") into its words."""
+    if not cleaned_word:
+        return []
+    return [w for w in str(cleaned_word).split('.') if w]
+
+
+def _write_npy_from_raw(raw_path: Path, out_path: Path, dtype, count: int):
+    header = {
+        "descr": np.lib.format.dtype_to_descr(np.dtype(dtype)),
+        "fortran_order": False,
+        "shape": (count,),
+    }
+    with out_path.open("wb") as out:
+        np.lib.format.write_array_header_1_0(out, header)
+        with raw_path.open("rb") as raw:
+            shutil.copyfileobj(raw, out)
+
+
+def save_strings(out_dir: Path, name: str, values):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+    np.save(out_dir / f"{name}.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+    np.save(out_dir / f"{name}_offsets.npy", offsets)
+
+
+def load_strings(corpus_dir: Path, name: str):
+    blob = np.load(corpus_dir / f"{name}.npy", mmap_mode="r").tobytes()
+    offsets = np.load(corpus_dir / f"{name}_offsets.npy").tolist()
+    return np.array([blob[a:b].decode("utf-8") for a, b in zip(offsets[:-1], offsets[1:])], dtype=str)
+
+
+class CorpusWriter:
+    """
+    Builds the columnar corpus from the parser's row stream.
+
+    Token ids are spilled to disk in blocks, so only the vocabulary and the
+    (much smaller) line table are kept in memory.
+    """
+
+    def __init__(self, out_dir: Path = CORPUS_DIR, source=None, scheme=None):
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self.source = str(source) if source is not None else None
+        self.scheme = scheme
+        self.vocab = {}
+        self.folios = {}
+        self.line_folio = []
+        self.line_meta_left = []
+        self.line_scribal = []
+        self.line_offsets = [0]
+        self.n_tokens = 0
+        self._pending = []
+        self._raw_path = self.out_dir / "tokens.bin.tmp"
+        self._raw = self._raw_path.open("wb")
+
+    def observe(self, rows):
+        """Pass rows through unchanged while recording them in the corpus."""
+        for row in rows:
+            self.add_row(row)
+            yield row
+
+    def add_row(self, row):
+        # word_index restarts at 1 on every source line and is None for lines without words
+        if row["word_index"] is None or row["word_index"] == 1:
+            self._start_line(row)
+        # Tokens are unified words, so the scheme's case rule (Scheme.unify) holds in every corpus
+        for w in split_words(row["unified_word"]):
+            tid = self.vocab.setdefault(w, len(self.vocab))
+            self._pending.append(tid)
+        if len(self._pending) >= TOKEN_FLUSH_SIZE:
+            self._flush()
+
+    def copy_lines(self, corpus, start: int, end: int):
+        """
+        Append lines start..end-1 of another Corpus (usually the previous version
+        of this one) without parsing them again. Words and folios get their ids
+        in order of first appearance, as in add_row, so splicing old lines and
+        new rows gives the same arrays as parsing everything.
+        """
+        offsets = np.asarray(corpus.line_offsets)
+        ids = np.asarray(corpus.tokens[offsets[start]:offsets[end]])
+        old_ids, first = np.unique(ids, return_index=True)
+        for w in corpus.vocab[old_ids[np.argsort(first, kind="stable")]].tolist():
+            self.vocab.setdefault(w, len(self.vocab))
+        remap = np.array([self.vocab[w] for w in corpus.vocab[old_ids].tolist()], dtype=TOKEN_DTYPE)
+        new_ids = remap[np.searchsorted(old_ids, ids)].tolist()
+        lengths = np.diff(offsets[start:end + 1]).tolist()
+        folios = corpus.folios[np.asarray(corpus.line_folio[start:end])].tolist()
+        meta_left = corpus.line_meta_left[start:end].tolist()
+        scribal = corpus.line_scribal[start:end].tolist()
+        pos = 0
+        for i, length in enumerate(lengths):
+            self._start_line({"folio": folios[i], "meta_left": meta_left[i], "scribal": scribal[i]})
+            self._pending.extend(new_ids[pos:pos + length])
+            pos += length
+            if len(self._pending) >= TOKEN_FLUSH_SIZE:
+                self._flush()
+
+    @property
+    def n_lines(self):
+        return len(self.line_folio)
+
+    def _start_line(self, row):
+        if len(self.line_folio) > 0:
+            self.line_offsets.append(self.n_tokens + len(self._pending))
+        fid = self.folios.setdefault(row["folio"], len(self.folios))
+        self.line_folio.append(fid)
+        self.line_meta_left.append(row["meta_left"] or "")
+        self.line_scribal.append(row["scribal"] or "")
+
+    def _flush(self):
+        if self._pending:
+            np.asarray(self._pending, dtype=TOKEN_DTYPE).tofile(self._raw)
+            self.n_tokens += len(self._pending)
+            self._pending = []
+
+    def close(self):
+        self._flush()
+        self._raw.close()
+        if self.line_folio:
+            self.line_offsets.append(self.n_tokens)
+
+        _write_npy_from_raw(self._raw_path, self.out_dir / "tokens.npy", TOKEN_DTYPE, self.n_tokens)
+        self._raw_path.unlink()
+
+        vocab = sorted(self.vocab, key=self.vocab.get)
+        folios = sorted(self.folios, key=self.folios.get)
+        save_strings(self.out_dir, "vocab", vocab)
+        save_strings(self.out_dir, "folios", folios)
+        save_strings(self.out_dir, "line_meta_left", self.line_meta_left)
+        save_strings(self.out_dir, "line_scribal", self.line_scribal)
+        np.save(self.out_dir / "line_offsets.npy", np.array(self.line_offsets, dtype=np.int64))
+        np.save(self.out_dir / "line_folio.npy", np.array(self.line_folio, dtype=np.int32))
+
+        meta = {
+            "source": self.source,
+            "n_tokens": self.n_tokens,
+            "n_lines": len(self.line_folio),
+            "n_types": len(vocab),
+            "n_folios": len(folios),
+        }
+        if self.scheme is not None:
+            meta["scheme"] = self.scheme
+        (self.out_dir / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+        return meta
+
+
+class Corpus:
+    """
+    Read-only view over a corpus directory. Numeric arrays are memory-mapped by
+    default; the (small) string tables are decoded once on load.
+    """
+
+    def __init__(self, corpus_dir: Path = CORPUS_DIR, mmap: bool = True):
+        self.path = Path(corpus_dir)
+        mode = "r" if mmap else None
+        load = lambda name: np.load(self.path / f"{name}.npy", mmap_mode=mode)
+        self.tokens = load("tokens")
+        self.line_offsets = load("line_offsets")
+        self.line_folio = load("line_folio")
+        self.line_meta_left = load_strings(self.path, "line_meta_left")
+        self.line_scribal = load_strings(self.path, "line_scribal")
+        self.vocab = load_strings(self.path, "vocab")
+        self.folios = load_strings(self.path, "folios")
+        self.meta = json.loads((self.path / "meta.json").read_text(encoding="utf-8"))
+
+    @property
+    def n_lines(self):
+        return len(self.line_folio)
+
+    def line_lengths(self):
+        return np.diff(self.line_offsets)
+
+    def token_line(self):
+        """Line index of every token."""
+        return np.repeat(np.arange(self.n_lines, dtype=np.int32), self.line_lengths())
+
+    def token_folio(self):
+        """Folio id of every token."""
+        return np.asarray(self.line_folio)[self.token_line()]
+
+    def words(self):
+        """Token stream as an array of strings."""
+        return self.vocab[self.tokens]
+
+    def lines(self):
+        """Token-id arrays per line (views into the token stream)."""
+        return np.split(np.asarray(self.tokens), np.asarray(self.line_offsets)[1:-1])
+
+    def word_counts(self):
+        return np.bincount(self.tokens, minlength=len(self.vocab))
+
+    def folio_digests(self):
+        """Hash of the lines and words of every folio, for caches kept per folio."""
+        digests = [hashlib.sha256() for _ in range(len(self.folios))]
+        for folio, ids in zip(np.asarray(self.line_folio).tolist(), self.lines()):
+            digests[folio].update((" ".join(self.vocab[ids].tolist()) + "\n").encode("utf-8"))
+        return [h.hexdigest() for h in digests]
+
+
+def load_corpus(corpus_dir: Path = CORPUS_DIR, mmap: bool = True) -> Corpus:
+    if not (Path(corpus_dir) / "meta.json").exists():
+        raise FileNotFoundError(f"Corpus not found: {corpus_dir} (run parse_takeshi.py first)")
+    return Corpus(corpus_dir, mmap=mmap)
+
+
+# --- multi-source store (see ingest.py) ---------------------------------
+# One corpus directory per source under STORE_DIR, plus sources.json with
+# the scheme, input file and checksum of each.
+
+def load_manifest(store_dir: Path = STORE_DIR) -> dict:
+    path = Path(store_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def save_manifest(manifest: dict, store_dir: Path = STORE_DIR):
+    Path(store_dir).mkdir(parents=True, exist_ok=True)
+    (Path(store_dir) / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def load_source(name: str, store_dir: Path = STORE_DIR, mmap: bool = True) -> Corpus:
+    """The corpus of one ingested source."""
+    if name not in load_manifest(store_dir):
+        raise KeyError(f"Unknown source {name!r} in {store_dir} (run ingest.py first)")
+    return load_corpus(Path(store_dir) / name, mmap=mmap)
+
+
+def load_sources(store_dir: Path = STORE_DIR, mmap: bool = True) -> dict:
+    """{source name: Corpus} for every ingested source."""
+    return {name: load_corpus(Path(store_dir) / name, mmap=mmap) for name in sorted(load_manifest(store_dir))}
@@ -0,0 +1,377 @@
+"""
+Simulated-annealing search over glyph -> letter substitution mappings.
+
+A hypothesis maps every EVA glyph to one letter of a reference language
+(several glyphs may share a letter); the word separator always maps to a
+space. It is scored by a character n-gram model of a local reference text
+(ngram_lm.NgramLM, Kneser-Ney), precomputed once into a dense table
+L[code of n letters] = log2 P(last | previous n-1) and cached in
+data/cache/decipherment/.
+
+The Voynich text is never decoded during the search. Its glyph n-grams are
+counted once (types + counts), and a mapping's n-gram score is
+sum(count * L[mapped n-gram]) / total, i.e. minus the cross-entropy in bits
+per n-gram. Since several glyphs may share a letter, that alone is maximized
+by collapsing the text onto a few frequent letters ("rered ered"), so the
+score also subtracts `unigram_weight` x KL(decoded letter frequencies ||
+reference letter frequencies). A move (re-map one glyph, or swap two glyphs'
+letters) only touches the n-gram types containing those glyphs and at most
+two letter totals, so its delta is computed from those slices alone.
+
+Independent restarts run in a process pool. Each one checkpoints its state
+(mapping, best hypotheses, RNG state) every few thousand steps, so an
+interrupted run resumes where it stopped; the checkpoints are deleted once the
+search finishes. The best distinct hypotheses of all restarts are written to
+logs/decipherment/<reference>.json.
+
+Usage:
+    python -m decipherment.substitution data/reference/latin.txt --restarts 16 --jobs 4
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from embeddings_and_models.ngram_lm import NgramLM, glyph_sequences
+from exploratory_analysis.ngrams import ngram_codes
+import metrics
+from workspace import POOL_CONTEXT, Workspace, atomic_write
+
+CACHE_DIR = Path("data/cache/decipherment")
+LOG_DIR = Path("logs/decipherment")
+SPACE = ' '
+NON_LETTERS = re.compile(r'[^\w]+|[\d_]+')
+READ_BLOCK_CHARS = 1 << 20  # letters encoded at a time by read_reference
+
+# Set in each worker by _init_worker, so the count and score tables are sent once per process
+_worker_state = {}
+
+
+# --- reference model ------------------------------------------------------
+
+def read_reference(path: Path, alphabet=None):
+    """
+    Lowercased letters of a plain-text file, one sentence per non-empty line,
+    words separated by one space. Returns (symbols (int32), offsets, alphabet);
+    the space is the last symbol of the alphabet. Lines are encoded
+    READ_BLOCK_CHARS letters at a time, so only the symbol array grows with the
+    file, not copies of its text.
+    """
+    fixed = alphabet is not None
+    # Letter ids in order of first appearance unless an alphabet is given
+    ids = {c: i for i, c in enumerate(alphabet)} if fixed else {SPACE: 0}
+    space = ids[SPACE]  # letters outside a given alphabet become word breaks
+    parts, lengths, block = [], [], []
+
+    def encode_block():
+        points = np.frombuffer("".join(block).encode("utf-32-le"), dtype=np.uint32)
+        chars, inverse = np.unique(points, return_inverse=True)
+        letters = [chr(c) for c in chars.tolist()]
+        if not fixed:
+            for c in letters:
+                ids.setdefault(c, len(ids))
+        parts.append(np.array([ids.get(c, space) for c in letters], dtype=np.int32)[inverse])
+        block.clear()
+
+    pending = 0
+    with Path(path).open("r", encoding="utf-8", errors="replace") as fh:
+        for raw in fh:
+            line = " ".join(NON_LETTERS.sub(" ", raw.lower()).split())
+            if line:
+                block.append(line)
+                lengths.append(len(line))
+                pending += len(line)
+                if pending >= READ_BLOCK_CHARS:
+                    encode_block()
+                    pending = 0
+    if block:
+        encode_block()
+    symbols = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+    if not fixed:
+        alphabet = sorted(set(ids) - {SPACE}) + [SPACE]
+        rank = {c: i for i, c in enumerate(alphabet)}
+        symbols = np.array([rank[c] for c in ids], dtype=np.int32)[symbols]
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return symbols, offsets, list(alphabet)
+
+
+def file_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    with Path(path).open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def reference_table(path: Path, order=3, cache_dir: Path = CACHE_DIR):
+    """
+    Dense log2 P(last | previous) table over every n-gram of the reference
+    alphabet, the alphabet and the letter counts. Cached by file contents and order.
+    """
+    path = Path(path)
+    digest = file_digest(path)[:16]
+    cache = Path(cache_dir) / f"ref-{path.stem}-{digest}-{order}.npz"
+    if cache.exists():
+        with np.load(cache) as npz:
+            return npz["table"], npz["alphabet"].tolist(), npz["letter_counts"]
+
+    symbols, offsets, alphabet = read_reference(path)
+    model = NgramLM.fit(symbols, offsets, len(alphabet), order)
+    A = len(alphabet)
+    codes = np.arange(A ** order, dtype=np.int64)
+    grams = np.stack([codes // A ** (order - 1 - j) % A for j in range(order)], axis=1)
+    table = model.ngram_logprobs(grams).astype(np.float32)
+
+    cache.parent.mkdir(parents=True, exist_ok=True)
+    letter_counts = np.bincount(symbols, minlength=A)
+    with atomic_write(cache) as fh:
+        np.savez(fh, table=table, alphabet=np.array(alphabet), letter_counts=letter_counts)
+    return table, alphabet, letter_counts
+
+
+# --- cipher side ----------------------------------------------------------
+
+def cipher_ngrams(symbols, offsets, n_symbols, order):
+    """Distinct n-grams inside lines, as (grams (T, order), counts (T,))."""
+    segments = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    codes, counts = np.unique(ngram_codes(symbols, order, n_symbols, segments), return_counts=True)
+    grams = np.stack([codes // n_symbols ** (order - 1 - j) % n_symbols for j in range(order)], axis=1)
+    return grams, counts
+
+
+def initial_key(glyph_counts, letter_counts, separator, space, rng=None):
+    """Frequency-rank mapping (i-th most frequent glyph -> i-th most frequent letter), optionally shuffled a bit."""
+    key = np.zeros(len(glyph_counts), dtype=np.int64)
+    glyph_order = np.argsort(-glyph_counts, kind='stable')
+    glyph_order = glyph_order[glyph_order != separator]
+    letter_order = np.argsort(-letter_counts, kind='stable')
+    letter_order = letter_order[letter_order != space]
+    key[glyph_order] = letter_order[np.arange(len(glyph_order)) % len(letter_order)]
+    if rng is not None:
+        swap = rng.permutation(glyph_order)[:len(glyph_order) // 3]
+        key[swap] = key[rng.permutation(swap)]
+    key[separator] = space
+    return key
+
+
+def _init_worker(state):
+    _worker_state.update(state)
+
+
+def divergence(letter_totals, reference_dist):
+    """KL(decoded letter distribution || reference letter distribution), in bits."""
+    p = letter_totals / letter_totals.sum()
+    used = p > 0
+    return float(p[used] @ np.log2(p[used] / reference_dist[used]))
+
+
+def _score(key):
+    s = _worker_state
+    codes = (key[s['grams']] * s['powers']).sum(axis=1)
+    letter_totals = np.bincount(key[s['free']], weights=s['glyph_counts'][s['free']], minlength=len(s['letter_dist']))
+    return codes, float(s['counts'] @ s['table'][codes]) / s['total'], letter_totals
+
+
+def _anneal(restart, seed, params, checkpoint_path):
+    """One annealing run; returns its top hypotheses as [(score, bits, kl, key list)], best first."""
+    s = _worker_state
+    grams, counts, table, powers, total = s['grams'], s['counts'], s['table'], s['powers'], s['total']
+    free, letters, affected, incidence = s['free'], s['letters'], s['affected'], s['incidence']
+    glyph_counts, letter_dist = s['glyph_counts'], s['letter_dist']
+    n_iter, t_start, t_end = params['iterations'], params['t_start'], params['t_end']
+    top_k, every, weight = params['top_k'], params['checkpoint_every'], params['unigram_weight']
+
+    checkpoint_path = Path(checkpoint_path)
+    rng = np.random.default_rng(seed)
+    if checkpoint_path.exists():
+        state = json.loads(checkpoint_path.read_text(encoding="utf-8"))
+        step, key = state['step'], np.array(state['key'], dtype=np.int64)
+        top = {tuple(k): (score, lm, kl) for score, lm, kl, k in state['top']}
+        rng.bit_generator.state = state['rng']
+    else:
+        step, key = 0, s['start_keys'][restart].copy()
+        top = {}
+    codes, lm, letter_totals = _score(key)
+    kl = divergence(letter_totals, letter_dist)
+    score = lm - weight * kl
+
+    def remember(key, lm, kl):
+        entry = tuple(key.tolist())
+        score = lm - weight * kl
+        if entry in top or (len(top) >= top_k and score <= min(v[0] for v in top.values())):
+            return
+        top[entry] = (score, lm, kl)
+        if len(top) > top_k:
+            del top[min(top, key=lambda k: top[k][0])]
+
+    def save(step):
+        with atomic_write(checkpoint_path) as fh:
+            fh.write(json.dumps({
+                'step': step, 'key': key.tolist(), 'rng': rng.bit_generator.state,
+                'top': [[*v, list(k)] for k, v in top.items()]}).encode("utf-8"))
+
+    remember(key, lm, kl)
+    while step < n_iter:
+        temperature = t_start * (t_end / t_start) ** (step / n_iter)
+        g = free[rng.integers(len(free))]
+        new_key = key.copy()
+        h = free[rng.integers(len(free))]
+        if rng.random() < params['swap_rate'] and key[g] != key[h]:
+            new_key[g], new_key[h] = key[h], key[g]
+            rows = np.flatnonzero(incidence[g] | incidence[h])
+        else:
+            new_key[g] = letters[rng.integers(len(letters))]
+            rows = affected[g]
+        # Only the n-gram types containing a changed glyph change their score
+        new_codes = (new_key[grams[rows]] * powers).sum(axis=1)
+        new_lm = lm + float(counts[rows] @ (table[new_codes] - table[codes[rows]])) / total
+        new_totals = letter_totals.copy()
+        for glyph in {g, h}:
+            new_totals[key[glyph]] -= glyph_counts[glyph]
+            new_totals[new_key[glyph]] += glyph_counts[glyph]
+        new_kl = divergence(new_totals, letter_dist)
+        delta = new_lm - weight * new_kl - score
+        if delta >= 0 or rng.random() < np.exp(delta / temperature):
+            key, lm, kl, score, letter_totals = new_key, new_lm, new_kl, score + delta, new_totals
+            codes[rows] = new_codes
+            remember(key, lm, kl)
+        step += 1
+        if step % every == 0 or step == n_iter:
+            save(step)
+    return [(*v, list(k)) for k, v in sorted(top.items(), key=lambda kv: -kv[1][0])]
+
+
+def search(symbols, offsets, cipher_alphabet, separator, reference, order=3, restarts=8,
+           iterations=20000, t_start=0.05, t_end=0.0005, swap_rate=0.5, unigram_weight=1.0, top_k=10,
+           checkpoint_every=2000, n_jobs=None, seed=42, cache_dir: Path = CACHE_DIR):
+    """
+    Anneal `restarts` independent mappings of the cipher (symbols + line offsets
+    over cipher_alphabet; `separator` is the word-separator id) against the
+    reference text file. Returns (hypotheses, reference alphabet), hypotheses
+    being the best distinct (score, bits per n-gram, KL, key) of all restarts,
+    best first.
+    """
+    table, ref_alphabet, letter_counts = reference_table(reference, order, cache_dir)
+    A, K = len(ref_alphabet), len(cipher_alphabet)
+    space = ref_alphabet.index(SPACE)
+    grams, counts = cipher_ngrams(symbols, offsets, K, order)
+
+    glyph_counts = np.bincount(symbols, minlength=K)
+    # incidence[g, t]: n-gram type t contains glyph g
+    incidence = np.zeros((K, len(grams)), dtype=bool)
+    incidence[grams, np.arange(len(grams))[:, None]] = True
+    seeds = np.random.SeedSequence(seed).spawn(restarts)
+    start_keys = [initial_key(glyph_counts, letter_counts, separator, space,
+                              None if i == 0 else np.random.default_rng(seeds[i].spawn(1)[0]))
+                  for i in range(restarts)]
+    state = {
+        'grams': grams,
+        'counts': counts.astype(np.float64),
+        'table': table.astype(np.float64),
+        'powers': A ** np.arange(order - 1, -1, -1, dtype=np.int64),
+        'total': float(counts.sum()),
+        'glyph_counts': glyph_counts.astype(np.float64),
+        'letter_dist': np.where(np.arange(A) == space, 0, letter_counts) / letter_counts[np.arange(A) != space].sum(),
+        'free': np.array([g for g in np.flatnonzero(glyph_counts) if g != separator]),
+        'letters': np.array([i for i in range(A) if i != space]),
+        'incidence': incidence,
+        'affected': [np.flatnonzero(row) for row in incidence],
+        'start_keys': start_keys,
+    }
+    params = {'iterations': iterations, 't_start': t_start, 't_end': t_end, 'swap_rate': swap_rate,
+              'unigram_weight': unigram_weight, 'top_k': top_k, 'checkpoint_every': checkpoint_every}
+
+    # Checkpoints belong to one (cipher, reference, settings) combination
+    run_key = hashlib.sha256(json.dumps({
+        'cipher': hashlib.sha256(grams.tobytes() + counts.tobytes()).hexdigest(),
+        'reference': Path(reference).name, 'table': hashlib.sha256(table.tobytes()).hexdigest(),
+        'order': order, 'seed': seed, 'params': params}, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+    run_dir = Path(cache_dir) / f"run-{run_key}"
+    run_dir.mkdir(parents=True, exist_ok=True)
+    paths = [run_dir / f"restart_{i:03d}.json" for i in range(restarts)]
+
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, restarts))
+    if n_jobs == 1:
+        _init_worker(state)
+        runs = [_anneal(i, seeds[i], params, paths[i]) for i in range(restarts)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=POOL_CONTEXT, initializer=_init_worker, initargs=(state,)) as pool:
+            runs = list(metrics.collect(pool.map(metrics.in_worker(_anneal), range(restarts), seeds,
+                                                 [params] * restarts, paths)))
+    # Every restart finished, so nothing is left to resume
+    shutil.rmtree(run_dir, ignore_errors=True)
+
+    merged = {tuple(key): (score, lm, kl) for run in runs for score, lm, kl, key in run}
+    best = sorted(merged.items(), key=lambda kv: -kv[1][0])[:top_k]
+    return [(score, -lm, kl, np.array(key)) for key, (score, lm, kl) in best], ref_alphabet
+
+
+def decode(key, symbols, offsets, ref_alphabet, lines):
+    """Decoded text of the given line indices under a mapping."""
+    return ["".join(ref_alphabet[c] for c in key[symbols[offsets[i]:offsets[i + 1]]]) for i in lines]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search glyph -> letter substitution mappings against a reference text")
+    parser.add_argument("reference", type=Path, help="plain-text corpus of the reference language")
+    parser.add_argument("--order", type=int, default=3, help="n-gram order of the reference model")
+    parser.add_argument("--restarts", type=int, default=8)
+    parser.add_argument("--iterations", type=int, default=20000, help="annealing steps per restart")
+    parser.add_argument("--unigram-weight", type=float, default=1.0,
+                        help="weight of the letter-frequency divergence penalty")
+    parser.add_argument("--top", type=int, default=10, help="hypotheses to keep")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    ws = Workspace()
+    symbols, offsets, cipher_alphabet = glyph_sequences(ws.corpus, ws.glyph_stream)
+    separator = len(cipher_alphabet) - 1
+    start = time.perf_counter()
+    with metrics.stage('decipherment'):
+        with metrics.span('anneal', rows=args.restarts * args.iterations):
+            hypotheses, ref_alphabet = search(symbols, offsets, cipher_alphabet, separator, args.reference,
+                                              order=args.order, restarts=args.restarts,
+                                              iterations=args.iterations, unigram_weight=args.unigram_weight,
+                                              top_k=args.top,
+                                              n_jobs=args.jobs, seed=args.seed)
+
+    sample = [i for i in range(len(offsets) - 1) if offsets[i + 1] > offsets[i]][:3]
+    log = {
+        'reference': str(args.reference),
+        'order': args.order,
+        'restarts': args.restarts,
+        'iterations': args.iterations,
+        'seconds': round(time.perf_counter() - start, 2),
+        'unigram_weight': args.unigram_weight,
+        'hypotheses': [{
+            'score': score,
+            'bits_per_ngram': bits,
+            'letter_divergence': kl,
+            'mapping': {cipher_alphabet[g]: ref_alphabet[key[g]] for g in range(separator)},
+            'sample': decode(key, symbols, offsets, ref_alphabet, sample),
+        } for score, bits, kl, key in hypotheses],
+    }
+    LOG_DIR.mkdir(parents=True, exist_ok=True)
+    out = LOG_DIR / f"{args.reference.stem}.json"
+    out.write_text(json.dumps(log, indent=2, ensure_ascii=False), encoding="utf-8")
+
+    print(f"--- Best substitution hypotheses ({args.restarts} restarts x {args.iterations} steps, {log['seconds']}s) ---")
+    for rank, hyp in enumerate(log['hypotheses'][:5], 1):
+        mapping = " ".join(f"{g}>{l}" for g, l in hyp['mapping'].items())
+        print(f"{rank}. {hyp['bits_per_ngram']:.3f} bits/{args.order}-gram, KL {hyp['letter_divergence']:.3f}  {mapping}")
+        print(f"   {' / '.join(hyp['sample'])}")
+    print(f"Log: {out}")
+
+
+if __name__ == "__main__":
+    main()
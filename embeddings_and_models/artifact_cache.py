@@ -0,0 +1,101 @@
+"""
+Content-addressed on-disk cache for embedding artifacts.
+
+Every entry is one .npz file named after a hash of the corpus contents, the
+stage name and the stage parameters, so a stage is recomputed only when its
+inputs actually change. Entries are touched on every hit and the least
+recently used ones are evicted once the cache grows past `max_bytes`.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from workspace import atomic_write
+
+CACHE_DIR = Path("data/cache/embeddings")
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+# Files that fully determine the token stream and its vocabulary
+CORPUS_FILES = ("tokens.npy", "line_offsets.npy", "vocab.npy", "vocab_offsets.npy")
+
+
+def corpus_fingerprint(corpus_dir: Path) -> str:
+    h = hashlib.sha256()
+    for name in CORPUS_FILES:
+        with (Path(corpus_dir) / name).open("rb") as fh:
+            for block in iter(lambda: fh.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()
+
+
+def pack_csr(matrix, prefix: str):
+    m = sparse.csr_matrix(matrix)
+    return {f"{prefix}_data": m.data, f"{prefix}_indices": m.indices,
+            f"{prefix}_indptr": m.indptr, f"{prefix}_shape": np.array(m.shape)}
+
+
+def unpack_csr(arrays, prefix: str):
+    return sparse.csr_matrix((arrays[f"{prefix}_data"], arrays[f"{prefix}_indices"],
+                              arrays[f"{prefix}_indptr"]), shape=tuple(arrays[f"{prefix}_shape"]))
+
+
+class ArtifactCache:
+    def __init__(self, corpus_fp: str, cache_dir: Path = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES):
+        self.corpus_fp = corpus_fp
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+
+    def key(self, stage: str, params: dict) -> str:
+        payload = json.dumps({"corpus": self.corpus_fp, "stage": stage, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, stage: str, params: dict) -> Path:
+        return self.cache_dir / f"{stage}-{self.key(stage, params)[:32]}.npz"
+
+    def get(self, stage: str, params: dict):
+        """Return the stored arrays as a dict, or None on a miss."""
+        path = self._path(stage, params)
+        try:
+            os.utime(path)  # mark as recently used
+            with np.load(path, allow_pickle=False) as data:
+                return {k: data[k] for k in data.files}
+        except FileNotFoundError:  # never stored, or evicted by another process meanwhile
+            return None
+
+    def put(self, stage: str, params: dict, arrays: dict):
+        path = self._path(stage, params)
+        # Concurrent puts of one key never share a temporary file, and evict() (which only
+        # looks at *.npz) and readers never see one still being written
+        with atomic_write(path) as fh:
+            np.savez(fh, **arrays)
+        self.evict()
+
+    def cached(self, stage: str, params: dict, compute):
+        """Return get(stage, params), or compute() the arrays and store them."""
+        arrays = self.get(stage, params)
+        if arrays is None:
+            arrays = compute()
+            self.put(stage, params, arrays)
+        return arrays
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        entries = []
+        for p in self.cache_dir.glob("*.npz"):
+            try:
+                entries.append((p.stat(), p))
+            except FileNotFoundError:  # removed by another process since the glob
+                continue
+        entries.sort(key=lambda entry: entry[0].st_mtime)
+        total = sum(st.st_size for st, _ in entries)
+        for st, p in entries:
+            if total <= self.max_bytes:
+                break
+            total -= st.st_size
+            p.unlink(missing_ok=True)
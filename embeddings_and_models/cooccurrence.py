@@ -0,0 +1,177 @@
+"""
+Sparse co-occurrence counting and PPMI over token-id arrays.
+
+Instead of visiting every (center, context) pair in Python, the token stream
+is compared against itself shifted by 1..window_size positions. Pairs that
+cross a line boundary are masked out, and the surviving (row, col, weight)
+triples go straight into a scipy.sparse matrix, so memory grows with the
+number of distinct pairs rather than with vocab_size ** 2.
+"""
+
+import numpy as np
+from scipy import sparse
+
+WINDOW_WEIGHTS = {
+    'uniform': lambda d, window: 1.0,
+    'harmonic': lambda d, window: 1.0 / d,
+    'linear': lambda d, window: (window - d + 1) / window,
+}
+
+
+def frequency_ranks(counts, vocab_size=None):
+    """
+    Return (vocab_ids, rank_of_id): vocab_ids are the `vocab_size` most frequent
+    ids (ties keep first-occurrence order, like Counter.most_common) and
+    rank_of_id maps every corpus id to its rank, or -1 when out of vocabulary.
+    """
+    counts = np.asarray(counts)
+    order = np.argsort(-counts, kind='stable')
+    order = order[counts[order] > 0]
+    if vocab_size is not None:
+        order = order[:vocab_size]
+    rank_of_id = np.full(len(counts), -1, dtype=np.int64)
+    rank_of_id[order] = np.arange(len(order))
+    return order, rank_of_id
+
+
+def build_cooccurrence(token_ids, token_line, n_words, window_size=2, weighting='uniform'):
+    """
+    Symmetric co-occurrence matrix (CSR, n_words x n_words).
+
+    token_ids:  word id per token, already remapped to 0..n_words-1; tokens
+                outside the vocabulary must have been dropped beforehand
+    token_line: line index per token; windows never cross lines
+    weighting:  one of WINDOW_WEIGHTS, applied by distance d in 1..window_size
+    """
+    if weighting not in WINDOW_WEIGHTS:
+        raise ValueError(f"Unknown window weighting: {weighting!r} (expected one of {sorted(WINDOW_WEIGHTS)})")
+    token_ids = np.asarray(token_ids, dtype=np.int64)
+    token_line = np.asarray(token_line)
+    weight_of = WINDOW_WEIGHTS[weighting]
+
+    rows, cols, vals = [], [], []
+    for d in range(1, window_size + 1):
+        if d >= len(token_ids):
+            break
+        same_line = token_line[d:] == token_line[:-d]
+        left = token_ids[:-d][same_line]
+        right = token_ids[d:][same_line]
+        w = np.full(len(left), weight_of(d, window_size), dtype=np.float64)
+        # Each pair counts for both words (context to the left and to the right)
+        rows += [left, right]
+        cols += [right, left]
+        vals += [w, w]
+
+    if not rows:
+        return sparse.csr_matrix((n_words, n_words), dtype=np.float64)
+    co = sparse.coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))),
+                           shape=(n_words, n_words))
+    # Converting to CSR sums the duplicate (row, col) entries
+    return co.tocsr()
+
+
+def ppmi(co_matrix):
+    """Positive PMI computed only over the nonzero entries of `co_matrix`."""
+    co = sparse.coo_matrix(co_matrix)
+    total_count = co.sum()
+    row_sums = np.asarray(co.sum(axis=1)).ravel()
+    col_sums = np.asarray(co.sum(axis=0)).ravel()
+
+    expected = row_sums[co.row] * col_sums[co.col] / total_count
+    pmi = np.log(co.data / expected)
+    keep = pmi > 0
+    out = sparse.coo_matrix((pmi[keep], (co.row[keep], co.col[keep])), shape=co.shape)
+    return out.tocsr()
+
+
+def corpus_cooccurrence(corpus, vocab_size=None, window_size=2, weighting='uniform'):
+    """
+    Co-occurrence matrix for the `vocab_size` most frequent words of a corpus
+    (see corpus_store.Corpus). Returns (vocab, co_matrix).
+    """
+    vocab_ids, rank_of_id = frequency_ranks(corpus.word_counts(), vocab_size)
+    ranks = rank_of_id[np.asarray(corpus.tokens)]
+    in_vocab = ranks >= 0
+    co = build_cooccurrence(ranks[in_vocab], corpus.token_line()[in_vocab], len(vocab_ids),
+                            window_size=window_size, weighting=weighting)
+    return corpus.vocab[vocab_ids].tolist(), co
+
+
+def folio_cooccurrence(corpus, window_size=2, weighting='uniform', previous=None):
+    """
+    Co-occurrence counts of every folio on its own (windows never cross lines,
+    so the whole-corpus matrix is their sum), as {folio digest: (words, co)}
+    with `co` over the folio's own words. Partials in `previous` whose folio
+    digest (see Corpus.folio_digests) still occurs are reused, so after an
+    edit only the changed folios are counted again.
+    """
+    previous = previous or {}
+    tokens = np.asarray(corpus.tokens)
+    token_line = corpus.token_line()
+    token_folio = np.asarray(corpus.line_folio)[token_line]
+    order = np.argsort(token_folio, kind='stable')
+    bounds = np.searchsorted(token_folio[order], np.arange(len(corpus.folios) + 1))
+    partials = {}
+    for folio, digest in enumerate(corpus.folio_digests()):
+        if digest in partials:
+            continue
+        if digest in previous:
+            partials[digest] = previous[digest]
+            continue
+        idx = order[bounds[folio]:bounds[folio + 1]]
+        ids, local = np.unique(tokens[idx], return_inverse=True)
+        co = build_cooccurrence(local, token_line[idx], len(ids), window_size=window_size, weighting=weighting)
+        partials[digest] = (corpus.vocab[ids], co)
+    return partials
+
+
+def combine_partials(corpus, partials):
+    """
+    corpus_cooccurrence over the full vocabulary from per-folio partials (see
+    folio_cooccurrence). Returns (vocab, co_matrix). A truncated vocabulary
+    cannot be combined this way: dropping out-of-vocabulary tokens changes
+    which tokens are adjacent.
+    """
+    vocab_ids, rank_of_id = frequency_ranks(corpus.word_counts())
+    sorter = np.argsort(corpus.vocab)
+    rows, cols, vals = [], [], []
+    for digest in corpus.folio_digests():
+        words, co = partials[digest]
+        ranks = rank_of_id[sorter[np.searchsorted(corpus.vocab, words, sorter=sorter)]]
+        co = sparse.coo_matrix(co)
+        rows.append(ranks[co.row])
+        cols.append(ranks[co.col])
+        vals.append(co.data)
+    n = len(vocab_ids)
+    if not rows:
+        return corpus.vocab[vocab_ids].tolist(), sparse.csr_matrix((n, n), dtype=np.float64)
+    co = sparse.coo_matrix((np.concatenate(vals), (np.concatenate(rows), np.concatenate(cols))), shape=(n, n))
+    return corpus.vocab[vocab_ids].tolist(), co.tocsr()
+
+
+def pack_partials(partials):
+    """Arrays for an ArtifactCache entry holding folio_cooccurrence partials."""
+    digests = list(partials)
+    words = [partials[d][0] for d in digests]
+    coos = [sparse.coo_matrix(partials[d][1]) for d in digests]
+    word_offsets = np.zeros(len(digests) + 1, dtype=np.int64)
+    np.cumsum([len(w) for w in words], out=word_offsets[1:])
+    pair_offsets = np.zeros(len(digests) + 1, dtype=np.int64)
+    np.cumsum([c.nnz for c in coos], out=pair_offsets[1:])
+    cat = lambda parts, dtype: np.concatenate(parts).astype(dtype) if parts else np.zeros(0, dtype=dtype)
+    return {'digests': np.array(digests, dtype=str), 'word_offsets': word_offsets,
+            'words': np.concatenate(words) if words else np.zeros(0, dtype=str), 'pair_offsets': pair_offsets,
+            'rows': cat([c.row for c in coos], np.int32), 'cols': cat([c.col for c in coos], np.int32),
+            'vals': cat([c.data for c in coos], np.float64)}
+
+
+def unpack_partials(arrays):
+    partials = {}
+    wo, po = arrays['word_offsets'], arrays['pair_offsets']
+    for i, digest in enumerate(arrays['digests'].tolist()):
+        words = arrays['words'][wo[i]:wo[i + 1]]
+        n = len(words)
+        co = sparse.coo_matrix((arrays['vals'][po[i]:po[i + 1]],
+                                (arrays['rows'][po[i]:po[i + 1]], arrays['cols'][po[i]:po[i + 1]])), shape=(n, n))
+        partials[digest] = (words, co.tocsr())
+    return partials
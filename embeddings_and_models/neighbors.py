@@ -0,0 +1,204 @@
+"""
+Nearest-neighbor search over the persisted word vectors.
+
+word_embeddings.py saves its vectors to data/embeddings/ (float32 vectors +
+vocabulary string table + meta.json). VectorIndex L2-normalizes them once, so
+cosine similarity is a matrix product:
+ - exact search scores a batch of queries against the whole vocabulary with
+   one product per `batch_size` queries and picks the top k with argpartition
+ - the optional approximate index (approximate=True) is an inverted file:
+   spherical k-means splits the vectors into `n_lists` cells, and a query is
+   only scored against the vectors of its `n_probe` closest cells
+ - analogies (a : b :: c : ?) use 3CosAdd, b - a + c, in the same batched call
+
+Usage:
+    python -m embeddings_and_models.neighbors daiin shedy --k 10
+    python -m embeddings_and_models.neighbors --analogy daiin aiin dain
+"""
+
+import argparse
+import json
+from pathlib import Path
+
+import numpy as np
+
+from corpus_store import load_strings, save_strings
+
+EMBEDDINGS_DIR = Path("data/embeddings")
+BATCH_SIZE = 1024
+
+
+def save_vectors(vocab, vectors, params: dict, out_dir: Path = EMBEDDINGS_DIR):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    np.save(out_dir / "vectors.npy", np.asarray(vectors, dtype=np.float32))
+    save_strings(out_dir, "vocab", list(vocab))
+    meta = {"n_words": len(vocab), "dimensions": int(np.shape(vectors)[1]), "params": params}
+    (out_dir / "meta.json").write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    return out_dir
+
+
+def load_vectors(in_dir: Path = EMBEDDINGS_DIR):
+    """(vocab list, vectors, meta) as saved by save_vectors."""
+    in_dir = Path(in_dir)
+    if not (in_dir / "meta.json").exists():
+        raise FileNotFoundError(f"No word vectors in {in_dir} (run embeddings_and_models/word_embeddings.py first)")
+    meta = json.loads((in_dir / "meta.json").read_text(encoding="utf-8"))
+    return load_strings(in_dir, "vocab").tolist(), np.load(in_dir / "vectors.npy"), meta
+
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def top_k(scores, k):
+    """Column indices and values of the k highest scores of every row, best first."""
+    k = min(k, scores.shape[1])
+    idx = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-part, axis=1, kind='stable')
+    return np.take_along_axis(idx, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+def spherical_kmeans(unit_vectors, n_clusters, n_iter=20, seed=42):
+    """Centroids (unit length) and cell of every vector, by cosine similarity."""
+    rng = np.random.default_rng(seed)
+    centroids = unit_vectors[rng.choice(len(unit_vectors), size=n_clusters, replace=False)]
+    for _ in range(n_iter):
+        assign = np.argmax(unit_vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, unit_vectors)
+        empty = ~sums.any(axis=1)
+        sums[empty] = centroids[empty]  # keep the old centroid of an empty cell
+        centroids = normalize(sums)
+    return centroids, np.argmax(unit_vectors @ centroids.T, axis=1)
+
+
+class VectorIndex:
+    def __init__(self, vocab, vectors, approximate=False, n_lists=None, n_probe=8, batch_size=BATCH_SIZE):
+        self.vocab = list(vocab)
+        self.lookup = {w: i for i, w in enumerate(self.vocab)}
+        self.unit = normalize(vectors)
+        self.batch_size = batch_size
+        self.approximate = approximate
+        if approximate:
+            n_lists = n_lists or max(1, int(np.sqrt(len(self.vocab))))
+            self.centroids, cells = spherical_kmeans(self.unit, n_lists)
+            order = np.argsort(cells, kind='stable')
+            self.list_members = np.split(order, np.searchsorted(cells[order], np.arange(1, n_lists)))
+            self.n_probe = min(n_probe, n_lists)
+
+    @classmethod
+    def load(cls, in_dir: Path = EMBEDDINGS_DIR, **kwargs):
+        vocab, vectors, _ = load_vectors(in_dir)
+        return cls(vocab, vectors, **kwargs)
+
+    def ids(self, words):
+        missing = [w for w in words if w not in self.lookup]
+        if missing:
+            raise KeyError(f"Not in the vocabulary: {', '.join(missing[:10])}")
+        return np.array([self.lookup[w] for w in words], dtype=np.int64)
+
+    # --- search -------------------------------------------------------
+
+    def search(self, queries, k=10, exclude=None):
+        """
+        Top-k neighbors of every query vector: (ids, scores), both (n_queries, k).
+        exclude is an (n_queries, m) array of vocabulary ids never returned for
+        the matching query (pad with -1).
+        """
+        q = normalize(np.atleast_2d(queries))
+        exclude = None if exclude is None else np.atleast_2d(exclude)
+        extra = 0 if exclude is None else exclude.shape[1]
+        ids = np.empty((len(q), min(k, len(self.vocab))), dtype=np.int64)
+        scores = np.empty(ids.shape, dtype=np.float32)
+        for start in range(0, len(q), self.batch_size):
+            stop = min(start + self.batch_size, len(q))
+            if self.approximate:
+                b_ids, b_scores = self._search_ivf(q[start:stop], k + extra)
+            else:
+                sims = q[start:stop] @ self.unit.T
+                b_ids, b_scores = top_k(sims, k + extra)
+            if exclude is not None:
+                banned = (b_ids[:, :, None] == exclude[start:stop, None, :]).any(axis=2)
+                b_scores = np.where(banned, -np.inf, b_scores)
+                order = np.argsort(-b_scores, axis=1, kind='stable')
+                b_ids = np.take_along_axis(b_ids, order, axis=1)
+                b_scores = np.take_along_axis(b_scores, order, axis=1)
+            ids[start:stop] = b_ids[:, :ids.shape[1]]
+            scores[start:stop] = b_scores[:, :ids.shape[1]]
+        return ids, scores
+
+    def _search_ivf(self, q, k):
+        """Score every probed cell once against all the queries probing it, then merge the per-cell top k."""
+        k = min(k, len(self.vocab))
+        probe, _ = top_k(q @ self.centroids.T, self.n_probe)
+        cand_ids = np.zeros((len(q), probe.shape[1], k), dtype=np.int64)
+        cand_scores = np.full((len(q), probe.shape[1], k), -np.inf, dtype=np.float32)
+        flat = np.argsort(probe, axis=None, kind='stable')
+        cells = probe.ravel()[flat]
+        bounds = np.flatnonzero(np.diff(cells)) + 1
+        for group in np.split(flat, bounds):
+            members = self.list_members[probe.flat[group[0]]]
+            if not len(members):
+                continue
+            rows, slots = np.divmod(group, probe.shape[1])
+            c_idx, c_scores = top_k(q[rows] @ self.unit[members].T, k)
+            cand_ids[rows, slots, :c_idx.shape[1]] = members[c_idx]
+            cand_scores[rows, slots, :c_idx.shape[1]] = c_scores
+        cand_ids, cand_scores = cand_ids.reshape(len(q), -1), cand_scores.reshape(len(q), -1)
+        best, scores = top_k(cand_scores, k)
+        return np.take_along_axis(cand_ids, best, axis=1), scores
+
+    def _format(self, ids, scores):
+        return [[(self.vocab[i], float(s)) for i, s in zip(row_ids, row_scores) if np.isfinite(s)]
+                for row_ids, row_scores in zip(ids, scores)]
+
+    def similar(self, words, k=10):
+        """
+        Most similar words to a word (list of (word, cosine)), or to each word
+        of a list (list of such lists), the query word itself excluded.
+        """
+        single = isinstance(words, str)
+        words = [words] if single else list(words)
+        query_ids = self.ids(words)
+        ids, scores = self.search(self.unit[query_ids], k, exclude=query_ids[:, None])
+        result = self._format(ids, scores)
+        return result[0] if single else result
+
+    def analogy(self, a, b=None, c=None, k=10):
+        """
+        a : b :: c : ?  (3CosAdd). Pass three words, or a list of (a, b, c)
+        triples as `a` to answer them all in one batched search.
+        """
+        single = b is not None
+        triples = [(a, b, c)] if single else list(a)
+        ids = self.ids([w for t in triples for w in t]).reshape(-1, 3)
+        queries = self.unit[ids[:, 1]] - self.unit[ids[:, 0]] + self.unit[ids[:, 2]]
+        found, scores = self.search(queries, k, exclude=ids)
+        result = self._format(found, scores)
+        return result[0] if single else result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Nearest neighbors in the word-embedding space")
+    parser.add_argument("words", nargs="*", help="words to find neighbors for")
+    parser.add_argument("--analogy", nargs=3, metavar=("A", "B", "C"), help="a : b :: c : ?")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--approximate", action="store_true", help="use the inverted-file index")
+    args = parser.parse_args()
+
+    index = VectorIndex.load(approximate=args.approximate)
+    if args.analogy:
+        a, b, c = args.analogy
+        print(f"{a} : {b} :: {c} : ?")
+        for word, score in index.analogy(a, b, c, k=args.k):
+            print(f"  {word:20} {score:.3f}")
+    for word, neighbors in zip(args.words, index.similar(args.words, k=args.k)):
+        print(f"{word}: " + ", ".join(f"{w} ({s:.2f})" for w, s in neighbors))
+
+
+if __name__ == "__main__":
+    main()
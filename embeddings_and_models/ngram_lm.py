@@ -0,0 +1,429 @@
+"""
+Word- and glyph-level n-gram language models with Kneser-Ney smoothing.
+
+Training data is a flat array of symbol ids plus Arrow-style sentence offsets
+(one sentence per line). Every sentence is padded with <s> ... </s> and the
+n-grams of each order are counted with one np.unique over packed integer codes
+(ngrams.ngram_codes), so no Python loop runs over the text.
+
+The model is interpolated Kneser-Ney (one discount per order, from the
+counts-of-counts) converted to backoff form and kept in an array-backed trie:
+ - order 1 is dense: prob[symbol], backoff[symbol]
+ - order k > 1 stores its n-grams sorted by (context node, last symbol):
+   symbols[k] (int32) and offsets[k], where the children of node i of order
+   k - 1 are symbols[k][offsets[k][i]:offsets[k][i + 1]]
+ - per node: log2 P(symbol | context) and the log2 backoff weight of the
+   n-gram used as a context (float32)
+Lookups binary-search every query's child range at once, so scoring a whole
+corpus (every line, then every folio by summing its lines) is one pass of
+array operations per order.
+
+Usage:
+    python -m embeddings_and_models.ngram_lm                       # words, trigrams
+    python -m embeddings_and_models.ngram_lm --level glyph --order 5 --by currier
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from exploratory_analysis.ngrams import ngram_codes
+import metrics
+from workspace import Workspace
+
+GROUPINGS = ('section', 'currier', 'scribal')
+FOLDS = 5
+WORD_SEPARATOR = '.'
+
+
+def pad_sentences(symbols, offsets, bos, eos):
+    """<s> sentence </s> for every sentence. Returns (padded, padded_offsets)."""
+    symbols = np.asarray(symbols, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    n_sent = len(offsets) - 1
+    padded_offsets = offsets + 2 * np.arange(n_sent + 1, dtype=np.int64)
+    padded = np.empty(padded_offsets[-1], dtype=np.int64)
+    sentence = np.repeat(np.arange(n_sent), np.diff(offsets))
+    padded[np.arange(len(symbols)) + 2 * sentence + 1] = symbols
+    padded[padded_offsets[:-1]] = bos
+    padded[padded_offsets[1:] - 1] = eos
+    return padded, padded_offsets
+
+
+def select_sentences(symbols, offsets, mask):
+    """The sentences where `mask` is True, as (symbols, offsets)."""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    keep = np.repeat(np.asarray(mask, dtype=bool), lengths)
+    new_offsets = np.zeros(np.count_nonzero(mask) + 1, dtype=np.int64)
+    np.cumsum(lengths[mask], out=new_offsets[1:])
+    return np.asarray(symbols)[keep], new_offsets
+
+
+def find_children(offsets, symbols, parents, targets):
+    """
+    Node index of child `targets[i]` of node `parents[i]` (-1 where there is
+    no such child, or parents[i] < 0): a binary search of every child range
+    at once.
+    """
+    parents = np.asarray(parents, dtype=np.int64)
+    found = np.full(len(parents), -1, dtype=np.int64)
+    valid = np.flatnonzero(parents >= 0)
+    if len(valid) == 0 or len(symbols) == 0:
+        return found
+    targets = np.asarray(targets)[valid]
+    lo = offsets[parents[valid]]
+    end = offsets[parents[valid] + 1]
+    hi = end.copy()
+    active = lo < hi
+    while active.any():
+        mid = (lo + hi) // 2
+        right = symbols[np.minimum(mid, len(symbols) - 1)] < targets
+        lo = np.where(active & right, mid + 1, lo)
+        hi = np.where(active & ~right, mid, hi)
+        active = lo < hi
+    hit = (lo < end) & (symbols[np.minimum(lo, len(symbols) - 1)] == targets)
+    found[valid[hit]] = lo[hit]
+    return found
+
+
+def _discount(counts):
+    n1, n2 = np.count_nonzero(counts == 1), np.count_nonzero(counts == 2)
+    if n1 == 0 or n2 == 0:
+        return 0.5
+    return float(min(max(n1 / (n1 + 2 * n2), 0.05), 0.95))
+
+
+class NgramLM:
+    """
+    Backoff-form interpolated Kneser-Ney model over ids 0..n_symbols-1.
+    Build it with NgramLM.fit; <s> and </s> are the ids n_symbols, n_symbols + 1.
+    """
+
+    def __init__(self, order, n_symbols, symbols, offsets, prob, backoff, discounts):
+        self.order = order
+        self.n_symbols = n_symbols
+        self.symbols = symbols      # per order (index k - 1); None for the dense order 1
+        self.offsets = offsets      # per order; None for order 1
+        self.prob = prob            # per order: log2 P(last symbol | context), float32
+        self.backoff = backoff      # per order below the highest: log2 backoff weight, float32
+        self.discounts = discounts
+
+    @property
+    def bos(self):
+        return self.n_symbols
+
+    @property
+    def eos(self):
+        return self.n_symbols + 1
+
+    @classmethod
+    def fit(cls, symbols, offsets, n_symbols, order=3):
+        B = n_symbols + 2
+        bos, eos = n_symbols, n_symbols + 1
+        padded, padded_offsets = pad_sentences(symbols, offsets, bos, eos)
+        segments = np.repeat(np.arange(len(padded_offsets) - 1), np.diff(padded_offsets))
+
+        # 1. Raw n-gram counts of every order (codes sorted = grouped by context)
+        codes, raw = [], []
+        for k in range(1, order + 1):
+            c, n = np.unique(ngram_codes(padded, k, B, segments), return_counts=True)
+            if k == 1:
+                c, n = c[c != bos], n[c != bos]
+            codes.append(c)
+            raw.append(n)
+
+        # 2. Kneser-Ney adjusted counts: lower orders count distinct left
+        # contexts, except n-grams starting with <s> (nothing can precede them)
+        adjusted = []
+        for k in range(1, order + 1):
+            c, n = codes[k - 1], raw[k - 1]
+            if k < order:
+                suffixes = codes[k] % B ** k
+                left_types = np.bincount(np.searchsorted(c, suffixes), minlength=len(c))
+                n = np.where(c // B ** (k - 1) == bos, n, left_types)
+            adjusted.append(n.astype(np.float64))
+        discounts = [_discount(a) for a in adjusted]
+
+        # 3. Order 1 (dense): unigram KN interpolated with the uniform distribution
+        dense = np.zeros(B)
+        dense[codes[0]] = adjusted[0]
+        total = dense.sum()
+        gamma_root = discounts[0] * np.count_nonzero(dense) / total
+        p = np.maximum(dense - discounts[0], 0) / total + gamma_root / (B - 1)
+        p[bos] = 0.0
+        node_codes = [np.arange(B, dtype=np.int64)]
+        probs = [p]
+        symbols_, offsets_, log_backoff = [None], [None], []
+
+        # 4. Higher orders: interpolate with the order below, record the
+        # context's backoff weight gamma(h) on the order-below node
+        for k in range(2, order + 1):
+            c, a, D = codes[k - 1], adjusted[k - 1], discounts[k - 1]
+            parent = np.searchsorted(node_codes[-1], c // B)
+            lower = np.searchsorted(node_codes[-1], c % B ** (k - 1))
+            n_parents = len(node_codes[-1])
+            ctx_total = np.bincount(parent, weights=a, minlength=n_parents)
+            ctx_types = np.bincount(parent, minlength=n_parents)
+            gamma = np.divide(D * ctx_types, ctx_total, out=np.ones(n_parents), where=ctx_types > 0)
+            p = np.maximum(a - D, 0) / ctx_total[parent] + gamma[parent] * probs[-1][lower]
+
+            log_backoff.append(np.log2(gamma).astype(np.float32))
+            symbols_.append((c % B).astype(np.int32))
+            offsets_.append(np.searchsorted(parent, np.arange(n_parents + 1)).astype(np.int64))
+            node_codes.append(c)
+            probs.append(p)
+
+        with np.errstate(divide='ignore'):
+            log_prob = [np.log2(p).astype(np.float32) for p in probs]
+        return cls(order, n_symbols, symbols_, offsets_, log_prob, log_backoff, discounts)
+
+    @property
+    def nbytes(self):
+        arrays = [a for group in (self.symbols, self.offsets, self.prob, self.backoff) for a in group if a is not None]
+        return sum(a.nbytes for a in arrays)
+
+    def n_ngrams(self):
+        return [len(p) for p in self.prob]
+
+    # --- scoring ------------------------------------------------------
+
+    def token_logprobs(self, symbols, offsets):
+        """
+        log2 P of every symbol and of each sentence's </s>, in order.
+        Returns (logprobs, sentence index of each).
+        """
+        padded, padded_offsets = pad_sentences(symbols, offsets, self.bos, self.eos)
+        n_sent = len(padded_offsets) - 1
+        sentence = np.repeat(np.arange(n_sent), np.diff(padded_offsets))
+        position = np.arange(len(padded)) - padded_offsets[sentence]
+        history = np.minimum(position, self.order - 1)
+
+        # nodes[k - 1][p]: trie node of the k-gram ending at p (-1 if unseen)
+        nodes = [padded]
+        for k in range(2, self.order + 1):
+            parents = np.full(len(padded), -1, dtype=np.int64)
+            parents[1:] = nodes[-1][:-1]
+            parents[position < k - 1] = -1
+            nodes.append(find_children(self.offsets[k - 1], self.symbols[k - 1], parents, padded))
+
+        # Longest matching n-gram, plus the backoff weights of the longer contexts tried
+        logp = self.prob[0][padded].astype(np.float64)
+        longest = np.ones(len(padded), dtype=np.int64)
+        for k in range(2, self.order + 1):
+            hit = nodes[k - 1] >= 0
+            logp[hit] = self.prob[k - 1][nodes[k - 1][hit]]
+            longest[hit] = k
+        for m in range(1, self.order):
+            context = np.full(len(padded), -1, dtype=np.int64)
+            context[1:] = nodes[m - 1][:-1]
+            use = (m >= longest) & (m <= history) & (context >= 0)
+            logp[use] += self.backoff[m - 1][context[use]]
+
+        predicted = position > 0
+        return logp[predicted], sentence[predicted]
+
+    def ngram_logprobs(self, grams):
+        """
+        log2 P(last symbol | the others) of every row of `grams` (m, k), k <= order,
+        the rows being full contexts inside a sentence (no <s> padding).
+        """
+        grams = np.asarray(grams, dtype=np.int64)
+        k = grams.shape[1]
+        # nodes[s][m - 1]: trie node of grams[:, s:s + m] (-1 if unseen)
+        nodes = []
+        for s in range(k):
+            walk = [grams[:, s]]
+            for m in range(2, k - s + 1):
+                walk.append(find_children(self.offsets[m - 1], self.symbols[m - 1], walk[-1], grams[:, s + m - 1]))
+            nodes.append(walk)
+
+        logp = self.prob[0][grams[:, -1]].astype(np.float64)
+        longest = np.ones(len(grams), dtype=np.int64)
+        for m in range(2, k + 1):
+            node = nodes[k - m][m - 1]
+            hit = node >= 0
+            logp[hit] = self.prob[m - 1][node[hit]]
+            longest[hit] = m
+        for m in range(1, k):
+            context = nodes[k - 1 - m][m - 1]
+            use = (m >= longest) & (context >= 0)
+            logp[use] += self.backoff[m - 1][context[use]]
+        return logp
+
+    def sentence_scores(self, symbols, offsets):
+        """Total log2 probability and number of predicted symbols (incl. </s>) per sentence."""
+        logp, sentence = self.token_logprobs(symbols, offsets)
+        n_sent = len(offsets) - 1
+        return (np.bincount(sentence, weights=logp, minlength=n_sent),
+                np.bincount(sentence, minlength=n_sent))
+
+    def perplexity(self, symbols, offsets):
+        logp, _ = self.token_logprobs(symbols, offsets)
+        return float(2 ** -logp.mean()) if len(logp) else float('nan')
+
+
+# --- corpus helpers -----------------------------------------------------
+
+def word_sequences(corpus):
+    """(symbols, line offsets, n_symbols): one sentence of word ids per line."""
+    return np.asarray(corpus.tokens), np.asarray(corpus.line_offsets), len(corpus.vocab)
+
+
+def glyph_sequences(corpus, stream):
+    """
+    (symbols, line offsets, alphabet): one sentence of glyph ids per line, with a
+    word-separator symbol between the words of a line.
+    """
+    sep = stream.n_symbols
+    line_offsets = np.asarray(corpus.line_offsets, dtype=np.int64)
+    n_words = len(stream.word_offsets) - 1
+    # glyph g of word i moves to g + i; word i is followed by a separator
+    out = np.empty(len(stream.glyphs) + n_words, dtype=np.int64)
+    out[np.arange(len(stream.glyphs)) + stream.word_of_glyph()] = stream.glyphs
+    out[stream.word_offsets[1:] + np.arange(n_words)] = sep
+    # drop the separator after the last word of every line
+    last_word = line_offsets[1:][np.diff(line_offsets) > 0] - 1
+    keep = np.ones(len(out), dtype=bool)
+    keep[stream.word_offsets[last_word + 1] + last_word] = False
+    kept_before = np.concatenate([[0], np.cumsum(keep)])
+    offsets = kept_before[stream.word_offsets[line_offsets] + line_offsets]
+    return out[keep], offsets, stream.alphabet + [WORD_SEPARATOR]
+
+
+def sequences(ws, level='word'):
+    """(symbols, line offsets, n_symbols) of the workspace corpus at word or glyph level."""
+    if level == 'word':
+        return word_sequences(ws.corpus)
+    if level == 'glyph':
+        symbols, offsets, alphabet = glyph_sequences(ws.corpus, ws.glyph_stream)
+        return symbols, offsets, len(alphabet)
+    raise ValueError(f"level must be 'word' or 'glyph', not {level!r}")
+
+
+def line_groups(ws, by):
+    """Categorical section / Currier language / scribal hand of every line."""
+    if by == 'scribal':
+        return pd.Categorical(ws.corpus.line_scribal)
+    if by in ('section', 'currier'):
+        return ws.folio_table[by].array.take(np.asarray(ws.corpus.line_folio))
+    raise ValueError(f"by must be one of {GROUPINGS}, not {by!r}")
+
+
+def group_names(groups):
+    """Named groups of a line grouping; lines with an empty label (e.g. folio headers) belong to none."""
+    return [name for name in pd.Categorical(groups).categories if str(name).strip()]
+
+
+def train_by_group(symbols, offsets, n_symbols, groups, order=3):
+    """
+    {group: NgramLM trained on that group's sentences}, all over the same symbol
+    ids. Groups without a non-empty sentence to train on get no model.
+    """
+    groups = pd.Categorical(groups)
+    nonempty = np.diff(offsets) > 0
+    models = {}
+    for name in group_names(groups):
+        mask = (groups == name) & nonempty
+        if mask.any():
+            models[name] = NgramLM.fit(*select_sentences(symbols, offsets, mask), n_symbols, order)
+    return models
+
+
+def folio_folds(n_folios, folds=FOLDS, seed=0):
+    """Cross-validation fold of every folio id (a seeded shuffle dealt round-robin)."""
+    return np.random.default_rng(seed).permutation(n_folios) % folds
+
+
+def score_corpus(ws, level='word', order=3, by=None, folds=FOLDS):
+    """
+    Perplexity of every non-empty line and every folio, under one model trained
+    on the whole corpus and, with `by`, under one model per group (ppl_<group>).
+
+    Scores are held out by folio: the folios are split into `folds` folds, and
+    the lines of each fold are scored by models trained on the other folds
+    only. Otherwise every line would be scored by a group model that saw it
+    and ppl_<own group> would mostly measure memorization. With folds=1 the
+    models are trained on everything (in-sample, biased towards each line's
+    own group). A group absent from the training folds gives NaN; lines with
+    an empty group label (the scribal hand of folio headers) get no ppl_ column.
+    Returns (lines, folios) DataFrames.
+    """
+    corpus = ws.corpus
+    symbols, offsets, n_symbols = sequences(ws, level)
+    line_folio = np.asarray(corpus.line_folio)
+    groups = line_groups(ws, by) if by is not None else None
+    names = ['all'] + (group_names(groups) if by is not None else [])
+    logp = {name: np.full(corpus.n_lines, np.nan) for name in names}
+    n = np.diff(offsets) + 1  # predicted symbols per line, </s> included
+
+    line_fold = folio_folds(len(corpus.folios), folds)[line_folio] if folds > 1 else np.zeros(corpus.n_lines, int)
+    for fold in range(max(folds, 1)):
+        test = line_fold == fold
+        train = ~test if folds > 1 else test
+        if not test.any():
+            continue
+        train_symbols, train_offsets = select_sentences(symbols, offsets, train)
+        models = {'all': NgramLM.fit(train_symbols, train_offsets, n_symbols, order)}
+        if by is not None:
+            models.update(train_by_group(train_symbols, train_offsets, n_symbols, groups[train], order))
+        test_symbols, test_offsets = select_sentences(symbols, offsets, test)
+        for name, model in models.items():
+            logp[name][test] = model.sentence_scores(test_symbols, test_offsets)[0]
+
+    lines = pd.DataFrame({'line': np.arange(corpus.n_lines),
+                          'folio': corpus.folios[line_folio],
+                          'meta_left': corpus.line_meta_left})
+    folios = ws.folio_table[['folio', 'section', 'currier']].copy()
+    if by is not None:
+        lines[by] = groups
+    nonempty = np.diff(offsets) > 0
+    for name in names:
+        col = 'ppl' if name == 'all' else f'ppl_{name}'
+        lines[col] = 2 ** (-logp[name] / n)
+        if name == 'all':
+            lines['n_predicted'], lines['log2prob'] = n, logp[name]
+        # A folio's perplexity pools the symbols of its (non-empty) lines
+        folio_logp = np.bincount(line_folio[nonempty], weights=logp[name][nonempty], minlength=len(corpus.folios))
+        folio_n = np.bincount(line_folio[nonempty], weights=n[nonempty], minlength=len(corpus.folios))
+        folios[col] = 2 ** (-folio_logp / np.maximum(folio_n, 1))
+    has_text = np.bincount(line_folio[nonempty], minlength=len(corpus.folios)) > 0
+    return lines[nonempty].reset_index(drop=True), folios[has_text].reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Kneser-Ney n-gram perplexity of every line and folio")
+    parser.add_argument("--level", choices=["word", "glyph"], default="word")
+    parser.add_argument("--order", type=int, default=3)
+    parser.add_argument("--by", choices=GROUPINGS, help="also train one model per group")
+    parser.add_argument("--top", type=int, default=10, help="most surprising folios / lines to list")
+    parser.add_argument("--folds", type=int, default=FOLDS,
+                        help="folio folds for held-out scoring (1 = score with models trained on every line)")
+    args = parser.parse_args()
+
+    ws = Workspace()
+    with metrics.stage('ngram_lm'):
+        with metrics.span('score', rows=len(ws.corpus.tokens)):
+            lines, folios = score_corpus(ws, args.level, args.order, args.by, args.folds)
+
+    print(f"--- {args.order}-gram {args.level} model ---")
+    if args.folds > 1:
+        print(f"Held out: every line is scored by models trained without its folio ({args.folds} folio folds)")
+    else:
+        print("In-sample: the models saw every line they score (group models favour their own group)")
+    print(f"Lines: {len(lines)}, median perplexity {lines['ppl'].median():.1f}")
+    print(f"\nMost surprising folios:")
+    print(folios.sort_values('ppl', ascending=False).head(args.top).to_string(index=False, float_format='%.1f'))
+    print(f"\nMost surprising lines (at least 3 symbols):")
+    long_lines = lines[lines['n_predicted'] > 3]
+    print(long_lines.sort_values('ppl', ascending=False).head(args.top)
+          .drop(columns=['line', 'log2prob']).to_string(index=False, float_format='%.1f'))
+    if args.by:
+        group_cols = [c for c in lines.columns if c.startswith('ppl_')]
+        print(f"\nMedian line perplexity per {args.by} (rows) under each group's model (columns):")
+        print(lines.groupby(args.by, observed=True)[group_cols].median().to_string(float_format='%.1f'))
+
+
+if __name__ == "__main__":
+    main()
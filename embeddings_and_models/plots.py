@@ -0,0 +1,37 @@
+"""
+Figures for the embedding scripts. Kept apart from the computations so the
+compute-only mode never imports matplotlib.
+"""
+
+import matplotlib.pyplot as plt
+
+
+def plot_embeddings(vocab, vectors_2d, out_path, label_top=600):
+    plt.figure(figsize=(15, 12))
+
+    # Color mapping by first letter (Morphological grouping)
+    first_letters = [w[0] for w in vocab]
+    unique_starts = sorted(list(set(first_letters)))
+    color_map = {l: i for i, l in enumerate(unique_starts)}
+    colors = [color_map[l] for l in first_letters]
+
+    # Smaller markers once the whole vocabulary is drawn
+    size = 20 if len(vocab) <= 1000 else 6
+    plt.scatter(vectors_2d[:, 0], vectors_2d[:, 1], c=colors, cmap='tab20', alpha=0.7, edgecolors='k', linewidth=0.3, s=size)
+
+    # Annotate words
+    for i, w in enumerate(vocab[:label_top]):
+        # Annotate top 40 frequent words + specific clusters of interest (among the most frequent words)
+        if i < 40 or any(sub in w for sub in ['daiin', 'shedy', 'chol', 'ol']):
+            plt.text(vectors_2d[i, 0]+0.2, vectors_2d[i, 1]+0.2, w, fontsize=9, alpha=0.9)
+
+    # Legend
+    handles = [plt.Line2D([0], [0], marker='o', color='w', markerfacecolor=plt.cm.tab20(color_map[l]/len(unique_starts)), label=l) 
+               for l in unique_starts if l in ['o', 'y', 'd', 's', 'q', 'c', 't', 'p']]
+    plt.legend(handles=handles, title="Starts With", loc='upper right')
+
+    plt.title(f'Voynich Word Embeddings: 2-D Projection of Semantic Clusters ({len(vocab)} words)')
+    plt.xlabel('Dimension 1')
+    plt.ylabel('Dimension 2')
+    plt.savefig(out_path)
+    plt.close()
@@ -0,0 +1,229 @@
+"""
+2-D projections of word vectors for the embedding plot.
+
+Projectors are plain functions registered in PROJECTORS by name; each takes
+(vectors, init, seed) and returns (n, 2) coordinates:
+ - 'pca':       the first two principal components (instant; also the
+                initialization of the others)
+ - 'tsne':      scikit-learn t-SNE, fine up to about a thousand words
+ - 'neighbors': neighbor-graph layout for the full vocabulary. The k nearest
+                neighbors come from neighbors.VectorIndex (cosine, batched;
+                inverted-file index for very large vocabularies) and are turned
+                into fuzzy edge weights; the layout then pulls edges together
+                and pushes random pairs apart (negative sampling), every epoch
+                as a handful of array operations over all sampled edges.
+'auto' picks t-SNE for small sets and the neighbor layout above AUTO_TSNE_MAX.
+
+Coordinates are cached per vector set (hash of the vocabulary and vectors)
+and starting layout in the embedding artifact cache. The last layout is also
+kept in data/embeddings/layout.npz, tagged with the vector set, method and
+seed it was computed for: for those it is returned as is, so repeated runs
+do not drift. When the vocabulary changed only slightly, it seeds the new
+layout (new words start next to their neighbors) and a
+shorter, gentler optimization keeps the picture stable between runs.
+"""
+
+import hashlib
+from pathlib import Path
+
+import numpy as np
+
+from embeddings_and_models.artifact_cache import ArtifactCache
+from embeddings_and_models.neighbors import EMBEDDINGS_DIR, VectorIndex
+from workspace import atomic_write
+
+AUTO_TSNE_MAX = 1000
+APPROXIMATE_MIN = 50000      # vocabularies above this use the approximate neighbor index
+WARM_START_OVERLAP = 0.8     # share of the words that must keep their previous position
+LAYOUT_FILE = EMBEDDINGS_DIR / "layout.npz"
+
+
+def pca_projection(vectors, init=None, seed=42):
+    centered = np.asarray(vectors, dtype=np.float64)
+    centered = centered - centered.mean(axis=0)
+    u, s, _ = np.linalg.svd(centered, full_matrices=False)
+    coords = u[:, :2] * s[:2]
+    return coords * np.sign(coords[np.argmax(np.abs(coords), axis=0), [0, 1]])  # deterministic orientation
+
+
+def tsne_projection(vectors, init=None, seed=42):
+    from sklearn.manifold import TSNE
+    if init is None:
+        init = pca_projection(vectors)
+        init = init / np.std(init[:, 0]) * 1e-4
+    perplexity = min(30, max(2, (len(vectors) - 1) // 3))
+    tsne = TSNE(n_components=2, perplexity=perplexity, random_state=seed, init=init, learning_rate='auto')
+    return tsne.fit_transform(vectors)
+
+
+def fuzzy_graph(vectors, k=15):
+    """
+    Symmetric weighted k-nearest-neighbor graph (cosine distances) as edge
+    arrays (heads, tails, weights), each edge in both directions.
+    """
+    n = len(vectors)
+    k = min(k, n - 1)
+    index = VectorIndex(range(n), vectors, approximate=n > APPROXIMATE_MIN)
+    ids, sims = index.search(index.unit, k + 1, exclude=np.arange(n)[:, None])
+    ids, dist = ids[:, :k], np.maximum(1.0 - sims[:, :k].astype(np.float64), 0.0)
+
+    # Per point: distance to its nearest neighbor (rho) and a scale (sigma) that
+    # makes the weights exp(-(d - rho) / sigma) sum to log2(k); bisection on all rows at once
+    rho = dist[:, :1]
+    lo, hi = np.zeros((n, 1)), np.full((n, 1), np.inf)
+    sigma = np.ones((n, 1))
+    target = np.log2(k)
+    for _ in range(64):
+        total = np.exp(-np.maximum(dist - rho, 0) / sigma).sum(axis=1, keepdims=True)
+        too_big = total > target
+        hi = np.where(too_big, sigma, hi)
+        lo = np.where(too_big, lo, sigma)
+        sigma = np.where(np.isinf(hi), sigma * 2, (lo + hi) / 2)
+    weights = np.exp(-np.maximum(dist - rho, 0) / np.maximum(sigma, 1e-12))
+
+    # Fuzzy union of the two directions: w_ij + w_ji - w_ij * w_ji
+    from scipy import sparse
+    m = sparse.csr_matrix((weights.ravel(), (np.repeat(np.arange(n), k), ids.ravel())), shape=(n, n))
+    m = (m + m.T - m.multiply(m.T)).tocoo()
+    return m.row.astype(np.int64), m.col.astype(np.int64), m.data
+
+
+def neighbor_layout(vectors, init=None, seed=42, n_epochs=200, negatives=5, learning_rate=1.0, k=15):
+    """Layout of the fuzzy neighbor graph of `vectors`, optimized in batched epochs."""
+    n = len(vectors)
+    if n <= 2:
+        return pca_projection(vectors)
+    heads, tails, weights = fuzzy_graph(vectors, k)
+    weights = weights / weights.max()
+    if init is None:
+        init = pca_projection(vectors)
+        init = 10 * init / np.abs(init).max()
+    x, y = np.array(init, dtype=np.float32).T.copy()
+    weights = weights.astype(np.float32)
+    rng = np.random.default_rng(seed)
+
+    def pull(h, t, attract):
+        # -attract on the heads, +attract on the tails of the picked edges
+        return np.bincount(t, weights=attract, minlength=n) - np.bincount(h, weights=attract, minlength=n)
+
+    for epoch in range(n_epochs):
+        alpha = learning_rate * (1 - epoch / n_epochs)
+        # Each edge takes part in an epoch with probability equal to its weight
+        picked = rng.random(len(heads), dtype=np.float32) < weights
+        h, t = heads[picked], tails[picked]
+        # Student-t similarity 1 / (1 + d^2), as in t-SNE
+        dx, dy = x[h] - x[t], y[h] - y[t]
+        coef = 2 / (1 + dx * dx + dy * dy)
+        grad_x = pull(h, t, np.clip(coef * dx, -4, 4))
+        grad_y = pull(h, t, np.clip(coef * dy, -4, 4))
+
+        # Negative sampling: every picked edge pushes its head away from random points
+        neg_h = np.repeat(h, negatives)
+        neg_t = rng.integers(n, size=len(neg_h))
+        dx, dy = x[neg_h] - x[neg_t], y[neg_h] - y[neg_t]
+        d2 = dx * dx + dy * dy
+        coef = np.where(neg_h == neg_t, 0, 2 / ((0.001 + d2) * (1 + d2)))
+        grad_x += np.bincount(neg_h, weights=np.clip(coef * dx, -4, 4), minlength=n)
+        grad_y += np.bincount(neg_h, weights=np.clip(coef * dy, -4, 4), minlength=n)
+
+        x += alpha * np.clip(grad_x, -4, 4)
+        y += alpha * np.clip(grad_y, -4, 4)
+    return np.column_stack([x, y]).astype(np.float64)
+
+
+PROJECTORS = {
+    'pca': pca_projection,
+    'tsne': tsne_projection,
+    'neighbors': neighbor_layout,
+}
+
+
+def vector_fingerprint(vocab, vectors):
+    h = hashlib.sha256()
+    h.update("\n".join(vocab).encode("utf-8"))
+    h.update(np.ascontiguousarray(vectors, dtype=np.float32).tobytes())
+    return h.hexdigest()
+
+
+def warm_start(vocab, vectors, layout_file: Path = LAYOUT_FILE):
+    """
+    Initial coordinates from the previous layout if most words are in it: known
+    words keep their position, new ones start at the mean of their placed
+    nearest neighbors. None when there is no usable previous layout.
+    """
+    layout = load_layout(layout_file)
+    if layout is None:
+        return None
+    old_vocab, old_coords = layout['vocab'], layout['coords']
+    position = {w: i for i, w in enumerate(old_vocab)}
+    known = np.array([w in position for w in vocab])
+    if len(vocab) == 0 or known.mean() < WARM_START_OVERLAP:
+        return None
+    init = np.zeros((len(vocab), 2))
+    init[known] = old_coords[[position[w] for w in np.asarray(vocab)[known]]]
+    new = np.flatnonzero(~known)
+    if len(new):
+        index = VectorIndex(np.flatnonzero(known), np.asarray(vectors)[known])
+        ids, _ = index.search(np.asarray(vectors)[new], k=5)
+        init[new] = init[known][ids].mean(axis=1)
+    return init
+
+
+def project(vocab, vectors, method='auto', seed=42, cache=True, layout_file: Path = LAYOUT_FILE):
+    """
+    2-D coordinates of `vectors` (one row per word of `vocab`) with the named
+    projector, cached per vector set and warm-started from the last layout.
+    """
+    vocab = [str(w) for w in vocab]
+    if method == 'auto':
+        method = 'tsne' if len(vocab) <= AUTO_TSNE_MAX else 'neighbors'
+    if method not in PROJECTORS:
+        raise ValueError(f"Unknown projection {method!r} (available: {', '.join(PROJECTORS)})")
+
+    fingerprint = vector_fingerprint(vocab, vectors)
+    source = f"{fingerprint}:{method}:{seed}"
+    layout = load_layout(layout_file)
+    if cache and layout is not None and layout['source'] == source:
+        return layout['coords']  # the last layout is already the one for these vectors
+
+    # The starting layout changes the result, so it is part of the cache key
+    init = warm_start(vocab, vectors, layout_file) if method != 'pca' else None
+    init_key = None if init is None else hashlib.sha256(np.ascontiguousarray(init).tobytes()).hexdigest()[:16]
+    store = ArtifactCache(fingerprint) if cache else None
+    params = {'method': method, 'seed': seed, 'init': init_key}
+    coords = None
+    if store is not None:
+        hit = store.get('projection', params)
+        coords = None if hit is None else hit['coords']
+    if coords is None:
+        kwargs = {}
+        if init is not None and method == 'neighbors':
+            # Refine the previous picture instead of laying it out again
+            kwargs = {'n_epochs': 50, 'learning_rate': 0.25}
+        coords = PROJECTORS[method](vectors, init=init, seed=seed, **kwargs)
+        if store is not None:
+            store.put('projection', params, {'coords': coords})
+
+    save_layout(layout_file, vocab, coords, source)
+    return coords
+
+
+def load_layout(layout_file: Path = LAYOUT_FILE):
+    """The last layout as {'vocab', 'coords', 'source'}, or None."""
+    try:
+        with np.load(layout_file, allow_pickle=False) as data:
+            source = str(data["source"]) if "source" in data.files else None
+            return {'vocab': data["vocab"].tolist(), 'coords': data["coords"], 'source': source}
+    except FileNotFoundError:
+        return None
+
+
+def save_layout(layout_file: Path, vocab, coords, source=None):
+    """
+    Write the layout, with the vector set / method / seed it was computed
+    for, through a temporary file so readers never see a partial one.
+    """
+    layout_file = Path(layout_file)
+    layout_file.parent.mkdir(parents=True, exist_ok=True)
+    with atomic_write(layout_file) as fh:
+        np.savez(fh, vocab=np.array(vocab), coords=coords, source=np.array(source or ""))
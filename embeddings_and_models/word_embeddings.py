@@ -1,87 +1,114 @@
-import pandas as pd
+from pathlib import Path
+
 import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.manifold import TSNE
-from sklearn.decomposition import TruncatedSVD
-from collections import Counter
-
-# 1. Load Data
-df = pd.read_csv('takeshi_parsed_words.csv')
-df_clean = df.dropna(subset=['cleaned_word'])
-
-# 2. Preprocess & Tokenize
-sentences = []
-all_tokens = []
-for line in df_clean['cleaned_word']:
-    words = [w for w in str(line).split('.') if w]
-    if words:
-        sentences.append(words)
-        all_tokens.extend(words)
-
-# 3. Build Embeddings (SVD on PPMI Matrix)
-# Parameters
-vocab_size = 600  # Focus on top frequent words for clearer clusters
-window_size = 2   # Context window (left/right)
-
-# Build Vocabulary
-counts = Counter(all_tokens)
-vocab = [w for w, c in counts.most_common(vocab_size)]
-word_to_id = {w: i for i, w in enumerate(vocab)}
-
-# Build Co-occurrence Matrix
-co_matrix = np.zeros((vocab_size, vocab_size))
-for sent in sentences:
-    sent_ids = [word_to_id[w] for w in sent if w in word_to_id]
-    for i, center_id in enumerate(sent_ids):
-        start = max(0, i - window_size)
-        end = min(len(sent_ids), i + window_size + 1)
-        for j in range(start, end):
-            if i != j:
-                context_id = sent_ids[j]
-                co_matrix[center_id, context_id] += 1
-
-# PPMI Calculation (Positive Pointwise Mutual Information)
-total_count = np.sum(co_matrix)
-row_sums = np.sum(co_matrix, axis=1)
-col_sums = np.sum(co_matrix, axis=0)
-expected = np.outer(row_sums, col_sums) / total_count
-
-with np.errstate(divide='ignore', invalid='ignore'):
-    pmi = np.log(co_matrix / expected)
-ppmi_matrix = np.maximum(pmi, 0) # Clip negatives
-ppmi_matrix = np.nan_to_num(ppmi_matrix)
-
-# Create Dense Vectors via SVD (Simulates Word2Vec)
-svd = TruncatedSVD(n_components=50, random_state=42)
-word_vectors = svd.fit_transform(ppmi_matrix)
-
-# 4. t-SNE Visualization
-tsne = TSNE(n_components=2, perplexity=30, random_state=42, init='pca', learning_rate='auto')
-vectors_2d = tsne.fit_transform(word_vectors)
-
-# 5. Plotting
-plt.figure(figsize=(15, 12))
-
-# Color mapping by first letter (Morphological grouping)
-first_letters = [w[0] for w in vocab]
-unique_starts = sorted(list(set(first_letters)))
-color_map = {l: i for i, l in enumerate(unique_starts)}
-colors = [color_map[l] for l in first_letters]
-
-plt.scatter(vectors_2d[:, 0], vectors_2d[:, 1], c=colors, cmap='tab20', alpha=0.7, edgecolors='k', linewidth=0.3)
-
-# Annotate words
-for i, w in enumerate(vocab):
-    # Annotate top 40 frequent words + specific clusters of interest
-    if i < 40 or any(sub in w for sub in ['daiin', 'shedy', 'chol', 'ol']):
-        plt.text(vectors_2d[i, 0]+0.2, vectors_2d[i, 1]+0.2, w, fontsize=9, alpha=0.9)
-
-# Legend
-handles = [plt.Line2D([0], [0], marker='o', color='w', markerfacecolor=plt.cm.tab20(color_map[l]/len(unique_starts)), label=l) 
-           for l in unique_starts if l in ['o', 'y', 'd', 's', 'q', 'c', 't', 'p']]
-plt.legend(handles=handles, title="Starts With", loc='upper right')
-
-plt.title('Voynich Word Embeddings: t-SNE Projection of Semantic Clusters')
-plt.xlabel('Dimension 1')
-plt.ylabel('Dimension 2')
-plt.savefig('voynich_embeddings_tsne.png')
\ No newline at end of file
+
+from embeddings_and_models.artifact_cache import ArtifactCache, corpus_fingerprint, pack_csr, unpack_csr
+from embeddings_and_models.cooccurrence import (combine_partials, corpus_cooccurrence, folio_cooccurrence,
+                                                  pack_partials, ppmi, unpack_partials)
+from embeddings_and_models.neighbors import VectorIndex, save_vectors
+from embeddings_and_models.projection import project
+import metrics
+from results import write_results
+from workspace import Workspace
+
+
+def compute(ws):
+    """Word vectors (SVD of the PPMI matrix) for the whole vocabulary, most frequent first."""
+    # 1. Load Data
+    corpus = ws.corpus
+
+    # 2. Build Embeddings (SVD on PPMI Matrix)
+    # Parameters
+    vocab_size = None      # None = full vocabulary; the sparse matrices have no quadratic cost
+    window_size = 2        # Context window (left/right)
+    window_weighting = 'uniform'  # 'uniform', 'harmonic' (1/d) or 'linear'
+
+    n_components = 50
+
+    # Each stage is cached on disk, keyed by the corpus contents and the parameters it depends on,
+    # so changing only the t-SNE / plotting settings reuses the stored vectors.
+    cache = ArtifactCache(corpus_fingerprint(corpus.path))
+    matrix_params = {'vocab_size': vocab_size, 'window_size': window_size, 'weighting': window_weighting}
+    svd_params = dict(matrix_params, n_components=n_components, random_state=42)
+
+    # Build Vocabulary + Co-occurrence Matrix (sparse, vectorized over the token stream).
+    # Over the full vocabulary the counts are summed from per-folio partials kept for
+    # this corpus directory, so after editing a few folios only those are counted again.
+    folio_cache = ArtifactCache(f"folios:{Path(corpus.path).resolve()}")
+    window_params = {'window_size': window_size, 'weighting': window_weighting}
+
+    def cooccurrence_stage():
+        def compute():
+            with metrics.span('cooccurrence', rows=len(corpus.tokens)):
+                if vocab_size is not None:
+                    vocab, co_matrix = corpus_cooccurrence(corpus, vocab_size=vocab_size, window_size=window_size,
+                                                           weighting=window_weighting)
+                else:
+                    stored = folio_cache.get('folio_cooccurrence', window_params)
+                    partials = folio_cooccurrence(corpus, window_size=window_size, weighting=window_weighting,
+                                                  previous=unpack_partials(stored) if stored else None)
+                    folio_cache.put('folio_cooccurrence', window_params, pack_partials(partials))
+                    vocab, co_matrix = combine_partials(corpus, partials)
+            return {'vocab': np.array(vocab, dtype=str), **pack_csr(co_matrix, 'co')}
+        return cache.cached('cooccurrence', matrix_params, compute)
+
+    # PPMI Calculation (Positive Pointwise Mutual Information), only over nonzero entries
+    def ppmi_stage():
+        def compute():
+            co_matrix = unpack_csr(cooccurrence_stage(), 'co')
+            with metrics.span('ppmi', rows=co_matrix.nnz):
+                return pack_csr(ppmi(co_matrix), 'ppmi')
+        return cache.cached('ppmi', matrix_params, compute)
+
+    # Create Dense Vectors via SVD (Simulates Word2Vec)
+    def svd_stage():
+        def compute():
+            from sklearn.decomposition import TruncatedSVD
+            svd = TruncatedSVD(n_components=n_components, random_state=42)
+            vocab, ppmi_matrix = cooccurrence_stage()['vocab'], unpack_csr(ppmi_stage(), 'ppmi')
+            with metrics.span('svd', rows=len(vocab)):
+                return {'vocab': vocab, 'vectors': svd.fit_transform(ppmi_matrix)}
+        return cache.cached('svd', svd_params, compute)
+
+    # Earlier stages are only loaded (or rebuilt) when the vectors themselves are missing
+    embedding = svd_stage()
+    return {'params': svd_params, 'vocab': embedding['vocab'].tolist(), 'vectors': embedding['vectors']}
+
+
+def main(ws=None, plot=True, results_dir=None):
+    ws = ws or Workspace()
+    with metrics.stage('word_embeddings'):
+        with metrics.span('compute'):
+            result = compute(ws)
+        print(f"Embeddings: {len(result['vocab'])} words x {result['vectors'].shape[1]} dimensions")
+
+        # Keep the vectors for similarity queries (embeddings_and_models/neighbors.py)
+        out_dir = save_vectors(result['vocab'], result['vectors'], result['params'])
+        index = VectorIndex(result['vocab'], result['vectors'])
+        probes = [w for w in ['daiin', 'shedy', 'chol'] if w in index.lookup]
+        for word, neighbors in zip(probes, index.similar(probes, k=8)):
+            print(f"  {word}: " + ", ".join(w for w, _ in neighbors))
+        print(f"Vectors saved to {out_dir}")
+        if results_dir is not None:
+            write_results('word_embeddings', result, results_dir)
+        if plot:
+            plot_size = None       # None = full vocabulary; e.g. 600 focuses on the most frequent words
+            projection = 'auto'    # 'neighbors', 'tsne' or 'pca' (see projection.py)
+
+            # Vocabulary is ordered by frequency, so the plot keeps the most frequent words
+            vocab = result['vocab'][:plot_size]
+            word_vectors = result['vectors'][:plot_size]
+
+            # 3. 2-D Projection (cached per vector set, warm-started from the previous layout)
+            with metrics.span('projection', rows=len(vocab)):
+                vectors_2d = project(vocab, word_vectors, method=projection)
+
+            # 4. Plotting (matplotlib is only imported when a figure is wanted)
+            from embeddings_and_models.plots import plot_embeddings
+            with ws.plot_lock, metrics.span('plot'):
+                plot_embeddings(vocab, vectors_2d, 'logs/voynich_embeddings_tsne.png')
+    return result
+
+
+if __name__ == "__main__":
+    main()
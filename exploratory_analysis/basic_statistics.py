@@ -1,70 +1,91 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import collections
 import numpy as np
 
-# 1. Load the data
-df = pd.read_csv('data/takeshi_parsed_words.csv')
+from exploratory_analysis.glyphs import encode_corpus
+import metrics
+from results import write_results
+from workspace import Workspace
 
-# 2. Preprocessing & Tokenization
-# The 'cleaned_word' column contains lines of text with words separated by dots (e.g., "word1.word2.word3")
-df_clean = df.dropna(subset=['cleaned_word'])
+# Common Voynich "vowels" in EVA transcription are generally considered to be: o, a, y, e (and sometimes i)
+VOYNICH_VOWELS = {'o', 'a', 'y', 'e', 'i'}
 
-all_tokens = []
-for line in df_clean['cleaned_word']:
-    # Split by '.' and remove empty strings resulting from consecutive/trailing dots
-    words = [w for w in str(line).split('.') if w]
-    all_tokens.extend(words)
 
-# 3. Compute Basic Statistics
-total_tokens = len(all_tokens)
-unique_types = len(set(all_tokens))
-word_lengths = [len(w) for w in all_tokens]
-total_characters = sum(word_lengths)
-avg_word_length = np.mean(word_lengths)
+def compute(ws):
+    """Corpus-wide counts, word lengths and glyph frequencies as plain data."""
+    # 1. Load the data
+    # Integer-encoded corpus written by parse_takeshi.py (token ids + vocabulary table)
+    corpus = ws.corpus
 
-# Character Frequencies
-all_text = "".join(all_tokens)
-char_counts = collections.Counter(all_text)
+    # 2. Preprocessing & Tokenization
+    # Words are already split; work on per-type counts instead of the token strings
+    type_counts = corpus.word_counts()
+    type_lengths = np.char.str_len(corpus.vocab)
+    # EVA glyphs per type (ch, sh, cth, iin, ... count as one glyph), cached with the corpus
+    type_glyphs, type_glyph_offsets, alphabet = encode_corpus(corpus)
+    type_glyph_lengths = np.diff(type_glyph_offsets)
 
-# 4. Language Comparisons
-# One-letter words
-one_letter_words = [w for w in all_tokens if len(w) == 1]
-count_one_letter = len(one_letter_words)
+    # 3. Compute Basic Statistics
+    total_tokens = len(corpus.tokens)
+    word_lengths = type_lengths[corpus.tokens]
+    glyph_lengths = type_glyph_lengths[corpus.tokens]
+    total_glyphs = int(glyph_lengths.sum())
 
-# Vowel Proportion
-# Common Voynich "vowels" in EVA transcription are generally considered to be: o, a, y, e (and sometimes i)
-voynich_vowels = {'o', 'a', 'y', 'e', 'i'}
-vowel_count = sum(count for char, count in char_counts.items() if char in voynich_vowels)
-vowel_proportion = vowel_count / total_characters if total_characters > 0 else 0
-
-# 5. Output Results
-print(f"--- Statistics ---")
-print(f"Total Word Tokens: {total_tokens}")
-print(f"Unique Word Types: {unique_types}")
-print(f"Total Characters: {total_characters}")
-print(f"Average Word Length: {avg_word_length:.2f}")
-print(f"One-letter Words: {count_one_letter} ({count_one_letter/total_tokens:.2%} of total)")
-print(f"Vowel Proportion (a, e, i, o, y): {vowel_proportion:.2%}")
-print(f"Top 5 Characters: {char_counts.most_common(5)}")
-
-# 6. Plotting
-fig, axes = plt.subplots(1, 2, figsize=(15, 6))
-
-# Histogram of Word Lengths
-axes[0].hist(word_lengths, bins=range(1, 15), align='left', rwidth=0.8, color='#5DADE2', edgecolor='black')
-axes[0].set_title('Distribution of Word Lengths')
-axes[0].set_xlabel('Length (characters)')
-axes[0].set_ylabel('Frequency')
-
-# Bar chart of Character Frequencies (Top 20)
-sorted_chars = sorted(char_counts.items(), key=lambda x: x[1], reverse=True)[:20]
-chars, counts = zip(*sorted_chars)
-
-axes[1].bar(chars, counts, color='#58D68D', edgecolor='black')
-axes[1].set_title('Top 20 Character Frequencies')
-axes[1].set_xlabel('Character')
-axes[1].set_ylabel('Frequency')
-
-plt.tight_layout()
-plt.savefig('logs/voynich_stats.png')
\ No newline at end of file
+    # Glyph Frequencies (each type's glyphs weighted by how often the type occurs)
+    glyph_totals = np.bincount(type_glyphs, weights=np.repeat(type_counts, type_glyph_lengths),
+                               minlength=len(alphabet)).astype(int)
+    order = np.argsort(-glyph_totals, kind='stable')
+    glyph_counts = {alphabet[i]: int(glyph_totals[i]) for i in order if glyph_totals[i] > 0}
+
+    # 4. Language Comparisons
+    # One-letter words
+    count_one_letter = int(type_counts[type_lengths == 1].sum())
+
+    # Vowel Proportion
+    vowel_count = sum(count for glyph, count in glyph_counts.items() if glyph in VOYNICH_VOWELS)
+
+    lengths, length_counts = np.unique(glyph_lengths, return_counts=True)
+    return {
+        'total_tokens': total_tokens,
+        'unique_types': int(np.count_nonzero(type_counts)),
+        'total_characters': int(word_lengths.sum()),
+        'total_glyphs': total_glyphs,
+        'avg_word_length': float(np.mean(word_lengths)),
+        'avg_word_glyphs': float(np.mean(glyph_lengths)),
+        'one_letter_words': count_one_letter,
+        'vowel_proportion': vowel_count / total_glyphs if total_glyphs > 0 else 0,
+        'glyph_counts': glyph_counts,
+        'word_length_histogram': dict(zip(lengths.tolist(), length_counts.tolist())),
+    }
+
+
+def report(result):
+    # 5. Output Results
+    total_tokens = result['total_tokens']
+    print(f"--- Statistics ---")
+    print(f"Total Word Tokens: {total_tokens}")
+    print(f"Unique Word Types: {result['unique_types']}")
+    print(f"Total Characters: {result['total_characters']}")
+    print(f"Total Glyphs: {result['total_glyphs']}")
+    print(f"Average Word Length: {result['avg_word_length']:.2f} characters, {result['avg_word_glyphs']:.2f} glyphs")
+    print(f"One-letter Words: {result['one_letter_words']} ({result['one_letter_words']/total_tokens:.2%} of total)")
+    print(f"Vowel Glyph Proportion (a, e, i, o, y): {result['vowel_proportion']:.2%}")
+    print(f"Top 5 Glyphs: {list(result['glyph_counts'].items())[:5]}")
+
+
+def main(ws=None, plot=True, results_dir=None):
+    ws = ws or Workspace()
+    with metrics.stage('basic_statistics'):
+        with metrics.span('compute'):
+            result = compute(ws)
+        report(result)
+        if results_dir is not None:
+            write_results('basic_statistics', result, results_dir)
+        if plot:
+            # 6. Plotting (matplotlib is only imported when a figure is wanted)
+            from exploratory_analysis.plots import plot_basic_statistics
+            with ws.plot_lock, metrics.span('plot'):
+                plot_basic_statistics(result, 'logs/voynich_stats.png')
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+EVA glyph tokenizer.
+
+EVA writes several Voynich glyphs with more than one Latin letter (the
+benches ch/sh, the benched gallows cth/ckh/cph/cfh, the iin family), so
+splitting words into letters breaks them into meaningless pieces. The
+tokenizer compiles the glyph inventory into one longest-match-first regex
+and encodes a whole vocabulary in a single scan of the joined text;
+encodings of a corpus are cached next to it on disk.
+"""
+
+import hashlib
+import re
+from pathlib import Path
+
+import numpy as np
+
+import metrics
+from workspace import atomic_write
+
+# Multi-letter EVA glyphs; every other character is a glyph on its own
+EVA_GLYPHS = ("cth", "ckh", "cph", "cfh", "ch", "sh", "iiin", "iin", "in")
+
+
+class GlyphTokenizer:
+    def __init__(self, glyphs=EVA_GLYPHS):
+        self.glyphs = tuple(sorted(set(glyphs), key=lambda g: (-len(g), g)))
+        # Longest alternatives first, so the regex always takes the longest glyph;
+        # "." (not matching newlines) falls back to single characters.
+        alternatives = [re.escape(g) for g in self.glyphs] + ["."]
+        self.pattern = re.compile("|".join(alternatives))
+
+    @property
+    def key(self):
+        """Short hash of the glyph inventory, used to name cache files."""
+        return hashlib.sha256("\n".join(self.glyphs).encode("utf-8")).hexdigest()[:16]
+
+    def split(self, word: str):
+        return self.pattern.findall(word)
+
+    def encode(self, words):
+        """
+        Encode a list of words in one batch.
+        Returns (glyphs, offsets, alphabet): word i is glyphs[offsets[i]:offsets[i+1]],
+        alphabet is sorted and maps glyph ids to glyph strings.
+        """
+        words = list(words)
+        text = "\n".join(words)
+        found = list(self.pattern.finditer(text))
+        matches = [m.group() for m in found]
+        starts = np.fromiter((m.start() for m in found), dtype=np.int64, count=len(found))
+
+        # Start position of every word in the joined text; each match belongs to the last word starting before it
+        word_starts = np.zeros(len(words), dtype=np.int64)
+        if words:
+            np.cumsum(np.fromiter((len(w) + 1 for w in words[:-1]), dtype=np.int64, count=len(words) - 1),
+                      out=word_starts[1:])
+        owner = np.searchsorted(word_starts, starts, side="right") - 1
+        offsets = np.zeros(len(words) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(owner, minlength=len(words)), out=offsets[1:])
+
+        alphabet, glyph_ids = np.unique(np.array(matches, dtype=str), return_inverse=True)
+        return glyph_ids.astype(np.int32), offsets, alphabet.tolist()
+
+
+DEFAULT_TOKENIZER = GlyphTokenizer()
+
+_memory_cache = {}
+
+
+def encode_corpus(corpus, tokenizer: GlyphTokenizer = DEFAULT_TOKENIZER):
+    """
+    Glyph encoding of every vocabulary type of a corpus_store.Corpus, as
+    (type_glyphs, type_offsets, alphabet). Cached in memory and in the corpus
+    directory, keyed by the glyph inventory and the vocabulary contents.
+    """
+    vocab_hash = hashlib.sha256("\n".join(corpus.vocab.tolist()).encode("utf-8")).hexdigest()[:16]
+    path = Path(corpus.path) / f"glyphs_{tokenizer.key}_{vocab_hash}.npz"
+    if path in _memory_cache:
+        return _memory_cache[path]
+
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            result = (data["glyphs"], data["offsets"], data["alphabet"].tolist())
+    except FileNotFoundError:
+        with metrics.span("glyph_tokenize", rows=len(corpus.vocab)):
+            glyphs, offsets, alphabet = tokenizer.encode(corpus.vocab.tolist())
+        # Written under a temporary name and renamed, so concurrent readers
+        # (server threads, pipeline stages) never load a half-written file
+        with atomic_write(path) as fh:
+            np.savez(fh, glyphs=glyphs, offsets=offsets, alphabet=np.array(alphabet, dtype=str))
+        # Drop encodings of older vocabularies for the same inventory
+        for stale in Path(corpus.path).glob(f"glyphs_{tokenizer.key}_*.npz"):
+            if stale != path:
+                stale.unlink(missing_ok=True)
+        result = (glyphs, offsets, alphabet)
+    _memory_cache[path] = result
+    return result
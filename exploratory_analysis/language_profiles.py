@@ -0,0 +1,277 @@
+"""
+Statistical profiles of reference-language corpora, compared with the Voynich text.
+
+A profile holds what basic_statistics.py looks at, in a form that can be
+compared across writing systems: word-length distribution, character
+frequencies, h1 (character entropy) and h2 (conditional entropy of the next
+character inside a word), Zipf slope of the word frequencies and positional
+preferences (which characters start and end words). For the Voynich corpus
+the characters are EVA glyphs (ch, sh, iin, ... count as one).
+
+Reference files (plain text, hundreds of MB) are read in byte ranges of
+CHUNK_BYTES, cut at line breaks, by worker processes that only count words;
+the word counts are merged and every other statistic is derived from the
+word types weighted by their counts, with array operations. Profiles are
+saved as JSON in data/profiles/<directory>_<file>.json together with the
+file's checksum (la/text.txt and it/text.txt are la_text and it_text), so a
+ranking of the references by distance to the Voynich profile only reads
+those small files. Alphabets differ, so characters are compared through
+their rank-frequency curves rather than letter by letter.
+
+Usage:
+    python -m exploratory_analysis.language_profiles data/reference/*.txt --jobs 8
+    python -m exploratory_analysis.language_profiles          # rank the stored profiles
+"""
+
+import argparse
+import json
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from exploratory_analysis.glyphs import encode_corpus
+from exploratory_analysis.ngrams import encode_chars
+from exploratory_analysis.timeline import entropy_bits
+from ingest import expand_inputs, file_checksum
+import metrics
+from workspace import POOL_CONTEXT, Workspace
+
+PROFILE_DIR = Path("data/profiles")
+CHUNK_BYTES = 32 * 1024 * 1024
+MAX_WORD_LENGTH = 20    # last bin holds every longer word
+ZIPF_RANKS = 1000       # the slope is fitted on the most frequent word types
+CHAR_RANKS = 40
+WORD_RE = re.compile(r'[^\W\d_]+')
+
+# Features compared as distributions (Jensen-Shannon, bits) and as scalars
+DISTRIBUTIONS = ['word_length', 'char_ranks', 'start_ranks', 'end_ranks']
+SCALARS = ['mean_word_length', 'h1', 'h2', 'zipf_slope']
+# Fixed unit of every scalar difference, about its spread across natural languages,
+# so a reference's distance does not depend on which other profiles are compared.
+# A difference d counts 1 - exp(-|d| / scale): bounded in [0, 1) like a
+# Jensen-Shannon divergence in bits, so no single scalar outweighs the rest
+SCALAR_SCALES = {'mean_word_length': 1.0, 'h1': 0.3, 'h2': 0.3, 'zipf_slope': 0.1}
+
+
+# --- counting ---------------------------------------------------------------
+
+def chunk_ranges(path: Path, chunk_bytes=CHUNK_BYTES):
+    size = Path(path).stat().st_size
+    return [(start, min(start + chunk_bytes, size)) for start in range(0, size, chunk_bytes)] or [(0, 0)]
+
+
+def count_words(path, start, end):
+    """Worker: word counts of the lines starting inside the byte range [start, end)."""
+    with Path(path).open("rb") as fh:
+        if start > 0:
+            fh.seek(start - 1)
+            fh.readline()  # a line running into the range belongs to the previous one
+        data = fh.read(max(end - fh.tell(), 0))
+        if data and not data.endswith(b"\n"):
+            data += fh.readline()  # finish the last line that starts inside the range
+    return Counter(WORD_RE.findall(data.decode("utf-8", errors="replace").lower()))
+
+
+# --- profiles ---------------------------------------------------------------
+
+def profile_from_types(type_symbols, type_offsets, alphabet, type_counts):
+    """
+    Profile of a corpus given as word types (symbol ids + Arrow-style offsets
+    over `alphabet`) and the number of tokens of every type.
+    """
+    type_symbols = np.asarray(type_symbols, dtype=np.int64)
+    type_offsets = np.asarray(type_offsets, dtype=np.int64)
+    counts = np.asarray(type_counts, dtype=np.float64)
+    present = counts > 0
+    A = len(alphabet)
+    lengths = np.diff(type_offsets)
+    symbol_weight = np.repeat(counts, lengths)
+    symbol_type = np.repeat(np.arange(len(lengths)), lengths)
+
+    char_counts = np.bincount(type_symbols, weights=symbol_weight, minlength=A)
+    inside = symbol_type[1:] == symbol_type[:-1]
+    bigrams = np.bincount((type_symbols[:-1] * A + type_symbols[1:])[inside],
+                          weights=symbol_weight[1:][inside], minlength=A * A).reshape(A, A)
+    nonempty = lengths > 0
+    start_counts = np.bincount(type_symbols[type_offsets[:-1][nonempty]], weights=counts[nonempty], minlength=A)
+    end_counts = np.bincount(type_symbols[type_offsets[1:][nonempty] - 1], weights=counts[nonempty], minlength=A)
+    word_length = np.bincount(np.clip(lengths[present], 0, MAX_WORD_LENGTH), weights=counts[present],
+                              minlength=MAX_WORD_LENGTH + 1)[1:]
+
+    ranked = np.sort(counts[present])[::-1][:ZIPF_RANKS]
+    ranks = np.arange(1, len(ranked) + 1)
+    zipf_slope = float(np.polyfit(np.log10(ranks), np.log10(ranked), 1)[0]) if len(ranked) > 1 else 0.0
+
+    entropy = lambda c: float(entropy_bits(np.asarray(c)[None, :])[0])
+    n_tokens = counts.sum()
+    return {
+        'n_tokens': int(n_tokens),
+        'n_types': int(np.count_nonzero(present)),
+        'alphabet': list(alphabet),
+        'char_counts': char_counts.astype(int).tolist(),
+        'start_counts': start_counts.astype(int).tolist(),
+        'end_counts': end_counts.astype(int).tolist(),
+        'word_length': word_length.astype(int).tolist(),
+        'mean_word_length': float(lengths @ counts / n_tokens) if n_tokens else 0.0,
+        'h1': entropy(char_counts),
+        'h2': entropy(bigrams.ravel()) - entropy(bigrams.sum(axis=1)),
+        'zipf_slope': zipf_slope,
+        'start_entropy': entropy(start_counts),
+        'end_entropy': entropy(end_counts),
+    }
+
+
+def profile_from_counts(word_counts: Counter):
+    words = list(word_counts)
+    symbols, offsets, alphabet = encode_chars(words)
+    return profile_from_types(symbols, offsets, alphabet, [word_counts[w] for w in words])
+
+
+def voynich_profile(ws):
+    """Profile of the corpus, with EVA glyphs as characters."""
+    corpus = ws.corpus
+    type_glyphs, type_offsets, alphabet = encode_corpus(corpus)
+    profile = profile_from_types(type_glyphs, type_offsets, alphabet, corpus.word_counts())
+    profile.update(name='voynich', source=str(corpus.path))
+    return profile
+
+
+def profile_name(path: Path):
+    """Name of a file's profile: its directory and stem, so same-named files in different folders don't collide."""
+    path = Path(path).resolve()
+    return f"{path.parent.name}_{path.stem}" if path.parent.name else path.stem
+
+
+def profile_path(name, profile_dir: Path = PROFILE_DIR):
+    return Path(profile_dir) / f"{name}.json"
+
+
+def load_profiles(profile_dir: Path = PROFILE_DIR):
+    """{name: profile} of every stored reference profile."""
+    return {p.stem: json.loads(p.read_text(encoding="utf-8")) for p in sorted(Path(profile_dir).glob("*.json"))}
+
+
+def build_profiles(paths, profile_dir: Path = PROFILE_DIR, n_jobs=None, chunk_bytes=CHUNK_BYTES, force=False):
+    """
+    Profile every file whose checksum changed since its stored profile. The
+    chunks of all files share one process pool. Returns the names profiled.
+    """
+    profile_dir = Path(profile_dir)
+    paths = [Path(p) for p in paths]
+    names = [profile_name(p) for p in paths]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise SystemExit(f"Several inputs map to the same profile name: {', '.join(duplicates)}")
+    todo = []
+    for path in paths:
+        checksum = file_checksum(path)
+        stored = profile_path(profile_name(path), profile_dir)
+        if not force and stored.exists() and json.loads(stored.read_text(encoding="utf-8")).get('checksum') == checksum:
+            continue
+        todo.append((path, checksum))
+
+    chunks = [(path, start, end) for path, _ in todo for start, end in chunk_ranges(path, chunk_bytes)]
+    totals = {path: Counter() for path, _ in todo}
+    n_jobs = max(1, min(n_jobs or os.cpu_count() or 1, len(chunks)))
+    with metrics.span('count_words', rows=sum(path.stat().st_size for path, _ in todo)):
+        if n_jobs == 1:
+            for path, start, end in chunks:
+                totals[path].update(count_words(path, start, end))
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=POOL_CONTEXT) as pool:
+                for (path, _, _), part in zip(chunks, metrics.collect(pool.map(metrics.in_worker(count_words), *zip(*chunks)))):
+                    totals[path].update(part)
+
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    for path, checksum in todo:
+        with metrics.span('profile', rows=len(totals[path])):
+            profile = profile_from_counts(totals[path])
+        profile.update(name=profile_name(path), source=str(path), checksum=checksum)
+        profile_path(profile_name(path), profile_dir).write_text(json.dumps(profile, indent=1), encoding="utf-8")
+    return [profile_name(path) for path, _ in todo]
+
+
+# --- comparison ------------------------------------------------------------
+
+def _rank_curve(counts, size=CHAR_RANKS):
+    curve = np.zeros(size)
+    ranked = np.sort(np.asarray(counts, dtype=np.float64))[::-1][:size]
+    curve[:len(ranked)] = ranked
+    return curve / max(curve.sum(), 1)
+
+
+def features(profile):
+    """Alphabet-independent feature distributions and scalars of a profile."""
+    word_length = np.asarray(profile['word_length'], dtype=np.float64)
+    return {
+        'word_length': word_length / max(word_length.sum(), 1),
+        'char_ranks': _rank_curve(profile['char_counts']),
+        'start_ranks': _rank_curve(profile['start_counts']),
+        'end_ranks': _rank_curve(profile['end_counts']),
+        **{name: profile[name] for name in SCALARS},
+    }
+
+
+def jensen_shannon(p, q):
+    m = (p + q) / 2
+    kl = lambda a: float(a[a > 0] @ np.log2(a[a > 0] / m[a > 0]))
+    return (kl(p) + kl(q)) / 2
+
+
+def rank_references(target, references):
+    """
+    Distance of every reference profile to `target`, closest first. Distribution
+    features use the Jensen-Shannon divergence (bits, in [0, 1]); scalar features
+    the absolute difference d mapped to 1 - exp(-|d| / scale) with the scales of
+    SCALAR_SCALES, which is also in [0, 1) and close to |d| / scale for small
+    differences. Every component thus contributes at most 1 and `distance`, their
+    unweighted sum, is not dominated by one far-off scalar.
+    """
+    target_f = features(target)
+    ref_f = {name: features(p) for name, p in references.items()}
+    rows = []
+    for name, f in ref_f.items():
+        row = {'reference': name}
+        row.update({d: jensen_shannon(target_f[d], f[d]) for d in DISTRIBUTIONS})
+        row.update({s: -np.expm1(-abs(target_f[s] - f[s]) / SCALAR_SCALES[s]) for s in SCALARS})
+        row['distance'] = sum(row[c] for c in DISTRIBUTIONS + SCALARS)
+        rows.append(row)
+    table = pd.DataFrame(rows, columns=['reference', 'distance'] + DISTRIBUTIONS + SCALARS)
+    return table.sort_values('distance').reset_index(drop=True)
+
+
+def summary(profiles):
+    """One row of headline numbers per profile."""
+    cols = ['n_tokens', 'n_types', 'mean_word_length', 'h1', 'h2', 'zipf_slope', 'start_entropy', 'end_entropy']
+    return pd.DataFrame([{'profile': name, 'alphabet': len(p['alphabet']), **{c: p[c] for c in cols}}
+                         for name, p in profiles.items()])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile reference-language corpora and rank them against the Voynich text")
+    parser.add_argument("inputs", nargs="*", help="plain-text files, directories or glob patterns to profile")
+    parser.add_argument("--jobs", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="profile files again even if they did not change")
+    args = parser.parse_args()
+
+    with metrics.stage('language_profiles'):
+        if args.inputs:
+            done = build_profiles(expand_inputs(args.inputs), n_jobs=args.jobs, force=args.force)
+            print(f"Profiled: {', '.join(done) or 'nothing changed'}")
+        references = load_profiles()
+        if not references:
+            raise SystemExit(f"No reference profiles in {PROFILE_DIR} (pass some text files to profile)")
+        target = voynich_profile(Workspace())
+
+    print(summary({'voynich': target, **references}).to_string(index=False, float_format='%.3f'))
+    print("\n--- Distance to the Voynich profile (closest first) ---")
+    print(rank_references(target, references).to_string(index=False, float_format='%.3f'))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Prefix / stem / suffix segmentation of the vocabulary by branching entropy.
+
+Words are EVA glyph sequences (glyphs.encode_corpus), so qo-, -aiin or -dy
+are two-glyph affixes. Two array-backed tries are built over the word types:
+a forward trie of prefixes and a reverse trie of suffixes. A trie level is
+one np.unique over (parent node, glyph) codes, and the branching entropy of
+a node (how unpredictable the next glyph, or the end of the word, is after
+that prefix) comes from a bincount over its children. Entropies count word
+types, not tokens, so an affix is strong when it combines with many stems.
+
+The strength of a boundary inside a word is the forward entropy of the part
+before it plus the reverse entropy of the part after it. A prefix (suffix)
+candidate is a trie node of at most `max_affix` glyphs shared by at least
+`min_types` types; a boundary counts only when it is stronger than the
+`quantile` of all boundaries in the vocabulary. Every type gets the pair of
+boundaries (each optional, at least one stem glyph between them) with the
+largest summed margin over that threshold, chosen for all types at once on
+a padded (type x position) matrix.
+
+Tokens inherit the segmentation of their type. The per-type ids and the
+folio x prefix / stem / suffix counts are stored in the corpus directory
+(morphology_<hash>.npz, keyed by the corpus contents and the parameters), so
+tables per folio, section or Currier language are sums of stored rows.
+
+Usage:
+    python -m exploratory_analysis.morphology                  # affix inventory
+    python -m exploratory_analysis.morphology --by currier --top 15
+"""
+
+import argparse
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from exploratory_analysis.glyphs import encode_corpus
+import metrics
+from workspace import Workspace, atomic_write
+
+KINDS = ('prefix', 'stem', 'suffix')
+GROUPINGS = ('folio', 'section', 'currier')
+MIN_TYPES = 20
+MAX_AFFIX = 3
+BOUNDARY_QUANTILE = 0.8
+
+
+def branching_entropy(symbols, offsets, n_symbols):
+    """
+    Trie of the sequences symbols[offsets[i]:offsets[i + 1]]. Returns
+    (node, n_types, entropy): the trie node of the prefix ending at every
+    symbol, and per node the number of sequences through it and the entropy
+    (bits) of what follows it (a child or the end of the sequence). Node 0
+    is the empty prefix.
+    """
+    symbols = np.asarray(symbols, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    position = np.arange(len(symbols)) - np.repeat(offsets[:-1], lengths)
+    node = np.zeros(len(symbols), dtype=np.int64)
+    parents = [np.array([-1], dtype=np.int64)]
+    n_nodes = 1
+    by_depth = np.argsort(position, kind='stable')
+    depth_starts = np.searchsorted(position[by_depth], np.arange(lengths.max(initial=0) + 1))
+    for d in range(len(depth_starts) - 1):
+        at = by_depth[depth_starts[d]:depth_starts[d + 1]]
+        parent = node[at - 1] if d else np.zeros(len(at), dtype=np.int64)
+        codes, inverse = np.unique(parent * n_symbols + symbols[at], return_inverse=True)
+        node[at] = n_nodes + inverse
+        parents.append(codes // n_symbols)
+        n_nodes += len(codes)
+    parent = np.concatenate(parents)
+
+    n_types = np.bincount(node, minlength=n_nodes).astype(np.float64)
+    n_types[0] = len(lengths)
+    ends = np.bincount(node[offsets[1:][lengths > 0] - 1], minlength=n_nodes).astype(np.float64)
+    ends[0] = np.count_nonzero(lengths == 0)
+
+    def plogp(count, total):
+        p = count / total
+        return np.where(p > 0, p * np.log2(np.where(p > 0, p, 1)), 0.0)
+
+    child = np.arange(1, n_nodes)
+    entropy = -np.bincount(parent[child], weights=plogp(n_types[child], n_types[parent[child]]), minlength=n_nodes)
+    entropy -= plogp(ends, np.maximum(n_types, 1))
+    return node, n_types, entropy
+
+
+def reverse_order(offsets):
+    """Index that reverses every segment of a flat array in place."""
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    starts = np.repeat(offsets[:-1], lengths)
+    position = np.arange(offsets[-1]) - starts
+    return starts + np.repeat(lengths, lengths) - 1 - position
+
+
+def segment_types(type_glyphs, type_offsets, n_symbols, min_types=MIN_TYPES, max_affix=MAX_AFFIX,
+                  quantile=BOUNDARY_QUANTILE):
+    """
+    Prefix end and suffix start (in glyphs) of every type, plus the branching
+    entropy of its prefix and suffix (NaN where there is none).
+    """
+    glyphs = np.asarray(type_glyphs, dtype=np.int64)
+    offsets = np.asarray(type_offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    n = len(lengths)
+    word = np.repeat(np.arange(n), lengths)
+    position = np.arange(len(glyphs)) - offsets[word]
+
+    # Forward trie: prefix ending at each glyph; reverse trie: suffix starting at each glyph
+    f_node, f_types, f_entropy = branching_entropy(glyphs, offsets, n_symbols)
+    reverse = reverse_order(offsets)
+    r_node = np.empty(len(glyphs), dtype=np.int64)
+    r_node[reverse], r_types, r_entropy = branching_entropy(glyphs[reverse], offsets, n_symbols)
+
+    # Boundary k (1..length-1) of a word lies between glyphs k - 1 and k
+    inner = np.flatnonzero(position[:-1] < lengths[word[:-1]] - 1) if len(glyphs) else np.zeros(0, dtype=np.int64)
+    rows, cols = word[inner], position[inner] + 1
+    strength = f_entropy[f_node[inner]] + r_entropy[r_node[inner + 1]]
+    threshold = np.quantile(strength, quantile) if len(strength) else 0.0
+    margin = strength - threshold
+    is_prefix = (f_types[f_node[inner]] >= min_types) & (cols <= max_affix) & (margin >= 0)
+    is_suffix = (r_types[r_node[inner + 1]] >= min_types) & (lengths[rows] - cols <= max_affix) & (margin >= 0)
+
+    # gain[t, k]: margin of boundary k as a prefix / suffix boundary; no prefix
+    # (k = 0) and no suffix (k = length) cost nothing
+    width = lengths.max(initial=0) + 1
+    prefix_gain = np.full((n, width), -np.inf)
+    suffix_gain = np.full((n, width), -np.inf)
+    prefix_gain[:, 0] = 0.0
+    suffix_gain[np.arange(n), lengths] = 0.0
+    prefix_gain[rows[is_prefix], cols[is_prefix]] = margin[is_prefix]
+    suffix_gain[rows[is_suffix], cols[is_suffix]] = margin[is_suffix]
+
+    # Best suffix boundary strictly after every k, then the best pair
+    after = np.full((n, width), -np.inf)
+    after[:, :-1] = np.maximum.accumulate(suffix_gain[:, ::-1], axis=1)[:, ::-1][:, 1:]
+    prefix_end = np.argmax(prefix_gain + after, axis=1)
+    later = np.where(np.arange(width) > prefix_end[:, None], suffix_gain, -np.inf)
+    suffix_start = np.argmax(later, axis=1)
+    if n and lengths.min() == 0:
+        empty = lengths == 0
+        prefix_end[empty], suffix_start[empty] = 0, 0
+
+    has_prefix = prefix_end > 0
+    has_suffix = suffix_start < lengths
+    prefix_entropy = np.full(n, np.nan)
+    suffix_entropy = np.full(n, np.nan)
+    prefix_entropy[has_prefix] = f_entropy[f_node[offsets[:-1][has_prefix] + prefix_end[has_prefix] - 1]]
+    suffix_entropy[has_suffix] = r_entropy[r_node[offsets[:-1][has_suffix] + suffix_start[has_suffix]]]
+    return prefix_end, suffix_start, prefix_entropy, suffix_entropy
+
+
+class Morphology:
+    """
+    Segmentation of a corpus' vocabulary. For each kind (prefix, stem, suffix):
+      strings[kind]:      the distinct morphs ('' = no prefix / suffix)
+      type_ids[kind]:     morph id of every vocabulary type
+      folio_counts[kind]: sparse (n_folios x n_morphs) token counts
+    and entropy[kind] the branching entropy of every prefix / suffix.
+    """
+
+    def __init__(self, strings, type_ids, folio_counts, entropy):
+        self.strings = strings
+        self.type_ids = type_ids
+        self.folio_counts = folio_counts
+        self.entropy = entropy
+
+    @classmethod
+    def build(cls, corpus, min_types=MIN_TYPES, max_affix=MAX_AFFIX, quantile=BOUNDARY_QUANTILE):
+        type_glyphs, type_offsets, alphabet = encode_corpus(corpus)
+        prefix_end, suffix_start, prefix_entropy, suffix_entropy = segment_types(
+            type_glyphs, type_offsets, len(alphabet), min_types, max_affix, quantile)
+
+        # Glyph boundaries -> character positions, to cut the vocabulary strings
+        char_ends = np.cumsum(np.array([len(g) for g in alphabet])[type_glyphs])
+        char_ends = np.concatenate([[0], char_ends])
+        starts = char_ends[type_offsets[:-1]]
+        prefix_chars = char_ends[type_offsets[:-1] + prefix_end] - starts
+        suffix_chars = char_ends[type_offsets[:-1] + suffix_start] - starts
+        vocab = corpus.vocab.tolist()
+        parts = {
+            'prefix': [w[:p] for w, p in zip(vocab, prefix_chars)],
+            'stem': [w[p:s] for w, p, s in zip(vocab, prefix_chars, suffix_chars)],
+            'suffix': [w[s:] for w, s in zip(vocab, suffix_chars)],
+        }
+
+        token_folio = corpus.token_folio()
+        tokens = np.asarray(corpus.tokens)
+        strings, type_ids, folio_counts, entropy = {}, {}, {}, {}
+        for kind in KINDS:
+            strings[kind], ids = np.unique(np.array(parts[kind], dtype=str), return_inverse=True)
+            type_ids[kind] = ids.astype(np.int32)
+            # One pass over the tokens; every table afterwards sums these rows
+            m = len(strings[kind])
+            codes, counts = np.unique(token_folio.astype(np.int64) * m + type_ids[kind][tokens], return_counts=True)
+            folio_counts[kind] = sparse.csr_matrix((counts, (codes // m, codes % m)), shape=(len(corpus.folios), m))
+        for kind, values in (('prefix', prefix_entropy), ('suffix', suffix_entropy)):
+            entropy[kind] = np.full(len(strings[kind]), np.nan)
+            entropy[kind][type_ids[kind]] = values
+        return cls(strings, type_ids, folio_counts, entropy)
+
+    def save(self, path: Path):
+        """Write to `path` through a temporary file, so concurrent readers never load a partial one."""
+        path = Path(path)
+        arrays = {}
+        for kind in KINDS:
+            counts = self.folio_counts[kind].tocoo()
+            arrays.update({f'{kind}_strings': self.strings[kind], f'{kind}_ids': self.type_ids[kind],
+                           f'{kind}_rows': counts.row, f'{kind}_cols': counts.col, f'{kind}_counts': counts.data,
+                           f'{kind}_shape': np.array(counts.shape)})
+        for kind, values in self.entropy.items():
+            arrays[f'{kind}_entropy'] = values
+        with atomic_write(path) as fh:
+            np.savez(fh, **arrays)
+
+    @classmethod
+    def load(cls, path: Path):
+        with np.load(path, allow_pickle=False) as data:
+            strings = {kind: data[f'{kind}_strings'] for kind in KINDS}
+            type_ids = {kind: data[f'{kind}_ids'] for kind in KINDS}
+            folio_counts = {kind: sparse.csr_matrix((data[f'{kind}_counts'], (data[f'{kind}_rows'], data[f'{kind}_cols'])),
+                                                    shape=tuple(data[f'{kind}_shape'])) for kind in KINDS}
+            entropy = {kind: data[f'{kind}_entropy'] for kind in ('prefix', 'suffix')}
+        return cls(strings, type_ids, folio_counts, entropy)
+
+    def segment(self, token_ids):
+        """(prefix, stem, suffix) morph ids of every token."""
+        token_ids = np.asarray(token_ids)
+        return tuple(self.type_ids[kind][token_ids] for kind in KINDS)
+
+    def split(self, type_id):
+        """Segmentation of one vocabulary type as strings."""
+        return tuple(str(self.strings[kind][self.type_ids[kind][type_id]]) for kind in KINDS)
+
+    def affixes(self, kind='suffix'):
+        """Prefixes or suffixes with the number of types and tokens that use them, most frequent first."""
+        if kind not in ('prefix', 'suffix'):
+            raise ValueError(f"kind must be 'prefix' or 'suffix', not {kind!r}")
+        table = pd.DataFrame({
+            kind: self.strings[kind],
+            'types': np.bincount(self.type_ids[kind], minlength=len(self.strings[kind])),
+            'tokens': np.asarray(self.folio_counts[kind].sum(axis=0)).ravel(),
+            'branching_entropy': self.entropy[kind],
+        })
+        table = table[table[kind] != '']
+        return table.sort_values('tokens', ascending=False).reset_index(drop=True)
+
+    def table(self, kind, folio_groups=None, top=None):
+        """
+        Token counts of every morph (rows, most frequent first) per group of
+        folios (columns). `folio_groups` gives the group of every folio id
+        (e.g. its section); None keeps one column per folio.
+        """
+        counts = self.folio_counts[kind]
+        if folio_groups is None:
+            columns = np.arange(counts.shape[0])
+            grouped = counts
+        else:
+            groups = pd.Categorical(folio_groups)
+            columns = groups.categories
+            member = sparse.csr_matrix((np.ones(len(groups)), (groups.codes, np.arange(len(groups)))),
+                                       shape=(len(columns), counts.shape[0]))
+            grouped = member @ counts
+        totals = np.asarray(grouped.sum(axis=0)).ravel()
+        order = np.argsort(-totals, kind='stable')[:top]
+        return pd.DataFrame(grouped[:, order].T.toarray().astype(np.int64),
+                            index=pd.Index(self.strings[kind][order], name=kind), columns=columns)
+
+
+def morphology_key(corpus, params):
+    """Short hash of the corpus vocabulary, token stream, line table and segmentation parameters."""
+    h = hashlib.sha256()
+    h.update("\n".join(corpus.vocab.tolist()).encode("utf-8"))
+    for name in ("tokens", "line_offsets", "line_folio"):
+        h.update(np.ascontiguousarray(getattr(corpus, name)).tobytes())
+    h.update(json.dumps(params, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def segment_corpus(corpus, min_types=MIN_TYPES, max_affix=MAX_AFFIX, quantile=BOUNDARY_QUANTILE):
+    """Morphology of a corpus_store.Corpus, cached in the corpus directory."""
+    params = {'min_types': min_types, 'max_affix': max_affix, 'quantile': quantile}
+    path = Path(corpus.path) / f"morphology_{morphology_key(corpus, params)}.npz"
+    try:
+        return Morphology.load(path)
+    except FileNotFoundError:
+        pass
+    with metrics.span("segment", rows=len(corpus.vocab)):
+        morphology = Morphology.build(corpus, **params)
+    morphology.save(path)
+    # Drop segmentations of older corpora or parameters once the new one is in place
+    for stale in Path(corpus.path).glob("morphology_*.npz"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+    return morphology
+
+
+def folio_groups(ws, by):
+    """Group of every folio id: the folio itself, its section or its Currier language."""
+    if by == 'folio':
+        return ws.corpus.folios
+    if by in ('section', 'currier'):
+        return ws.folio_table[by].to_numpy()
+    raise ValueError(f"by must be one of {GROUPINGS}, not {by!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefix / stem / suffix segmentation by branching entropy")
+    parser.add_argument("--by", choices=GROUPINGS, default="section", help="grouping of the frequency tables")
+    parser.add_argument("--top", type=int, default=10, help="morphs per table")
+    args = parser.parse_args()
+
+    ws = Workspace()
+    with metrics.stage('morphology'):
+        morphology = ws.morphology
+        groups = folio_groups(ws, args.by)
+
+    for kind in ('prefix', 'suffix'):
+        print(f"--- Most frequent {kind}es ---")
+        print(morphology.affixes(kind).head(args.top).to_string(index=False, float_format='%.2f'))
+    counts = ws.corpus.word_counts()
+    frequent = np.argsort(-counts, kind='stable')[:20]
+    print("\nFrequent words: " + " ".join("-".join(p for p in morphology.split(i) if p) for i in frequent))
+    for kind in KINDS:
+        table = morphology.table(kind, groups, top=args.top)
+        print(f"\n--- {kind.capitalize()} counts per {args.by} ---")
+        print(table.to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Vectorized glyph n-gram counting.
+
+The corpus is turned into one flat int array of glyph ids (GlyphStream) and
+every statistic is computed with array operations on it:
+ - an n-gram is packed into a single integer (base = alphabet size), so the
+   counts for any order come from one np.unique call
+ - windows that would cross a word (or line) boundary are masked out, or
+   kept when the old "joined text" behaviour is wanted
+ - positional profiles (start / middle / end) use the word offsets directly
+"""
+
+import numpy as np
+
+from exploratory_analysis.glyphs import DEFAULT_TOKENIZER, GlyphTokenizer, encode_corpus
+
+
+class GlyphStream:
+    """
+    Flat glyph-id stream of a token sequence.
+
+    glyphs:       glyph id of every glyph, words concatenated
+    word_offsets: int64, len = n_words + 1; word i is glyphs[off[i]:off[i+1]]
+    alphabet:     glyph string of every id
+    """
+
+    def __init__(self, glyphs, word_offsets, alphabet):
+        self.glyphs = np.asarray(glyphs, dtype=np.int32)
+        self.word_offsets = np.asarray(word_offsets, dtype=np.int64)
+        self.alphabet = list(alphabet)
+
+    @property
+    def n_symbols(self):
+        return len(self.alphabet)
+
+    def word_of_glyph(self):
+        """Word index of every glyph."""
+        return np.repeat(np.arange(len(self.word_offsets) - 1), np.diff(self.word_offsets))
+
+    @classmethod
+    def from_types(cls, type_glyphs, type_offsets, alphabet, token_ids):
+        """
+        Expand per-type glyph encodings (type_glyphs/type_offsets, Arrow-style)
+        to the token stream `token_ids` without a Python loop.
+        """
+        token_ids = np.asarray(token_ids, dtype=np.int64)
+        lengths = np.diff(type_offsets)[token_ids]
+        word_offsets = np.zeros(len(token_ids) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=word_offsets[1:])
+        # position of every output glyph inside its type's encoding
+        shift = np.repeat(np.asarray(type_offsets)[token_ids] - word_offsets[:-1], lengths)
+        idx = np.arange(word_offsets[-1], dtype=np.int64) + shift
+        return cls(np.asarray(type_glyphs)[idx], word_offsets, alphabet)
+
+    @classmethod
+    def from_corpus(cls, corpus, tokenizer: GlyphTokenizer = DEFAULT_TOKENIZER):
+        """
+        Glyph stream of a corpus_store.Corpus, using the (cached) EVA glyph
+        encoding; tokenizer=None falls back to one glyph per character.
+        """
+        if tokenizer is None:
+            type_glyphs, type_offsets, alphabet = encode_chars(corpus.vocab)
+        else:
+            type_glyphs, type_offsets, alphabet = encode_corpus(corpus, tokenizer)
+        return cls.from_types(type_glyphs, type_offsets, alphabet, corpus.tokens)
+
+
+def encode_chars(words):
+    """Encode each word as one glyph per character. Returns (glyphs, offsets, alphabet)."""
+    alphabet = sorted(set("".join(words)))
+    lookup = {c: i for i, c in enumerate(alphabet)}
+    glyphs = np.fromiter((lookup[c] for w in words for c in w), dtype=np.int32)
+    offsets = np.zeros(len(words) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter((len(w) for w in words), dtype=np.int64, count=len(words)), out=offsets[1:])
+    return glyphs, offsets, alphabet
+
+
+def ngram_codes(glyphs, n, n_symbols, segments=None):
+    """
+    Integer code of every n-gram window in `glyphs`.
+    If `segments` (segment id per glyph) is given, windows spanning two segments are dropped.
+    """
+    glyphs = np.asarray(glyphs, dtype=np.int64)
+    n_windows = len(glyphs) - n + 1
+    if n_windows <= 0:
+        return np.zeros(0, dtype=np.int64)
+    if n_symbols ** n >= np.iinfo(np.int64).max:
+        raise ValueError(f"{n}-grams over {n_symbols} symbols do not fit in an int64 code")
+    codes = np.zeros(n_windows, dtype=np.int64)
+    for k in range(n):
+        codes = codes * n_symbols + glyphs[k:k + n_windows]
+    if segments is not None:
+        segments = np.asarray(segments)
+        codes = codes[segments[:n_windows] == segments[n - 1:]]
+    return codes
+
+
+def decode_ngram(code, n, alphabet):
+    K = len(alphabet)
+    out = []
+    for _ in range(n):
+        code, g = divmod(int(code), K)
+        out.append(alphabet[g])
+    return "".join(reversed(out))
+
+
+def ngram_counts(stream: GlyphStream, n, within_words=True):
+    """
+    Counts of every observed n-gram. Returns (codes, counts), codes sorted.
+    within_words=False counts over the concatenated text, across word boundaries.
+    """
+    segments = stream.word_of_glyph() if within_words else None
+    codes = ngram_codes(stream.glyphs, n, stream.n_symbols, segments)
+    return np.unique(codes, return_counts=True)
+
+
+def ngram_table(stream: GlyphStream, n, within_words=True, top=None):
+    """List of (ngram_string, count), most frequent first."""
+    codes, counts = ngram_counts(stream, n, within_words)
+    order = np.argsort(-counts, kind='stable')
+    if top is not None:
+        order = order[:top]
+    return [(decode_ngram(codes[i], n, stream.alphabet), int(counts[i])) for i in order]
+
+
+def transition_probs(codes, counts, n_symbols):
+    """
+    P(last glyph | previous n-1 glyphs) for every n-gram in (codes, counts).
+    Works for any order: the context of a code is code // n_symbols.
+    """
+    contexts = np.asarray(codes) // n_symbols
+    _, inverse = np.unique(contexts, return_inverse=True)
+    context_totals = np.bincount(inverse, weights=counts)
+    return np.asarray(counts) / context_totals[inverse]
+
+
+def transition_matrix(stream: GlyphStream, within_words=True):
+    """Dense bigram count matrix (n_symbols x n_symbols)."""
+    K = stream.n_symbols
+    segments = stream.word_of_glyph() if within_words else None
+    codes = ngram_codes(stream.glyphs, 2, K, segments)
+    return np.bincount(codes, minlength=K * K).reshape(K, K)
+
+
+def positional_profile(symbols, offsets, n_symbols):
+    """
+    Start / middle / end / total counts per symbol, for symbols grouped into
+    segments by `offsets` (glyphs in words, or words in lines).
+
+    A one-symbol segment counts as both start and end (once in total); in
+    longer segments the first is a start, the last an end, the rest middle.
+    Returns a dict of int arrays of length n_symbols.
+    """
+    symbols = np.asarray(symbols, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    lengths = np.diff(offsets)
+    nonempty = lengths > 0
+    first = symbols[offsets[:-1][nonempty]]
+    last = symbols[offsets[1:][nonempty] - 1]
+
+    is_edge = np.zeros(len(symbols), dtype=bool)
+    is_edge[offsets[:-1][nonempty]] = True
+    is_edge[offsets[1:][nonempty] - 1] = True
+
+    start = np.bincount(first, minlength=n_symbols)
+    end = np.bincount(last, minlength=n_symbols)
+    middle = np.bincount(symbols[~is_edge], minlength=n_symbols)
+    total = np.bincount(symbols, minlength=n_symbols)
+    return {'start': start, 'middle': middle, 'end': end, 'total': total}
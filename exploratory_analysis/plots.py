@@ -0,0 +1,115 @@
+"""
+Figures for the exploratory scripts. Each function takes the dict returned by
+the script's compute() and writes one PNG; matplotlib/seaborn are only
+imported here, so the compute-only mode starts without them.
+"""
+
+import pandas as pd
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+from exploratory_analysis.sections import SECTIONS
+
+
+def plot_basic_statistics(result, out_path):
+    fig, axes = plt.subplots(1, 2, figsize=(15, 6))
+
+    # Histogram of Word Lengths
+    histogram = result['word_length_histogram']
+    axes[0].hist(list(histogram), weights=list(histogram.values()), bins=range(1, 15), align='left',
+                 rwidth=0.8, color='#5DADE2', edgecolor='black')
+    axes[0].set_title('Distribution of Word Lengths')
+    axes[0].set_xlabel('Length (glyphs)')
+    axes[0].set_ylabel('Frequency')
+
+    # Bar chart of Glyph Frequencies (Top 20)
+    sorted_glyphs = sorted(result['glyph_counts'].items(), key=lambda x: x[1], reverse=True)[:20]
+    glyphs, counts = zip(*sorted_glyphs)
+
+    axes[1].bar(glyphs, counts, color='#58D68D', edgecolor='black')
+    axes[1].set_title('Top 20 Glyph Frequencies')
+    axes[1].set_xlabel('Glyph')
+    axes[1].set_ylabel('Frequency')
+
+    plt.tight_layout()
+    plt.savefig(out_path)
+    plt.close()
+
+
+def plot_word_ocurrence(result, out_path):
+    fig, axes = plt.subplots(2, 2, figsize=(18, 16))
+
+    # Plot 1: Top Line-Start Words
+    sns.barplot(data=result['top_starts'], x='start_freq', y='word', ax=axes[0,0], palette='Blues_d')
+    axes[0,0].set_title('Words Preferring Line-Start Position')
+
+    # Plot 2: Top Line-End Words
+    sns.barplot(data=result['top_ends'], x='end_freq', y='word', ax=axes[0,1], palette='Reds_d')
+    axes[0,1].set_title('Words Preferring Line-End Position')
+
+    # Plot 3: Glyph Position Heatmap
+    heatmap_data = result['glyph_positions'].set_index('glyph')[['start_prop', 'middle_prop', 'end_prop']]
+    sns.heatmap(heatmap_data, cmap='viridis', ax=axes[1,0])
+    axes[1,0].set_title('Glyph Position Preferences')
+
+    # Plot 4: Transition Matrix
+    common_glyphs = result['transition_glyphs']
+    sns.heatmap(result['transition_probs'], xticklabels=common_glyphs, yticklabels=common_glyphs, cmap='inferno', ax=axes[1,1])
+    axes[1,1].set_title('Glyph Transition Probabilities (Bigram Model)')
+
+    plt.tight_layout()
+    plt.savefig(out_path)
+    plt.close()
+
+
+def plot_structural_patterns(result, out_path):
+    word_a, word_b = result['word_a'], result['word_b']
+    fig = plt.figure(figsize=(18, 12))
+    gs = fig.add_gridspec(2, 2)
+
+    # Plot 1: Top Words by Section
+    sns.barplot(data=result['top_sec'], x='count', y='word', hue='section', dodge=False, ax=fig.add_subplot(gs[0, 0]))
+    plt.title('Top Words per Section')
+
+    # Plot 2: Marker Word Shift (Folio Timeline)
+    timeline = result['marker_shift']
+    ax2 = fig.add_subplot(gs[0, 1])
+    ax2.plot(timeline['folio_num'], timeline['freq_a'], label=f'Type A ("{word_a}")', color='blue', alpha=0.7)
+    ax2.plot(timeline['folio_num'], timeline['freq_b'], label=f'Type B ("{word_b}")', color='red', alpha=0.7)
+    ax2.set_title(f'Dialect Shift: "{word_a}" vs "{word_b}" across Folios')
+    ax2.set_xlabel('Folio Number')
+    ax2.legend()
+    # Add section lines
+    for x, _, _ in SECTIONS: ax2.axvline(x, color='gray', linestyle='--', alpha=0.3)
+
+    # Plot 3: Discriminator Comparison
+    div_data = pd.concat([result['top_a'], result['top_b']]).melt(id_vars='word', value_vars=['A', 'B'], var_name='Dialect', value_name='Frequency')
+    sns.barplot(data=div_data, x='word', y='Frequency', hue='Dialect', ax=fig.add_subplot(gs[1, :]), palette={'A':'blue', 'B':'red'})
+    plt.title('Strongest Dialect Markers (A vs B)')
+
+    plt.tight_layout()
+    plt.savefig(out_path)
+    plt.close()
+
+
+def plot_timeline(timeline, out_path):
+    """h1/h2 and type/token ratio of sliding folio windows (timeline.Timeline.windows)."""
+    fig, axes = plt.subplots(2, 1, figsize=(16, 9), sharex=True)
+    x = timeline['folio_num']
+
+    axes[0].plot(x, timeline['h1'], label='h1 (glyph entropy)', color='#2E86C1')
+    axes[0].plot(x, timeline['h2'], label='h2 (conditional glyph entropy)', color='#CB4335')
+    axes[0].set_ylabel('bits')
+    axes[0].set_title('Glyph Entropy across the Manuscript (sliding folio windows)')
+    axes[0].legend()
+
+    axes[1].plot(x, timeline['ttr'], color='#229954')
+    axes[1].set_ylabel('type/token ratio')
+    axes[1].set_xlabel('Folio Number (window start)')
+
+    for ax in axes:
+        for start, _, _ in SECTIONS: ax.axvline(start, color='gray', linestyle='--', alpha=0.3)
+
+    plt.tight_layout()
+    plt.savefig(out_path)
+    plt.close()
@@ -0,0 +1,100 @@
+"""
+Vectorized section / Currier-language engine.
+
+Folio numbers are mapped to manuscript sections and (simplified) Currier
+languages through lookup arrays built once from the range tables below, so
+tagging every token is a couple of array indexing operations. Word tables are
+categorical, which keeps group-bys over section, Currier language or scribal
+hand cheap whatever grouping is asked for.
+"""
+
+import numpy as np
+import pandas as pd
+
+# (first folio, last folio, section); folios outside every range are 'Unknown'
+SECTIONS = [
+    (1, 66, 'Herbal'),
+    (67, 73, 'Astronomical'),
+    (75, 84, 'Biological'),
+    (85, 102, 'Pharmaceutical'),
+    (103, 116, 'Recipes'),
+]
+
+# Simplified Currier A/B mapping; Astro, Pharma, Recipes are often mixed or 'Language C'
+CURRIER = [
+    (1, 25, 'A'),
+    (26, 66, 'B'),
+    (75, 84, 'B'),
+]
+
+SECTION_NAMES = [name for _, _, name in SECTIONS] + ['Unknown']
+CURRIER_NAMES = ['A', 'B', 'Mixed']
+MAX_FOLIO = 116
+
+
+def _range_lookup(ranges, names, default):
+    lookup = np.full(MAX_FOLIO + 1, names.index(default), dtype=np.int8)
+    for first, last, name in ranges:
+        lookup[first:last + 1] = names.index(name)
+    return lookup
+
+
+SECTION_OF_FOLIO = _range_lookup(SECTIONS, SECTION_NAMES, 'Unknown')
+CURRIER_OF_FOLIO = _range_lookup(CURRIER, CURRIER_NAMES, 'Mixed')
+
+
+def folio_numbers(folios):
+    """Numeric part of every folio name ('f67r2' -> 67), 0 when there is none."""
+    nums = pd.Series(folios, dtype=str).str.extract(r'(\d+)', expand=False)
+    return nums.fillna(0).astype(np.int64).to_numpy()
+
+
+def sections_of(folio_nums):
+    """Categorical section of every folio number."""
+    codes = SECTION_OF_FOLIO[np.clip(folio_nums, 0, MAX_FOLIO)]
+    codes = np.where(np.asarray(folio_nums) > MAX_FOLIO, SECTION_NAMES.index('Unknown'), codes)
+    return pd.Categorical.from_codes(codes, categories=SECTION_NAMES)
+
+
+def curriers_of(folio_nums):
+    """Categorical Currier language of every folio number."""
+    codes = CURRIER_OF_FOLIO[np.clip(folio_nums, 0, MAX_FOLIO)]
+    codes = np.where(np.asarray(folio_nums) > MAX_FOLIO, CURRIER_NAMES.index('Mixed'), codes)
+    return pd.Categorical.from_codes(codes, categories=CURRIER_NAMES)
+
+
+def folio_table(corpus):
+    """One row per folio id: folio, folio_num, section, currier."""
+    nums = folio_numbers(corpus.folios)
+    return pd.DataFrame({'folio': corpus.folios, 'folio_num': nums,
+                         'section': sections_of(nums), 'currier': curriers_of(nums)})
+
+
+def token_table(corpus):
+    """
+    One row per token with folio_num, section, currier, scribal and word.
+    Built from the token-id arrays; section/currier/scribal/word are categorical.
+    """
+    folios = folio_table(corpus)
+    token_folio = corpus.token_folio()
+    scribal_codes, scribal_names = pd.factorize(corpus.line_scribal)
+    return pd.DataFrame({
+        'folio_num': folios['folio_num'].to_numpy()[token_folio],
+        'section': folios['section'].array.take(token_folio),
+        'currier': folios['currier'].array.take(token_folio),
+        'scribal': pd.Categorical.from_codes(scribal_codes[corpus.token_line()], categories=scribal_names),
+        'word': pd.Categorical.from_codes(np.asarray(corpus.tokens), categories=corpus.vocab),
+    })
+
+
+def group_frequencies(df_words, by):
+    """
+    Word counts and relative frequencies within each group.
+    `by` is a column name or list of column names (section, currier, scribal, folio_num, ...).
+    Returns a DataFrame with the group columns, word, count and freq.
+    """
+    by = [by] if isinstance(by, str) else list(by)
+    counts = df_words.groupby(by + ['word'], observed=True).size().reset_index(name='count')
+    counts = counts[counts['count'] > 0]
+    counts['freq'] = counts['count'] / counts.groupby(by, observed=True)['count'].transform('sum')
+    return counts
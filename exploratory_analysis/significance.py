@@ -0,0 +1,145 @@
+"""
+Permutation test for words that discriminate two groups of folios.
+
+The statistic for every word is its relative frequency in group A minus its
+relative frequency in group B. Under the null hypothesis the group labels are
+exchangeable between folios, so labels are shuffled across the folios of both
+groups (group sizes kept) and the statistic is recomputed for the whole
+vocabulary at once: a batch of shuffled label vectors times the sparse
+folio x word count matrix gives every permuted count in one product.
+Batches are spread over a process pool; p-values are two-sided and q-values
+use the Benjamini-Hochberg procedure.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import metrics
+from workspace import POOL_CONTEXT
+
+PERMUTATION_BATCH = 250
+
+# Set in each worker by _init_worker, so the count matrix is sent once per process
+_worker_state = {}
+
+
+def folio_word_matrix(corpus):
+    """Sparse (n_folios x n_types) token counts."""
+    token_folio = corpus.token_folio()
+    data = np.ones(len(token_folio), dtype=np.float64)
+    m = sparse.coo_matrix((data, (token_folio, np.asarray(corpus.tokens))),
+                          shape=(len(corpus.folios), len(corpus.vocab)))
+    return m.tocsr()
+
+
+def _diff_stat(counts_a, totals_a, word_totals, grand_total):
+    counts_b = word_totals - counts_a
+    totals_b = grand_total - totals_a
+    return counts_a / totals_a[:, None] - counts_b / totals_b[:, None]
+
+
+def _init_worker(counts, folio_totals, n_a):
+    _worker_state.update(counts=counts, folio_totals=folio_totals, n_a=n_a)
+
+
+def _count_exceedances(seed, n_perm, observed):
+    """Number of permutations whose |statistic| reaches |observed|, per word."""
+    counts = _worker_state['counts']
+    folio_totals = _worker_state['folio_totals']
+    n_a = _worker_state['n_a']
+    n_folios = counts.shape[0]
+    word_totals = np.asarray(counts.sum(axis=0)).ravel()
+    grand_total = folio_totals.sum()
+    abs_obs = np.abs(observed) - 1e-12
+
+    rng = np.random.default_rng(seed)
+    exceed = np.zeros(counts.shape[1], dtype=np.int64)
+    for start in range(0, n_perm, PERMUTATION_BATCH):
+        size = min(PERMUTATION_BATCH, n_perm - start)
+        # Row r marks the folios that play group A in permutation r
+        order = np.argsort(rng.random((size, n_folios)), axis=1)
+        labels = np.zeros((size, n_folios), dtype=np.float64)
+        np.put_along_axis(labels, order[:, :n_a], 1.0, axis=1)
+
+        perm_counts = np.asarray((counts.T @ labels.T).T)
+        perm_stat = _diff_stat(perm_counts, labels @ folio_totals, word_totals, grand_total)
+        exceed += (np.abs(perm_stat) >= abs_obs).sum(axis=0)
+    return exceed
+
+
+def benjamini_hochberg(p_values):
+    p = np.asarray(p_values, dtype=np.float64)
+    n = len(p)
+    if n == 0:
+        return p
+    order = np.argsort(p)
+    ranked = p[order] * n / np.arange(1, n + 1)
+    q = np.minimum.accumulate(ranked[::-1])[::-1]
+    out = np.empty(n)
+    out[order] = np.minimum(q, 1.0)
+    return out
+
+
+def permutation_test(corpus, folios_a, folios_b, n_permutations=5000, min_count=5,
+                     n_jobs=None, seed=42):
+    """
+    Per-word permutation test of group A vs group B (lists of folio names).
+    Only words occurring at least `min_count` times in the two groups are tested.
+    Returns a DataFrame sorted by p-value with word, count_a, count_b, freq_a,
+    freq_b, diff, p_value and q_value.
+    """
+    folio_index = {f: i for i, f in enumerate(corpus.folios.tolist())}
+    ids_a = [folio_index[f] for f in folios_a if f in folio_index]
+    ids_b = [folio_index[f] for f in folios_b if f in folio_index]
+    if not ids_a or not ids_b:
+        raise ValueError("Both groups need at least one folio present in the corpus")
+    if set(ids_a) & set(ids_b):
+        raise ValueError("The two groups of folios overlap")
+
+    full = folio_word_matrix(corpus)[ids_a + ids_b]
+    word_totals = np.asarray(full.sum(axis=0)).ravel()
+    tested = np.flatnonzero(word_totals >= min_count)
+    counts = full[:, tested].tocsr()
+    # Group sizes use every token of the folio, not only the tested words
+    folio_totals = np.asarray(full.sum(axis=1)).ravel()
+    n_a = len(ids_a)
+
+    labels = np.zeros((1, len(ids_a) + len(ids_b)))
+    labels[0, :n_a] = 1.0
+    observed = _diff_stat(np.asarray((counts.T @ labels.T).T), labels @ folio_totals,
+                          word_totals[tested], folio_totals.sum())[0]
+
+    n_jobs = n_jobs or os.cpu_count() or 1
+    n_jobs = max(1, min(n_jobs, -(-n_permutations // PERMUTATION_BATCH)))
+    shares = [n_permutations // n_jobs + (i < n_permutations % n_jobs) for i in range(n_jobs)]
+    seeds = np.random.SeedSequence(seed).spawn(n_jobs)
+
+    if n_jobs == 1:
+        _init_worker(counts, folio_totals, n_a)
+        exceed = _count_exceedances(seeds[0], n_permutations, observed)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=POOL_CONTEXT, initializer=_init_worker,
+                                 initargs=(counts, folio_totals, n_a)) as pool:
+            parts = metrics.collect(pool.map(metrics.in_worker(_count_exceedances), seeds, shares, [observed] * n_jobs))
+            exceed = np.sum(list(parts), axis=0)
+
+    p_values = (exceed + 1) / (n_permutations + 1)
+    count_a = np.asarray(counts[:n_a].sum(axis=0)).ravel()
+    count_b = np.asarray(counts[n_a:].sum(axis=0)).ravel()
+    result = pd.DataFrame({
+        'word': corpus.vocab[tested],
+        'count_a': count_a.astype(int),
+        'count_b': count_b.astype(int),
+        'freq_a': count_a / folio_totals[:n_a].sum(),
+        'freq_b': count_b / folio_totals[n_a:].sum(),
+        'diff': observed,
+        'p_value': p_values,
+        'q_value': benjamini_hochberg(p_values),
+    })
+    # Smallest p-value first, larger effects first among ties
+    order = np.lexsort((-np.abs(observed), p_values))
+    return result.iloc[order].reset_index(drop=True)
@@ -0,0 +1,222 @@
+"""
+Sliding-window timeline of glyph and word statistics across the manuscript.
+
+Units are lines or folios in manuscript (file) order. Glyph unigram and token
+counts are turned into prefix sums once, (n_units + 1, n_glyphs) and
+(n_units + 1), so the counts of any window of units [start, stop) are
+P[stop] - P[start] and every window size and stride is answered from the same
+arrays. Within-word glyph bigrams are too many for a dense prefix array: they
+stay a sparse (n_units, n_bigrams) matrix, summed per window by a product with
+the sparse window/unit indicator matrix, WINDOW_BLOCK windows at a time.
+Distinct word types come from the previous-occurrence array instead: a token
+is the first of its type inside a window iff its previous occurrence lies
+before the window's first token (see count_types).
+
+Per window: h1 (glyph unigram entropy, bits), h2 (conditional glyph entropy
+H(next | current) inside words), type/token ratio, and the share of every
+glyph. Large sets of windows are split into chunks computed in a process pool.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+import metrics
+from workspace import POOL_CONTEXT
+
+PARALLEL_MIN_WINDOWS = 2000
+WINDOW_BLOCK = 4096
+
+# Set in each worker by _init_worker, so the prefix arrays are sent once per process
+_worker_state = {}
+
+
+def entropy_bits(counts):
+    """Shannon entropy (bits) of every row of a count matrix."""
+    counts = np.asarray(counts, dtype=np.float64)
+    totals = counts.sum(axis=1, keepdims=True)
+    p = counts / np.maximum(totals, 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terms = np.where(p > 0, p * np.log2(p), 0.0)
+    return -terms.sum(axis=1)
+
+
+def sparse_entropy_bits(counts):
+    """entropy_bits of every row of a sparse count matrix, from its stored entries only."""
+    counts = sparse.csr_matrix(counts)
+    counts.eliminate_zeros()
+    rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr))
+    totals = np.asarray(counts.sum(axis=1), dtype=np.float64).ravel()
+    p = counts.data / totals[rows]
+    return -np.bincount(rows, weights=p * np.log2(p), minlength=counts.shape[0])
+
+
+def window_matrix(starts, stops, n_units):
+    """Sparse (n_windows, n_units) matrix with a 1 for every unit of every window."""
+    lengths = stops - starts
+    indptr = np.zeros(len(starts) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    indices = np.arange(indptr[-1]) - np.repeat(indptr[:-1] - starts, lengths)
+    return sparse.csr_matrix((np.ones(indptr[-1], dtype=np.int64), indices, indptr), shape=(len(starts), n_units))
+
+
+def previous_occurrence(tokens):
+    """Index of the previous token of the same type, -1 for a type's first token."""
+    tokens = np.asarray(tokens)
+    order = np.argsort(tokens, kind='stable')
+    prev = np.full(len(tokens), -1, dtype=np.int64)
+    same = tokens[order[1:]] == tokens[order[:-1]]
+    prev[order[1:][same]] = order[:-1][same]
+    return prev
+
+
+def count_types(prev, tok_a, tok_b):
+    """
+    Distinct types in every token window [tok_a, tok_b), given the
+    previous-occurrence array; tok_a and tok_b must both be non-decreasing.
+    Token i is the first of its type in window j iff prev[i] < tok_a[j] <= i < tok_b[j],
+    and the windows meeting that form one run of j, so every token adds 1 to a
+    range of a difference array.
+    """
+    if not len(tok_a):
+        return np.zeros(0, dtype=np.int64)
+    i = np.arange(tok_a[0], tok_b[-1])
+    first = np.maximum(np.searchsorted(tok_a, prev[i], side='right'), np.searchsorted(tok_b, i, side='right'))
+    last = np.searchsorted(tok_a, i, side='right')
+    keep = first < last
+    diff = (np.bincount(first[keep], minlength=len(tok_a) + 1)
+            - np.bincount(last[keep], minlength=len(tok_a) + 1))
+    return np.cumsum(diff)[:-1]
+
+
+def _init_worker(state):
+    _worker_state.update(state)
+
+
+def _window_stats(starts, stops):
+    s = _worker_state
+    unigrams = s['glyph_prefix'][stops] - s['glyph_prefix'][starts]
+    h2 = np.empty(len(starts))
+    for block in range(0, len(starts), WINDOW_BLOCK):
+        part = slice(block, block + WINDOW_BLOCK)
+        bigrams = window_matrix(starts[part], stops[part], s['unit_bigrams'].shape[0]) @ s['unit_bigrams']
+        first_glyph = bigrams @ s['bigram_first']  # marginal count of the bigrams' first glyph
+        h2[part] = sparse_entropy_bits(bigrams) - sparse_entropy_bits(first_glyph)
+
+    tok_a, tok_b = s['unit_token_start'][starts], s['unit_token_start'][stops]
+    return {
+        'n_tokens': tok_b - tok_a,
+        'n_types': count_types(s['prev'], tok_a, tok_b),
+        'n_glyphs': unigrams.sum(axis=1),
+        'h1': entropy_bits(unigrams),
+        'h2': h2,
+        'glyph_counts': unigrams,
+    }
+
+
+class Timeline:
+    """
+    corpus: corpus_store.Corpus; stream: its GlyphStream (ngrams.py)
+    unit:   'folio' or 'line'
+    """
+
+    def __init__(self, corpus, stream, unit='folio'):
+        if unit == 'folio':
+            token_unit = corpus.token_folio()
+            labels = corpus.folios
+        elif unit == 'line':
+            token_unit = corpus.token_line()
+            labels = corpus.line_meta_left
+        else:
+            raise ValueError(f"unit must be 'folio' or 'line', not {unit!r}")
+        # Folio ids follow first appearance, so ids are in manuscript order
+        self.unit = unit
+        self.labels = np.asarray(labels)
+        self.alphabet = list(stream.alphabet)
+        n_units, n_glyphs = len(self.labels), stream.n_symbols
+
+        # A window's tokens are read as one range of the per-unit prefix sums, so the
+        # token stream is taken in unit order; the stable sort keeps each unit's own
+        # order and only matters when a unit comes back later (a repeated folio header)
+        token_unit = np.asarray(token_unit)
+        tokens = np.asarray(corpus.tokens)
+        if np.any(np.diff(token_unit) < 0):
+            tokens = tokens[np.argsort(token_unit, kind='stable')]
+        tokens_per_unit = np.bincount(token_unit, minlength=n_units)
+        unit_token_start = np.zeros(n_units + 1, dtype=np.int64)
+        np.cumsum(tokens_per_unit, out=unit_token_start[1:])
+
+        word_of_glyph = stream.word_of_glyph()
+        glyph_unit = token_unit[word_of_glyph]
+        glyphs = stream.glyphs.astype(np.int64)
+        unigram = np.bincount(glyph_unit * n_glyphs + glyphs, minlength=n_units * n_glyphs)
+
+        inside = word_of_glyph[1:] == word_of_glyph[:-1]
+        bigram_codes = (glyphs[:-1] * n_glyphs + glyphs[1:])[inside]
+        observed, dense = np.unique(bigram_codes, return_inverse=True)
+        unit_bigrams = sparse.csr_matrix((np.ones(len(dense), dtype=np.int64), (glyph_unit[:-1][inside], dense)),
+                                         shape=(n_units, len(observed)))
+        unit_bigrams.sum_duplicates()
+
+        self.state = {
+            'glyph_prefix': self._prefix(unigram.reshape(n_units, n_glyphs)),
+            'unit_bigrams': unit_bigrams,
+            'bigram_first': sparse.csr_matrix(np.eye(n_glyphs, dtype=np.int64)[observed // n_glyphs]),
+            'unit_token_start': unit_token_start,
+            'prev': previous_occurrence(tokens),
+        }
+
+    @staticmethod
+    def _prefix(counts):
+        prefix = np.zeros((counts.shape[0] + 1, counts.shape[1]), dtype=np.int64)
+        np.cumsum(counts, axis=0, out=prefix[1:])
+        return prefix
+
+    @property
+    def n_units(self):
+        return len(self.labels)
+
+    def windows(self, size, stride=1, glyph_shares=True, n_jobs=None):
+        """
+        Statistics of every window of `size` units, advancing by `stride` units.
+        Returns a DataFrame: start, stop, first, last (unit labels), n_tokens,
+        n_types, ttr, n_glyphs, h1, h2 (NaN for empty windows) and, with
+        glyph_shares, one p_<glyph> column per glyph.
+        """
+        size = max(1, min(size, self.n_units))
+        starts = np.arange(0, self.n_units - size + 1, max(1, stride), dtype=np.int64)
+        stops = starts + size
+
+        n_jobs = n_jobs or os.cpu_count() or 1
+        if n_jobs == 1 or len(starts) < PARALLEL_MIN_WINDOWS:
+            _init_worker(self.state)
+            parts = [_window_stats(starts, stops)]
+        else:
+            chunks = np.array_split(np.arange(len(starts)), n_jobs)
+            with ProcessPoolExecutor(max_workers=n_jobs, mp_context=POOL_CONTEXT, initializer=_init_worker,
+                                     initargs=(self.state,)) as pool:
+                parts = list(metrics.collect(pool.map(metrics.in_worker(_window_stats), [starts[c] for c in chunks],
+                                                      [stops[c] for c in chunks])))
+        stats = {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
+
+        table = pd.DataFrame({
+            'start': starts,
+            'stop': stops,
+            'first': self.labels[starts],
+            'last': self.labels[stops - 1],
+            'n_tokens': stats['n_tokens'],
+            'n_types': stats['n_types'],
+            'ttr': stats['n_types'] / np.maximum(stats['n_tokens'], 1),
+            'n_glyphs': stats['n_glyphs'],
+            'h1': stats['h1'],
+            'h2': stats['h2'],
+        })
+        # Windows without any text (e.g. folios that are only labels) have no statistics
+        table.loc[table['n_tokens'] == 0, ['ttr', 'h1', 'h2']] = np.nan
+        if glyph_shares:
+            shares = stats['glyph_counts'] / np.maximum(stats['n_glyphs'], 1)[:, None]
+            table = pd.concat([table, pd.DataFrame(shares, columns=[f"p_{g}" for g in self.alphabet])], axis=1)
+        return table
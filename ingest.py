@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Batch ingestion of several transliterations into one multi-source store.
+
+Every input file is parsed in a worker process with the rules of its scheme
+(see schemes.py; detected from the file name / transcriber codes, or forced
+with --scheme) and written as a columnar corpus to data/corpora/<source>/.
+data/corpora/sources.json maps every source to its scheme, input file and
+checksum; sources whose file, scheme and parsing rules (parse_takeshi.RULES_KEY)
+did not change are not parsed again.
+In a changed file only the folios that changed are parsed again; the others
+are copied from the source's previous corpus (see parse_takeshi.stream_file).
+The corpora are read back with corpus_store.load_source / load_sources.
+
+A source is named after its file; a file ingested with several schemes (an
+interlinear file holding several transcribers) gets one source per scheme,
+named <file>_<scheme>.
+
+Usage:
+    python ingest.py "data/transliterations/*.txt"
+    python ingest.py data/interlinear.txt --scheme takahashi currier fsg
+    python ingest.py data/ --jobs 4 --force
+"""
+
+import argparse
+import glob
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import metrics
+from corpus_store import STORE_DIR, load_manifest, save_manifest
+from parse_takeshi import RULES_KEY, stream_file
+from schemes import detect_scheme, get_scheme
+from workspace import POOL_CONTEXT
+
+TRANSLITERATION_SUFFIXES = {".txt", ".evt", ".ivtff"}
+
+
+def file_checksum(path: Path) -> str:
+    h = hashlib.sha256()
+    with Path(path).open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def expand_inputs(patterns):
+    """Files named by paths, directories (their transliteration files) or glob patterns."""
+    files = []
+    for pattern in patterns:
+        path = Path(pattern)
+        if path.is_dir():
+            files.extend(sorted(p for p in path.iterdir() if p.suffix.lower() in TRANSLITERATION_SUFFIXES))
+        elif path.is_file():
+            files.append(path)
+        else:
+            files.extend(sorted(Path(p) for p in glob.glob(pattern, recursive=True) if Path(p).is_file()))
+    return list(dict.fromkeys(files))
+
+
+def plan_jobs(files, scheme_names=None):
+    """[(source name, path, scheme name)] for every file and scheme."""
+    jobs = []
+    for path in files:
+        schemes = [get_scheme(n) for n in scheme_names] if scheme_names else [detect_scheme(path)]
+        for scheme in schemes:
+            name = path.stem if len(schemes) == 1 else f"{path.stem}_{scheme.name}"
+            jobs.append((name, path, scheme.name))
+    names = [name for name, _, _ in jobs]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise SystemExit(f"Several inputs map to the same source name: {', '.join(duplicates)}")
+    return jobs
+
+
+def ingest_one(name, path, scheme_name, store_dir, full=False):
+    """Worker: parse one file into <store_dir>/<name>/ and return its manifest entry."""
+    scheme = get_scheme(scheme_name)
+    stats, folio_set, _, _ = stream_file(Path(path), None, corpus_dir=Path(store_dir) / name, scheme=scheme,
+                                         full=full)
+    return {
+        "path": str(path),
+        "scheme": scheme.name,
+        "rules": RULES_KEY,
+        "sha256": file_checksum(path),
+        "n_tokens": stats.get("corpus_tokens", 0),
+        "n_types": stats.get("corpus_types", 0),
+        "n_folios": len(folio_set),
+        "changed_folios": stats.get("changed_folios", 0),
+        "skipped_lines": stats.get("other_transcriber_lines", 0) + stats.get("comment_lines", 0),
+    }
+
+
+def ingest(patterns, scheme_names=None, store_dir: Path = STORE_DIR, jobs=None, force=False):
+    """Parse every input that changed, in parallel; returns {source: status}."""
+    files = expand_inputs(patterns)
+    if not files:
+        raise SystemExit(f"No transliteration files found for {patterns}")
+    manifest = load_manifest(store_dir)
+    todo, status = [], {}
+    for name, path, scheme_name in plan_jobs(files, scheme_names):
+        entry = manifest.get(name)
+        if (not force and entry and entry["scheme"] == scheme_name and entry.get("rules") == RULES_KEY
+                and entry["sha256"] == file_checksum(path) and (Path(store_dir) / name / "meta.json").exists()):
+            status[name] = "unchanged"
+        else:
+            todo.append((name, path, scheme_name))
+
+    with ProcessPoolExecutor(max_workers=jobs or min(len(todo), os.cpu_count() or 1) or 1,
+                             mp_context=POOL_CONTEXT) as pool:
+        futures = {pool.submit(metrics.in_worker(ingest_one), name, str(path), scheme_name, str(store_dir), force): name
+                   for name, path, scheme_name in todo}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                manifest[name], seconds = future.result()
+            except Exception as exc:
+                status[name] = f"failed: {exc!r}"
+                continue
+            metrics.add_cpu(seconds)
+            status[name] = (f"{manifest[name]['scheme']}: {manifest[name]['n_tokens']} tokens, "
+                            f"{manifest[name]['n_types']} types, {manifest[name]['n_folios']} folios "
+                            f"({manifest[name]['changed_folios']} changed)")
+            save_manifest(manifest, store_dir)
+    return status
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse several transliterations into data/corpora/")
+    parser.add_argument("inputs", nargs="+", help="files, directories or glob patterns")
+    parser.add_argument("--scheme", nargs="+", help="scheme(s) for every input (default: detected per file)")
+    parser.add_argument("--store", type=Path, default=STORE_DIR)
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes")
+    parser.add_argument("--force", action="store_true", help="parse even unchanged sources")
+    args = parser.parse_args()
+
+    with metrics.stage('ingest'):
+        status = ingest(args.inputs, args.scheme, args.store, args.jobs, args.force)
+    for name in sorted(status):
+        print(f"{name:30} {status[name]}")
+    if any(s.startswith("failed") for s in status.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
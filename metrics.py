@@ -0,0 +1,175 @@
+"""
+Lightweight timing spans for the preprocessing and analysis stages.
+
+    with metrics.stage("parse"):
+        with metrics.span("inverted_index"):
+            ...
+
+A stage collects the spans closed inside it (per thread, so stages running in
+parallel pipeline threads keep their own) and on exit replaces its previous
+record in logs/takeshi_metrics.json, next to the preprocessing log. Every
+span records wall time, CPU time, rows and rows/s when a row count is given,
+and the peak RSS of the process so far (ru_maxrss is process-wide and never
+goes down). Spans opened outside a stage are timed but not recorded.
+
+CPU time is that of the calling thread plus what pool workers report: a task
+submitted as in_worker(func) returns (result, worker CPU seconds), and
+collect() / add_cpu() in the calling thread add that time to every span open
+there, so parallel stages count the work done in their workers.
+
+    parts = list(metrics.collect(pool.map(metrics.in_worker(func), items)))
+
+VOYNICH_PROFILE=<stage>[,<stage>...] (or pipeline.py --profile <stage>) also
+runs those stages under cProfile and dumps logs/profiles/<stage>.prof.
+"""
+
+import cProfile
+import json
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+METRICS_FILE = Path("logs/takeshi_metrics.json")
+PROFILE_DIR = Path("logs/profiles")
+PROFILE_STAGES = {s for s in os.environ.get("VOYNICH_PROFILE", "").split(",") if s}
+
+_local = threading.local()
+_file_lock = threading.Lock()
+
+
+def _peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KiB on Linux
+
+
+def _cpu_time():
+    return time.thread_time()
+
+
+class in_worker:
+    """Picklable wrapper of a pool task returning (result, CPU seconds spent in the worker)."""
+
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, *args, **kwargs):
+        start = time.process_time()
+        result = self.func(*args, **kwargs)
+        return result, time.process_time() - start
+
+
+def add_cpu(seconds):
+    """Add CPU time spent elsewhere (a pool worker) to the spans open in this thread."""
+    for record in getattr(_local, "open", ()):
+        record["cpu_s"] += seconds
+
+
+def collect(pairs):
+    """Yield the results of in_worker tasks, adding their CPU time with add_cpu."""
+    for result, seconds in pairs:
+        add_cpu(seconds)
+        yield result
+
+
+def _emit(record, accumulate):
+    spans = getattr(_local, "spans", None)
+    if spans is None:
+        return
+    if accumulate:
+        for previous in spans:
+            if previous["name"] == record["name"]:
+                previous["wall_s"] += record["wall_s"]
+                previous["cpu_s"] += record["cpu_s"]
+                if record["rows"] is not None:
+                    previous["rows"] = (previous["rows"] or 0) + record["rows"]
+                previous["calls"] += 1
+                previous["peak_rss_mb"] = record["peak_rss_mb"]
+                return
+    spans.append(record)
+
+
+def _finish(record):
+    if record["rows"] is not None and record["wall_s"] > 0:
+        record["rows_per_s"] = record["rows"] / record["wall_s"]
+    return record
+
+
+@contextmanager
+def span(name, rows=None, accumulate=False):
+    """
+    Time the enclosed block. Yields the record, so a row count only known at
+    the end can be set with `record["rows"] = n`. With accumulate=True repeated
+    spans of the same name add up into one record.
+    """
+    record = {"name": name, "rows": rows, "calls": 1, "cpu_s": 0.0}
+    if not hasattr(_local, "open"):
+        _local.open = []
+    _local.open.append(record)
+    wall, cpu = time.perf_counter(), _cpu_time()
+    try:
+        yield record
+    finally:
+        _local.open.pop()  # spans nest, so this one is the last opened
+        record["wall_s"] = time.perf_counter() - wall
+        record["cpu_s"] += _cpu_time() - cpu
+        record["peak_rss_mb"] = _peak_rss_mb()
+        _emit(record, accumulate)
+
+
+def timed_iter(iterable, name):
+    """Yield from `iterable`, adding the time spent producing items to the span `name`."""
+    it = iter(iterable)
+    while True:
+        with span(name, accumulate=True) as record:
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            record["rows"] = len(item) if hasattr(item, "__len__") else 1
+        yield item
+
+
+@contextmanager
+def stage(name, out_path=METRICS_FILE):
+    """Collect the spans of one stage and write them to the metrics file when it ends."""
+    outer = getattr(_local, "spans", None)
+    _local.spans = []
+    profiler = cProfile.Profile() if name in PROFILE_STAGES else None
+    status = "failed"
+    try:
+        with span(name) as total:
+            if profiler is not None:
+                profiler.enable()
+            try:
+                yield total
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+        status = "ok"
+    finally:
+        spans, _local.spans = _local.spans, outer
+        total = spans.pop()  # the stage span closes last
+        record = dict(_finish(total), status=status, time=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                      spans=[_finish(s) for s in spans])
+        if profiler is not None:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            record["profile"] = str(PROFILE_DIR / f"{name}.prof")
+            profiler.dump_stats(record["profile"])
+        write_stage(record, out_path)
+
+
+def write_stage(record, out_path=METRICS_FILE):
+    """Replace the record of one stage in the metrics file (other stages are kept)."""
+    out_path = Path(out_path)
+    with _file_lock:
+        data = {}
+        if out_path.exists():
+            try:
+                data = json.loads(out_path.read_text(encoding="utf-8"))
+            except ValueError:
+                data = {}
+        data.setdefault("stages", {})[record["name"]] = record
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text(json.dumps(data, indent=2), encoding="utf-8")
@@ -2,26 +2,52 @@
 """
 Produces:
  - takeshi_parsed_words.csv  (word-level table)
+ - takeshi_corpus/  (integer-encoded columnar corpus, see corpus_store.py)
+ - takeshi_corpus/index/  (inverted index for concordance queries, see search/inverted_index.py)
  - takeshi_preprocessing_log.txt (summary + examples)
+ - takeshi_metrics.json (timings of every step, see metrics.py)
 """
 
 import re
 import csv
-from collections import defaultdict
+import json
+import contextlib
+import hashlib
+import inspect
+import argparse
+from collections import Counter, defaultdict
+from itertools import islice
 from pathlib import Path
 
+import corpus_store
+import metrics
+import schemes
+from corpus_store import CORPUS_DIR, CorpusWriter, load_corpus
+from schemes import DEFAULT_SCHEME
+from search.inverted_index import build_index
+
 INPUT = Path("data/takeshi.txt")
 OUT_CSV = Path("data/takeshi_parsed_words.csv")
 OUT_LOG = Path("logs/takeshi_preprocessing_log.txt")
+CSV_CHUNK_SIZE = 5000
+CHECKSUMS_NAME = "folio_checksums.json"
+SUMMARIES_NAME = "folio_summaries.json"
+SUMMARY_KEYS = ("stats", "folios", "ambiguous", "token_freq")
+PREAMBLE = "_preamble"
+
+FIELDNAMES = ["folio", "tag", "meta_left", "scribal", "line_text", "word_index",
+              "original_word", "cleaned_word", "unified_word", "has_markup", "ambiguity_notes"]
 
 # Regex to match lines like "<f1r.P1.1;H> rest of line"
 TAG_LINE_RE = re.compile(r'^\s*<(?P<tag>[^>]+)>\s*(?P<content>.*)$')
 CLEAN_TOKEN_RE_STRIP = re.compile(r'^[^A-Za-z0-9\.]+|[^A-Za-z0-9\.]+$')
 COLLAPSE_DOTS_RE = re.compile(r'\.{2,}')
 
-def clean_token(original: str):
+def clean_token(original: str, scheme=DEFAULT_SCHEME):
     """
     Return (cleaned_token_or_None, unified_token_or_None, has_markup_bool, ambiguity_notes_list)
+    The unified token is scheme.unify(cleaned): lower-cased unless the scheme's
+    alphabet is case-sensitive.
     """
     notes = []
     has_markup = False
@@ -55,7 +81,7 @@ def clean_token(original: str):
     if cleaned == "":
         cleaned = None
 
-    unified = cleaned.lower() if cleaned is not None else None
+    unified = None if cleaned is None else scheme.unify(cleaned)
 
     # Ambiguity heuristics
     amb = []
@@ -71,119 +97,354 @@ def clean_token(original: str):
     return (cleaned, unified, has_markup, amb)
 
 
-def parse_file(path: Path):
-    rows = []
-    stats = defaultdict(int)
-    folio_set = set()
-    ambiguous_examples = []
-
+def iter_rows(path: Path, stats, folio_set, ambiguous_examples, token_freq, scheme=DEFAULT_SCHEME):
+    """
+    Yield word-level row dicts one at a time, updating the passed accumulators
+    (stats, folio_set, ambiguous_examples, token_freq) as rows go by.
+    `scheme` (see schemes.py) selects the transcriber's lines and the markup rules.
+    """
     with path.open("r", encoding="utf-8", errors="replace") as fh:
-        for raw_line in fh:
-            line = raw_line.rstrip("\n")
-            if not line.strip():
-                stats["blank_lines"] += 1
-                continue
-
-            m = TAG_LINE_RE.match(line)
-            if not m:
-                # Line without a tag: treat as UNGROUPED
-                tag = None
-                content = line.strip()
-                folio = "UNGROUPED"
-                scribal = None
-                meta_left = None
-                stats["untagged_lines"] += 1
+        yield from iter_line_rows(fh, stats, folio_set, ambiguous_examples, token_freq, scheme)
+
+
+def iter_line_rows(lines, stats, folio_set, ambiguous_examples, token_freq, scheme=DEFAULT_SCHEME):
+    """iter_rows over any iterable of raw lines (a file, or one folio block)."""
+    for raw_line in lines:
+        line = raw_line.rstrip("\n")
+        if not line.strip():
+            stats["blank_lines"] += 1
+            continue
+        if line.startswith("#"):
+            stats["comment_lines"] += 1
+            continue
+
+        m = TAG_LINE_RE.match(line)
+        if not m:
+            # Line without a tag: treat as UNGROUPED
+            tag = None
+            content = line.strip()
+            folio = "UNGROUPED"
+            scribal = None
+            meta_left = None
+            stats["untagged_lines"] += 1
+        else:
+            tag = m.group("tag").strip()
+            content = m.group("content").strip()
+            if ";" in tag:
+                left, scribal = tag.split(";", 1)
+                scribal = scribal.strip()
             else:
-                tag = m.group("tag").strip()
-                content = m.group("content").strip()
-                if ";" in tag:
-                    left, scribal = tag.split(";", 1)
-                    scribal = scribal.strip()
-                else:
-                    left = tag
-                    scribal = None
-                meta_left = left.strip()
-                if "." in meta_left:
-                    folio = meta_left.split(".", 1)[0]
-                else:
-                    folio = meta_left
-                folio_set.add(folio)
-
-            stats["total_tagged_lines"] += 1 if tag else 0
-
-            # If content empty, write a line entry with no words
-            if content == "":
-                rows.append({
-                    "folio": folio,
-                    "tag": tag,
-                    "meta_left": meta_left,
-                    "scribal": scribal,
-                    "line_text": content,
-                    "word_index": None,
-                    "original_word": None,
-                    "cleaned_word": None,
-                    "unified_word": None,
-                    "has_markup": False,
-                    "ambiguity_notes": None,
-                })
+                left = tag
+                scribal = None
+            if not scheme.accepts(scribal):
+                stats["other_transcriber_lines"] += 1
                 continue
+            meta_left = left.strip()
+            if "." in meta_left:
+                folio = meta_left.split(".", 1)[0]
+            else:
+                folio = meta_left
+            folio_set.add(folio)
+
+        stats["total_tagged_lines"] += 1 if tag else 0
+        content = scheme.prepare(content).strip()
+
+        # If content empty, write a line entry with no words
+        if content == "":
+            stats["rows"] += 1
+            yield {
+                "folio": folio,
+                "tag": tag,
+                "meta_left": meta_left,
+                "scribal": scribal,
+                "line_text": content,
+                "word_index": None,
+                "original_word": None,
+                "cleaned_word": None,
+                "unified_word": None,
+                "has_markup": False,
+                "ambiguity_notes": None,
+            }
+            continue
+
+        # small tidy: remove stray leading "H>" if present (from some transcripts)
+        if content.startswith("H>"):
+            content = content[2:].lstrip()
+            stats["removed_leading_H>"] += 1
+
+        words = content.split()
+        for wi, w in enumerate(words, start=1):
+            original = w
+            cleaned, unified, has_markup, amb = clean_token(original, scheme)
+
+            if has_markup:
+                stats["words_with_markup"] += 1
+            stats["total_words"] += 1
+            stats["rows"] += 1
+
+            if amb and len(ambiguous_examples) < 40:
+                ambiguous_examples.append((original, cleaned, amb))
+            if unified:
+                token_freq[unified] += 1
+
+            yield {
+                "folio": folio,
+                "tag": tag,
+                "meta_left": meta_left,
+                "scribal": scribal,
+                "line_text": content,
+                "word_index": wi,
+                "original_word": original,
+                "cleaned_word": cleaned,
+                "unified_word": unified,
+                "has_markup": has_markup,
+                "ambiguity_notes": ";".join(amb) if amb else None,
+            }
+
+
+# Part of every folio checksum, so a folio is parsed again whenever the code
+# turning its text into rows and tokens (the cleaning and line rules, the
+# schemes, the corpus writer whose old tokens unchanged folios reuse) changes
+RULES_KEY = hashlib.sha256("\n".join(
+    [inspect.getsource(clean_token), inspect.getsource(iter_line_rows), TAG_LINE_RE.pattern,
+     CLEAN_TOKEN_RE_STRIP.pattern, COLLAPSE_DOTS_RE.pattern]
+    + [Path(module.__file__).read_text(encoding="utf-8") for module in (schemes, corpus_store)]
+).encode("utf-8")).hexdigest()
+
+
+def iter_folio_blocks(lines):
+    """
+    Split raw lines into folio blocks: a block starts at a folio header line
+    ("<f1r>") and runs up to the next one; lines before the first header form
+    the PREAMBLE block. Repeated headers get "#2", "#3", ... suffixes.
+    """
+    name, block, seen = PREAMBLE, [], Counter()
+    for raw_line in lines:
+        m = TAG_LINE_RE.match(raw_line)
+        if m and not m.group("content").strip() and not re.search(r'[.;]', m.group("tag")):
+            if block:
+                yield name, block
+            folio = m.group("tag").strip()
+            seen[folio] += 1
+            name = folio if seen[folio] == 1 else f"{folio}#{seen[folio]}"
+            block = []
+        block.append(raw_line)
+    if block:
+        yield name, block
+
+
+def block_checksum(block, scheme=DEFAULT_SCHEME):
+    key = f"{RULES_KEY}:{scheme.name}:"
+    return hashlib.sha256((key + "".join(block)).encode("utf-8")).hexdigest()
+
+
+def folio_checksums(path: Path, scheme=DEFAULT_SCHEME):
+    """{folio block: checksum} of a transliteration file."""
+    with path.open("r", encoding="utf-8", errors="replace") as fh:
+        return {name: block_checksum(block, scheme) for name, block in iter_folio_blocks(fh)}
+
+
+def changed_folios(previous: dict, current: dict):
+    """Blocks added, removed or edited between two checksum maps."""
+    return sorted(n for n in set(previous) | set(current) if previous.get(n) != current.get(n))
 
-            # small tidy: remove stray leading "H>" if present (from some transcripts)
-            if content.startswith("H>"):
-                content = content[2:].lstrip()
-                stats["removed_leading_H>"] += 1
-
-            words = content.split()
-            for wi, w in enumerate(words, start=1):
-                original = w
-                cleaned, unified, has_markup, amb = clean_token(original)
-
-                if has_markup:
-                    stats["words_with_markup"] += 1
-                stats["total_words"] += 1
-
-                if amb and len(ambiguous_examples) < 40:
-                    ambiguous_examples.append((original, cleaned, amb))
-
-                rows.append({
-                    "folio": folio,
-                    "tag": tag,
-                    "meta_left": meta_left,
-                    "scribal": scribal,
-                    "line_text": content,
-                    "word_index": wi,
-                    "original_word": original,
-                    "cleaned_word": cleaned,
-                    "unified_word": unified,
-                    "has_markup": has_markup,
-                    "ambiguity_notes": ";".join(amb) if amb else None,
-                })
 
+def load_checksums(corpus_dir: Path):
+    path = Path(corpus_dir) / CHECKSUMS_NAME
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))["checksums"]
+
+
+def parse_file(path: Path, scheme=DEFAULT_SCHEME):
+    """Parse the whole file into memory (see stream_file for the constant-memory mode)."""
+    stats = defaultdict(int)
+    folio_set = set()
+    ambiguous_examples = []
+    token_freq = Counter()
+    rows = list(iter_rows(path, stats, folio_set, ambiguous_examples, token_freq, scheme))
     return rows, stats, folio_set, ambiguous_examples
 
 
-def write_csv(rows, out_path: Path):
-    if not rows:
-        # write an empty CSV with header
-        header = ["folio","tag","meta_left","scribal","line_text","word_index",
-                  "original_word","cleaned_word","unified_word","has_markup","ambiguity_notes"]
-        with out_path.open("w", newline="", encoding="utf-8") as fh:
-            writer = csv.writer(fh)
-            writer.writerow(header)
-        return
+def stream_file(path: Path, out_csv: Path, chunk_size: int = CSV_CHUNK_SIZE, corpus_dir: Path = None,
+                scheme=DEFAULT_SCHEME, full: bool = True):
+    """
+    Parse `path` and write the CSV in a single pass without holding the rows.
+    If `corpus_dir` is given the columnar corpus is written in the same pass,
+    folio block by folio block, along with a folio_checksums.json recording the
+    checksum, line range and CSV byte range of every block (their parse
+    summaries go to folio_summaries.json). With
+    full=False, blocks whose checksum did not change are not parsed again: their
+    lines are copied from the previous corpus and their rows from the previous
+    CSV (see update_blocks). With out_csv=None only the corpus is written.
+    Returns (stats, folio_set, ambiguous_examples, token_freq).
+    """
+    stats = defaultdict(int)
+    folio_set = set()
+    ambiguous_examples = []
+    token_freq = Counter()
+    if corpus_dir is None:
+        rows = iter_rows(path, stats, folio_set, ambiguous_examples, token_freq, scheme)
+        if out_csv is not None:
+            write_csv(rows, out_csv, chunk_size)
+        else:
+            for _ in metrics.timed_iter(iter_chunks(rows, chunk_size), "parse_clean"):
+                pass
+        return stats, folio_set, ambiguous_examples, token_freq
+
+    previous = {} if full else load_blocks(corpus_dir, out_csv)
+    old_corpus = load_corpus(corpus_dir, mmap=False) if previous else None
+    corpus = CorpusWriter(corpus_dir, source=path, scheme=scheme.name)
+    tmp_csv = out_csv.with_name(out_csv.name + ".tmp") if out_csv is not None else None
+    with contextlib.ExitStack() as stack:
+        fh = stack.enter_context(path.open("r", encoding="utf-8", errors="replace"))
+        csv_fh = writer = old_csv = None
+        if out_csv is not None:
+            csv_fh = stack.enter_context(tmp_csv.open("w", newline="", encoding="utf-8"))
+            writer = csv.DictWriter(csv_fh, fieldnames=FIELDNAMES)
+            writer.writeheader()
+            if previous:
+                old_csv = stack.enter_context(out_csv.open("rb"))
+        blocks = update_blocks(iter_folio_blocks(fh), corpus, writer, csv_fh, previous, old_corpus, old_csv,
+                               stats, chunk_size, scheme)
+        csv_size = csv_fh.tell() if csv_fh is not None else None
+
+    for summary in blocks.values():
+        for key, value in summary["stats"].items():
+            stats[key] += value
+        folio_set.update(summary["folios"])
+        room = max(0, 40 - len(ambiguous_examples))
+        ambiguous_examples.extend(tuple(a) for a in summary["ambiguous"][:room])
+        token_freq.update(summary["token_freq"])
+
+    with metrics.span("corpus_write") as span:
+        meta = corpus.close()
+        span["rows"] = meta["n_tokens"]
+    if tmp_csv is not None:
+        tmp_csv.replace(out_csv)
+    stats["corpus_tokens"] = meta["n_tokens"]
+    stats["corpus_types"] = meta["n_types"]
+    checksums = {name: summary["checksum"] for name, summary in blocks.items()}
+    stats["changed_folios"] = len(changed_folios(load_checksums(corpus_dir), checksums))
+    record = {"checksums": checksums, "n_lines": meta["n_lines"],
+              "csv": {"path": str(out_csv), "size": csv_size} if out_csv is not None else None,
+              "blocks": {name: {"lines": summary["lines"], "csv": summary["csv"]} for name, summary in blocks.items()}}
+    (Path(corpus_dir) / CHECKSUMS_NAME).write_text(json.dumps(record, indent=2), encoding="utf-8")
+    # The parse summaries are only needed to copy blocks on the next run, so they stay out of the record
+    summaries = {summary["checksum"]: {k: summary[k] for k in SUMMARY_KEYS} for summary in blocks.values()}
+    (Path(corpus_dir) / SUMMARIES_NAME).write_text(json.dumps(summaries), encoding="utf-8")
+    return stats, folio_set, ambiguous_examples, token_freq
+
+
+def update_blocks(blocks, corpus, writer, csv_fh, previous, old_corpus, old_csv, stats, chunk_size,
+                  scheme=DEFAULT_SCHEME):
+    """
+    Feed every (name, lines) folio block into the CorpusWriter and the CSV
+    writer. A block recorded in `previous` with the same checksum is copied
+    from the old corpus and old CSV file; any other block is parsed and
+    cleaned. Returns {name: summary} with the checksum, line range, CSV byte
+    range and accumulators (stats, folios, ambiguous examples, token counts)
+    of every block.
+    """
+    summaries = {}
+    for name, block in blocks:
+        digest = block_checksum(block, scheme)
+        first_line = corpus.n_lines
+        csv_start = csv_fh.tell() if csv_fh is not None else None
+        old = previous.get(name)
+        if old is not None and old["checksum"] == digest:
+            with metrics.span("folio_copy", rows=old["lines"][1] - old["lines"][0], accumulate=True):
+                corpus.copy_lines(old_corpus, *old["lines"])
+                if csv_fh is not None:
+                    csv_fh.flush()
+                    old_csv.seek(old["csv"][0])
+                    csv_fh.buffer.write(old_csv.read(old["csv"][1] - old["csv"][0]))
+            summary = {k: old[k] for k in SUMMARY_KEYS}
+            stats["reused_folios"] += 1
+        else:
+            block_stats = defaultdict(int)
+            folio_set = set()
+            ambiguous_examples = []
+            token_freq = Counter()
+            rows = corpus.observe(iter_line_rows(block, block_stats, folio_set, ambiguous_examples, token_freq,
+                                                 scheme))
+            if writer is not None:
+                write_rows(writer, rows, chunk_size)
+            else:
+                for _ in metrics.timed_iter(iter_chunks(rows, chunk_size), "parse_clean"):
+                    pass
+            summary = {"stats": dict(block_stats), "folios": sorted(folio_set),
+                       "ambiguous": ambiguous_examples, "token_freq": dict(token_freq)}
+            stats["parsed_folios"] += 1
+        summaries[name] = dict(summary, checksum=digest, lines=[first_line, corpus.n_lines],
+                               csv=[csv_start, csv_fh.tell()] if csv_fh is not None else None)
+    return summaries
+
 
-    header = list(rows[0].keys())
+def load_blocks(corpus_dir: Path, out_csv: Path = None):
+    """
+    Blocks recorded by the last stream_file into `corpus_dir`, as {name: entry
+    with its checksum}, or {} when they cannot be reused because the corpus or
+    the CSV no longer match the record.
+    """
+    path = Path(corpus_dir) / CHECKSUMS_NAME
+    summaries_path = Path(corpus_dir) / SUMMARIES_NAME
+    meta_path = Path(corpus_dir) / "meta.json"
+    if not (path.exists() and summaries_path.exists() and meta_path.exists()):
+        return {}
+    record = json.loads(path.read_text(encoding="utf-8"))
+    if "blocks" not in record:
+        return {}
+    if json.loads(meta_path.read_text(encoding="utf-8"))["n_lines"] != record["n_lines"]:
+        return {}
+    if out_csv is not None:
+        csv_record = record["csv"]
+        if (csv_record is None or csv_record["path"] != str(out_csv) or not Path(out_csv).exists()
+                or Path(out_csv).stat().st_size != csv_record["size"]):
+            return {}
+    summaries = json.loads(summaries_path.read_text(encoding="utf-8"))
+    blocks = {}
+    for name, entry in record["blocks"].items():
+        digest = record["checksums"][name]
+        if digest in summaries:
+            blocks[name] = dict(entry, checksum=digest, **summaries[digest])
+    return blocks
+
+
+def write_csv(rows, out_path: Path, chunk_size: int = CSV_CHUNK_SIZE):
+    """
+    Write any iterable of row dicts, flushing `chunk_size` rows at a time.
+    Time spent producing the rows (parsing + cleaning) and writing them are
+    recorded as the spans parse_clean and csv_write.
+    """
     with out_path.open("w", newline="", encoding="utf-8") as fh:
-        writer = csv.DictWriter(fh, fieldnames=header)
+        writer = csv.DictWriter(fh, fieldnames=FIELDNAMES)
         writer.writeheader()
-        for r in rows:
-            writer.writerow(r)
+        return write_rows(writer, rows, chunk_size)
+
+
+def write_rows(writer, rows, chunk_size: int = CSV_CHUNK_SIZE):
+    written = 0
+    for chunk in metrics.timed_iter(iter_chunks(rows, chunk_size), "parse_clean"):
+        with metrics.span("csv_write", rows=len(chunk), accumulate=True):
+            writer.writerows(chunk)
+        written += len(chunk)
+    return written
 
 
-def write_log(stats, folio_set, ambiguous_examples, out_path: Path, rows):
+def iter_chunks(iterable, size: int):
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def write_log(stats, folio_set, ambiguous_examples, out_path: Path, token_freq):
     lines = []
     lines.append(f"Source file: {INPUT}")
-    lines.append(f"Total word-level rows: {len(rows)}")
+    lines.append(f"Total word-level rows: {stats.get('rows', 0)}")
     lines.append(f"Total tokens processed: {stats.get('total_words', 0)}")
     lines.append(f"Blank lines skipped: {stats.get('blank_lines', 0)}")
     lines.append(f"Untagged lines: {stats.get('untagged_lines', 0)}")
@@ -192,14 +453,9 @@ def write_log(stats, folio_set, ambiguous_examples, out_path: Path, rows):
     lines.append(f"Unique folios found: {len(folio_set)}")
     lines.append("")
 
-    # Top unified tokens (simple frequency)
+    # Top unified tokens (simple frequency, accumulated while parsing)
     lines.append("Top 20 unified tokens (by frequency):")
-    freq = defaultdict(int)
-    for r in rows:
-        u = r.get("unified_word")
-        if u:
-            freq[u] += 1
-    top = sorted(freq.items(), key=lambda x: x[1], reverse=True)[:20]
+    top = sorted(token_freq.items(), key=lambda x: x[1], reverse=True)[:20]
     for token, cnt in top:
         lines.append(f"  {token:30} {cnt}")
     lines.append("")
@@ -211,19 +467,47 @@ def write_log(stats, folio_set, ambiguous_examples, out_path: Path, rows):
     out_path.write_text("\n".join(lines), encoding="utf-8")
 
 
-def main():
+def up_to_date(path: Path, corpus_dir: Path, scheme=DEFAULT_SCHEME):
+    """True when no folio block changed since the corpus was written."""
+    outputs = [OUT_CSV, OUT_LOG, Path(corpus_dir) / "meta.json", Path(corpus_dir) / "index"]
+    previous = load_checksums(corpus_dir)
+    return bool(previous) and all(p.exists() for p in outputs) and previous == folio_checksums(path, scheme)
+
+
+def main(full=False):
+    """
+    Parse INPUT; unless `full`, only the folios that changed since the last run
+    are parsed and cleaned again, and nothing is done when none changed.
+    """
     if not INPUT.exists():
         print(f"Input file not found: {INPUT}")
         return
 
-    rows, stats, folio_set, ambiguous_examples = parse_file(INPUT)
-    write_csv(rows, OUT_CSV)
-    write_log(stats, folio_set, ambiguous_examples, OUT_LOG, rows)
+    if not full and up_to_date(INPUT, CORPUS_DIR):
+        print(f"Up to date: no folio of {INPUT} changed since the last parse.")
+        return
+
+    with metrics.stage("parse") as total:
+        stats, folio_set, ambiguous_examples, token_freq = stream_file(INPUT, OUT_CSV, corpus_dir=CORPUS_DIR,
+                                                                       full=full)
+        with metrics.span("inverted_index", rows=stats.get("corpus_tokens")):
+            index_dir = build_index(CORPUS_DIR)
+        with metrics.span("write_log"):
+            write_log(stats, folio_set, ambiguous_examples, OUT_LOG, token_freq)
+        total["rows"] = stats.get("rows", 0)
     print("Done.")
     print(f"Word-level CSV: {OUT_CSV}")
+    print(f"Columnar corpus: {CORPUS_DIR} ({stats.get('corpus_tokens', 0)} tokens, "
+          f"{stats.get('corpus_types', 0)} types)")
+    print(f"Inverted index: {index_dir}")
     print(f"Preprocessing log: {OUT_LOG}")
-    print(f"Rows written: {len(rows)}")
+    print(f"Metrics: {metrics.METRICS_FILE}")
+    print(f"Rows written: {stats.get('rows', 0)}")
+    print(f"Folios parsed again: {stats.get('parsed_folios', 0)} "
+          f"(copied {stats.get('reused_folios', 0)}, changed {stats.get('changed_folios', 0)})")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Parse data/takeshi.txt into the CSV, corpus and index")
+    parser.add_argument("--full", action="store_true", help="parse every folio again, even unchanged ones")
+    main(full=parser.parse_args().full)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Runs the preprocessing and analysis scripts as stages of one process.
+
+Every stage lists the stages it depends on, the files it reads (code and
+data) and the files it produces. A stage is skipped when the hash of its
+inputs matches the one recorded after its last successful run and its outputs
+still exist. When one of its code inputs changed, a stage runs forced (the
+parser then parses every folio, not only the changed ones). Stages whose dependencies are done run concurrently in a thread
+pool, sharing one Workspace (corpus loaded once, derived tables built once).
+With --headless the analysis stages skip plotting (matplotlib, seaborn and
+t-SNE are never imported) and write their results as JSON to logs/results/.
+
+Usage (from anywhere):
+    python pipeline.py                      # run what changed
+    python pipeline.py word_embeddings      # one stage (plus what it needs)
+    python pipeline.py --force --jobs 1     # re-run everything, sequentially
+    python pipeline.py --headless           # compute only, JSON results
+    python pipeline.py --force --profile word_embeddings   # cProfile dump in logs/profiles/
+"""
+
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+import metrics
+from results import RESULTS_DIR
+from workspace import Workspace
+
+ROOT = Path(__file__).resolve().parent
+STATE_FILE = Path("data/cache/pipeline_state.json")
+
+CORPUS_FILES = ["data/takeshi_corpus/*.npy", "data/takeshi_corpus/meta.json"]
+GLYPH_CODE = ["exploratory_analysis/glyphs.py", "exploratory_analysis/ngrams.py"]
+SHARED_CODE = ["corpus_store.py", "workspace.py", "results.py"]
+
+
+class Stage:
+    def __init__(self, name, module, deps=(), inputs=(), outputs=(), uses_workspace=True, force_arg=None):
+        self.name = name
+        self.module = module
+        self.deps = list(deps)
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.uses_workspace = uses_workspace
+        self.force_arg = force_arg  # keyword of main() that disables the module's own up-to-date check
+
+    def fingerprint(self, code_only=False):
+        """Hash of the input files; with code_only, of the .py inputs alone."""
+        h = hashlib.sha256()
+        files = sorted({p for pattern in self.inputs for p in Path(".").glob(pattern)
+                        if p.is_file() and (p.suffix == ".py" or not code_only)})
+        for path in files:
+            h.update(str(path).encode("utf-8"))
+            h.update(hashlib.sha256(path.read_bytes()).digest())
+        return h.hexdigest()
+
+    def expected_outputs(self, headless=False):
+        if headless and self.uses_workspace:
+            return [str(RESULTS_DIR / f"{self.module.rsplit('.', 1)[-1]}.json")]
+        return self.outputs
+
+    def outputs_exist(self, headless=False):
+        return all(Path(p).exists() for p in self.expected_outputs(headless))
+
+    def run(self, ws, headless=False, force=False):
+        module = importlib.import_module(self.module)
+        if not self.uses_workspace:
+            module.main(**({self.force_arg: True} if force and self.force_arg else {}))
+        elif headless:
+            module.main(ws, plot=False, results_dir=RESULTS_DIR)
+        else:
+            module.main(ws)
+
+
+STAGES = [
+    Stage("parse", "parse_takeshi", uses_workspace=False, force_arg="full",
+          inputs=["data/takeshi.txt", "parse_takeshi.py", "schemes.py", "metrics.py", "corpus_store.py",
+                  "search/inverted_index.py"] + GLYPH_CODE + ["exploratory_analysis/sections.py"],
+          outputs=["data/takeshi_parsed_words.csv", "data/takeshi_corpus/meta.json",
+                   "logs/takeshi_preprocessing_log.txt"]),
+    Stage("basic_statistics", "exploratory_analysis.basic_statistics", deps=["parse"],
+          inputs=CORPUS_FILES + SHARED_CODE + GLYPH_CODE + ["exploratory_analysis/basic_statistics.py"],
+          outputs=["logs/voynich_stats.png"]),
+    Stage("word_ocurrence", "exploratory_analysis.word_ocurrence", deps=["parse"],
+          inputs=CORPUS_FILES + SHARED_CODE + GLYPH_CODE + ["exploratory_analysis/word_ocurrence.py"],
+          outputs=["logs/voynich_linguistic_analysis.png"]),
+    Stage("structural_patterns", "exploratory_analysis.structural_patterns", deps=["parse"],
+          inputs=CORPUS_FILES + SHARED_CODE + ["exploratory_analysis/sections.py",
+                                               "exploratory_analysis/significance.py",
+                                               "exploratory_analysis/timeline.py",
+                                               "exploratory_analysis/structural_patterns.py"] + GLYPH_CODE,
+          outputs=["logs/voynich_structural_analysis.png", "logs/voynich_timeline.png"]),
+    Stage("word_embeddings", "embeddings_and_models.word_embeddings", deps=["parse"],
+          inputs=CORPUS_FILES + SHARED_CODE + ["embeddings_and_models/*.py"],
+          outputs=["logs/voynich_embeddings_tsne.png", "data/embeddings/meta.json"]),
+]
+
+
+def load_state():
+    if STATE_FILE.exists():
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    return {}
+
+
+def save_state(state):
+    STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    STATE_FILE.write_text(json.dumps(state, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def select(stages, names):
+    """The requested stages plus everything they depend on."""
+    by_name = {s.name: s for s in stages}
+    unknown = [n for n in names if n not in by_name]
+    if unknown:
+        raise SystemExit(f"Unknown stage(s): {', '.join(unknown)} (available: {', '.join(by_name)})")
+    wanted = set()
+    todo = list(names) or list(by_name)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(by_name[name].deps)
+    return [s for s in stages if s.name in wanted]
+
+
+def run_pipeline(stages=STAGES, names=(), force=False, jobs=None, headless=False):
+    stages = select(stages, list(names))
+    state = load_state()
+    ws = Workspace()
+    pending = {s.name: s for s in stages}
+    done, failed, results = set(), set(), {}
+
+    def state_key(stage):
+        return f"{stage.name}:headless" if headless and stage.uses_workspace else stage.name
+
+    def execute(stage):
+        fp, code_fp = stage.fingerprint(), stage.fingerprint(code_only=True)
+        if not force and state.get(state_key(stage)) == fp and stage.outputs_exist(headless):
+            return stage, fp, code_fp, "cached", 0.0
+        start = time.perf_counter()
+        # Changed code may change every output, so the module's own up-to-date
+        # check (e.g. the parser's folio checksums) cannot be trusted then
+        code_changed = state.get(f"{state_key(stage)}:code") != code_fp
+        stage.run(ws, headless, force or code_changed)
+        if not stage.uses_workspace:
+            ws.reset()  # upstream data changed; rebuild shared artifacts on next use
+        return stage, fp, code_fp, "ran", time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+        running = {}
+        while pending or running:
+            for name, stage in list(pending.items()):
+                if any(d in failed for d in stage.deps):
+                    failed.add(name)
+                    results[name] = "skipped (dependency failed)"
+                    del pending[name]
+                elif all(d in done for d in stage.deps):
+                    running[pool.submit(execute, stage)] = name
+                    del pending[name]
+            if not running:
+                break
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                try:
+                    stage, fp, code_fp, status, elapsed = future.result()
+                except Exception as exc:
+                    failed.add(name)
+                    results[name] = f"failed: {exc!r}"
+                    continue
+                state[state_key(stage)] = fp
+                state[f"{state_key(stage)}:code"] = code_fp
+                save_state(state)
+                done.add(name)
+                results[name] = status if status == "cached" else f"ran in {elapsed:.1f}s"
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the Voynich analysis pipeline")
+    parser.add_argument("stages", nargs="*", help=f"stages to run (default: all of {[s.name for s in STAGES]})")
+    parser.add_argument("--force", action="store_true", help="re-run stages even if their inputs did not change")
+    parser.add_argument("--jobs", type=int, default=None, help="stages to run at the same time")
+    parser.add_argument("--headless", action="store_true", help="skip the plots and write JSON results instead")
+    parser.add_argument("--profile", nargs="+", default=[], metavar="STAGE",
+                        help="run these stages under cProfile (dumps go to logs/profiles/)")
+    args = parser.parse_args()
+    metrics.PROFILE_STAGES.update(args.profile)
+
+    os.chdir(ROOT)  # every stage uses paths relative to the repository root
+    if not args.headless:
+        import matplotlib
+        matplotlib.use("Agg")
+
+    results = run_pipeline(names=args.stages, force=args.force, jobs=args.jobs, headless=args.headless)
+    for name, status in results.items():
+        print(f"{name:22} {status}")
+    print(f"Metrics: {metrics.METRICS_FILE}")
+    if any(status.startswith(("failed", "skipped")) for status in results.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
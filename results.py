@@ -0,0 +1,43 @@
+"""
+Machine-readable output for the compute-only (headless) mode.
+
+Analysis results are plain dicts that may hold NumPy scalars/arrays and
+pandas DataFrames. write_results turns them into JSON (DataFrames become
+lists of records); arrays too large to be useful as JSON are written next
+to it as .npy files and referenced by file name.
+"""
+
+import json
+from pathlib import Path
+
+import numpy as np
+
+RESULTS_DIR = Path("logs/results")
+MAX_JSON_ARRAY = 10000
+
+
+def _jsonable(value, name, out_dir: Path, stem: str):
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v, f"{name}.{k}", out_dir, stem) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v, name, out_dir, stem) for v in value]
+    if hasattr(value, "to_dict") and hasattr(value, "columns"):  # pandas DataFrame
+        return _jsonable(value.to_dict(orient="records"), name, out_dir, stem)
+    if isinstance(value, np.ndarray):
+        if value.size > MAX_JSON_ARRAY:
+            path = out_dir / f"{stem}.{name}.npy"
+            np.save(path, value)
+            return {"npy": path.name, "shape": list(value.shape), "dtype": str(value.dtype)}
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def write_results(stem: str, result: dict, out_dir: Path = RESULTS_DIR):
+    """Write `result` to <out_dir>/<stem>.json and return the path."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"{stem}.json"
+    path.write_text(json.dumps(_jsonable(result, "result", out_dir, stem), indent=2), encoding="utf-8")
+    return path
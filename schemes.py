@@ -0,0 +1,92 @@
+"""
+Transliteration schemes: the per-scheme rules the parser needs.
+
+All supported files use the interlinear locus tags ("<f1r.P1.1;H> text"),
+but differ in markup and alphabet:
+ - eva        generic EVA (interlinear file): '.' spaces, ',' uncertain spaces,
+              '{...}' inline comments, '!' and '%' fillers, '-' and '=' breaks
+              (drawing, paragraph end), '*' unreadable glyphs
+ - takahashi  Takeshi Takahashi's EVA transcription (transcriber code H)
+ - currier    Prescott Currier's alphabet (transcriber C); upper case letters
+              and digits are distinct glyphs, so words are not case folded
+ - fsg        First Study Group alphabet (transcriber F), upper case, not folded
+
+A scheme may be restricted to a transcriber code, so one interlinear file can
+be ingested once per transcriber.
+"""
+
+import re
+from pathlib import Path
+
+COMMENT_RE = re.compile(r'\{[^}]*\}|<![^>]*>')
+TRANSCRIBER_RE = re.compile(r'^\s*<[^>;]+;(?P<code>[^>]+)>')
+
+
+class Scheme:
+    def __init__(self, name, transcribers=None, fold_case=True, separators=",-=", fillers="!%"):
+        self.name = name
+        self.transcribers = set(transcribers) if transcribers else None
+        self.fold_case = fold_case
+        self._separators = re.compile(f"[{re.escape(separators)}]") if separators else None
+        self._fillers = re.compile(f"[{re.escape(fillers)}]") if fillers else None
+
+    def accepts(self, scribal):
+        """Whether a line by transcriber `scribal` belongs to this scheme."""
+        return self.transcribers is None or scribal is None or scribal in self.transcribers
+
+    def prepare(self, content: str) -> str:
+        """Remove comments and fillers; uncertain spaces and breaks become word separators."""
+        content = COMMENT_RE.sub("", content)
+        if self._fillers is not None:
+            content = self._fillers.sub("", content)
+        if self._separators is not None:
+            content = self._separators.sub(".", content)
+        return content
+
+    def unify(self, cleaned: str) -> str:
+        """The unified_word of a cleaned token (parse_takeshi.clean_token)."""
+        return cleaned.lower() if self.fold_case else cleaned
+
+    def __repr__(self):
+        return f"Scheme({self.name!r})"
+
+
+SCHEMES = {
+    "eva": Scheme("eva"),
+    "takahashi": Scheme("takahashi", transcribers={"H"}),
+    "currier": Scheme("currier", transcribers={"C"}, fold_case=False),
+    "fsg": Scheme("fsg", transcribers={"F"}, fold_case=False),
+}
+DEFAULT_SCHEME = SCHEMES["takahashi"]
+SCHEME_OF_TRANSCRIBER = {"H": "takahashi", "C": "currier", "F": "fsg"}
+
+
+def get_scheme(name) -> Scheme:
+    if isinstance(name, Scheme):
+        return name
+    try:
+        return SCHEMES[name.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown transliteration scheme {name!r} (available: {', '.join(SCHEMES)})") from None
+
+
+def detect_scheme(path: Path, sample_lines: int = 500) -> Scheme:
+    """
+    Guess the scheme of a file: a scheme name in the file name wins, then a
+    single transcriber code in the first tagged lines; otherwise generic EVA.
+    """
+    stem = Path(path).stem.lower()
+    for name in SCHEMES:
+        if name in stem:
+            return SCHEMES[name]
+    codes = set()
+    with Path(path).open("r", encoding="utf-8", errors="replace") as fh:
+        for i, line in enumerate(fh):
+            if i >= sample_lines:
+                break
+            m = TRANSCRIBER_RE.match(line)
+            if m:
+                codes.add(m.group("code").strip())
+    if len(codes) == 1:
+        return SCHEMES.get(SCHEME_OF_TRANSCRIBER.get(codes.pop(), "eva"), SCHEMES["eva"])
+    return SCHEMES["eva"]
@@ -0,0 +1,260 @@
+"""
+Persistent inverted index and keyword-in-context (KWIC) queries.
+
+Built once at parse time into <corpus_dir>/index/ from the corpus arrays:
+ - word postings: token positions grouped by word type (the corpus vocabulary,
+   already unified by the source's scheme, see schemes.Scheme.unify),
+   i.e. a stable argsort of the type ids plus per-type offsets
+ - substring search: the glyph-encoded types, each followed by a separator,
+   as one int array plus its suffix array (search/suffix_array.py), so the
+   index grows linearly with the total length of the types and a glyph
+   substring is found with a binary search over the suffixes
+ - the unified types sorted forwards and by their reversed spelling, so
+   prefix and suffix searches are two binary searches
+
+A posting is a token position; its folio, line tag (meta_left locus) and word
+position in the line are read from the corpus line table, so every query costs
+O(log V + result size).
+"""
+
+import argparse
+import bisect
+from pathlib import Path
+
+import numpy as np
+
+from corpus_store import CORPUS_DIR, load_corpus, load_strings, save_strings
+from schemes import DEFAULT_SCHEME, get_scheme
+from exploratory_analysis.glyphs import DEFAULT_TOKENIZER
+from exploratory_analysis.sections import SECTION_NAMES, folio_numbers, sections_of
+from search.suffix_array import suffix_array
+
+INDEX_DIRNAME = "index"
+DEFAULT_CONTEXT = 4
+
+
+def build_index(corpus_dir: Path = CORPUS_DIR, tokenizer=DEFAULT_TOKENIZER):
+    """Build the index files for the corpus in `corpus_dir`."""
+    corpus = load_corpus(corpus_dir)
+    out_dir = Path(corpus_dir) / INDEX_DIRNAME
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # Word types in sorted order; the vocabulary is already unified by the source's scheme
+    unified, type_of_vocab = np.unique(corpus.vocab, return_inverse=True)
+    unified_tokens = type_of_vocab[np.asarray(corpus.tokens)]
+    postings = np.argsort(unified_tokens, kind="stable").astype(np.int64)
+    offsets = np.zeros(len(unified) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(unified_tokens, minlength=len(unified)), out=offsets[1:])
+
+    # Glyphs of every unified type, each type followed by a separator (the id
+    # after the alphabet), and the suffix array of that text
+    glyphs, glyph_offsets, alphabet = tokenizer.encode(unified.tolist())
+    type_of_glyph = np.repeat(np.arange(len(unified)), np.diff(glyph_offsets))
+    type_starts = glyph_offsets[:-1] + np.arange(len(unified))
+    type_text = np.full(len(glyphs) + len(unified), len(alphabet), dtype=np.int32)
+    type_text[np.arange(len(glyphs)) + type_of_glyph] = glyphs
+    type_sa = suffix_array(type_text)
+
+    reversed_order = np.argsort(np.array([w[::-1] for w in unified.tolist()], dtype=str), kind="stable")
+
+    save_strings(out_dir, "types", unified.tolist())
+    save_strings(out_dir, "alphabet", alphabet)
+    np.save(out_dir / "type_of_vocab.npy", type_of_vocab.astype(np.int32))
+    np.save(out_dir / "postings.npy", postings)
+    np.save(out_dir / "posting_offsets.npy", offsets)
+    np.save(out_dir / "type_text.npy", type_text)
+    np.save(out_dir / "type_starts.npy", type_starts.astype(np.int64))
+    np.save(out_dir / "type_sa.npy", type_sa.astype(np.int32))
+    np.save(out_dir / "reversed_order.npy", reversed_order.astype(np.int32))
+    return out_dir
+
+
+def sa_bound(text, sa, pattern, upper=False):
+    """
+    First row of the suffix array `sa` of `text` whose suffix does not sort
+    before `pattern` (upper=False), or after every suffix starting with it
+    (upper=True); the suffixes starting with the pattern are the rows between
+    the two bounds.
+    """
+    lo, hi = 0, len(sa)
+    m = len(pattern)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        start = int(sa[mid])
+        prefix = text[start:start + m].tolist()
+        if prefix < pattern or (upper and prefix == pattern):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class InvertedIndex:
+    """Query API over a built index. Postings are memory-mapped."""
+
+    def __init__(self, corpus_dir: Path = CORPUS_DIR, tokenizer=DEFAULT_TOKENIZER):
+        self.corpus = load_corpus(corpus_dir)
+        # Queries are unified like the corpus words (lower-cased unless the scheme keeps case)
+        self.scheme = get_scheme(self.corpus.meta.get("scheme") or DEFAULT_SCHEME)
+        path = Path(corpus_dir) / INDEX_DIRNAME
+        if not (path / "postings.npy").exists():
+            raise FileNotFoundError(f"Index not found in {path} (run parse_takeshi.py first)")
+        load = lambda name: np.load(path / f"{name}.npy", mmap_mode="r")
+        self.types = load_strings(path, "types")
+        self.type_list = self.types.tolist()
+        self.tokenizer = tokenizer
+        self.glyph_ids = {g: i for i, g in enumerate(load_strings(path, "alphabet").tolist())}
+        self.type_of_vocab = load("type_of_vocab")
+        self.postings = load("postings")
+        self.posting_offsets = load("posting_offsets")
+        self.type_text = load("type_text")
+        self.type_starts = load("type_starts")
+        self.type_sa = load("type_sa")
+        self.reversed_order = np.asarray(load("reversed_order"))
+        self.reversed_types = [self.type_list[i][::-1] for i in self.reversed_order]
+
+        self._line_offsets = np.asarray(self.corpus.line_offsets)
+        self._line_folio = np.asarray(self.corpus.line_folio)
+        self._line_section = sections_of(folio_numbers(self.corpus.folios))[self._line_folio]
+
+    # --- type lookups -------------------------------------------------
+
+    def type_id(self, word):
+        word = self.scheme.unify(word)
+        i = bisect.bisect_left(self.type_list, word)
+        return i if i < len(self.type_list) and self.type_list[i] == word else None
+
+    def prefix_types(self, prefix):
+        prefix = self.scheme.unify(prefix)
+        lo = bisect.bisect_left(self.type_list, prefix)
+        hi = bisect.bisect_left(self.type_list, prefix + "\uffff")
+        return np.arange(lo, hi)
+
+    def suffix_types(self, suffix):
+        rev = self.scheme.unify(suffix)[::-1]
+        lo = bisect.bisect_left(self.reversed_types, rev)
+        hi = bisect.bisect_left(self.reversed_types, rev + "\uffff")
+        return self.reversed_order[lo:hi]
+
+    def substring_types_of(self, glyphs):
+        """Types containing the glyph substring (must align with EVA glyph boundaries), in type order."""
+        pattern = [self.glyph_ids.get(g) for g in self.tokenizer.split(self.scheme.unify(glyphs))]
+        if not pattern or None in pattern:
+            return np.zeros(0, dtype=np.int32)
+        lo = sa_bound(self.type_text, self.type_sa, pattern)
+        hi = sa_bound(self.type_text, self.type_sa, pattern, upper=True)
+        starts = np.asarray(self.type_sa[lo:hi])
+        return np.unique(np.searchsorted(self.type_starts, starts, side="right") - 1).astype(np.int32)
+
+    # --- postings -----------------------------------------------------
+
+    def positions(self, type_ids):
+        """Token positions of all occurrences of the given unified types, in text order."""
+        parts = [self.postings[self.posting_offsets[t]:self.posting_offsets[t + 1]]
+                 for t in np.atleast_1d(type_ids)]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate(parts))
+
+    def _filter(self, positions, folios=None, section=None, locus_prefix=None):
+        if len(positions) == 0 or (folios is None and section is None and locus_prefix is None):
+            return positions
+        lines = np.searchsorted(self._line_offsets, positions, side="right") - 1
+        keep = np.ones(len(positions), dtype=bool)
+        if folios is not None:
+            wanted = np.isin(self.corpus.folios, list(folios))
+            keep &= wanted[self._line_folio[lines]]
+        if section is not None:
+            if section not in SECTION_NAMES:
+                raise ValueError(f"Unknown section: {section!r} (expected one of {SECTION_NAMES})")
+            keep &= np.asarray(self._line_section[lines] == section)
+        if locus_prefix is not None:
+            keep &= np.char.startswith(self.corpus.line_meta_left[lines], locus_prefix)
+        return positions[keep]
+
+    def hits(self, positions):
+        """Posting tuples (folio, line tag, word position in line, word) for token positions."""
+        positions = np.asarray(positions, dtype=np.int64)
+        lines = np.searchsorted(self._line_offsets, positions, side="right") - 1
+        word_pos = positions - self._line_offsets[lines] + 1
+        folios = self.corpus.folios[self._line_folio[lines]]
+        tags = self.corpus.line_meta_left[lines]
+        words = self.types[self.type_of_vocab[np.asarray(self.corpus.tokens)[positions]]]
+        return list(zip(folios.tolist(), tags.tolist(), word_pos.tolist(), words.tolist()))
+
+    # --- queries ------------------------------------------------------
+
+    def lookup(self, word, **filters):
+        """Occurrences of a word; filters: folios=[...], section='Herbal', locus_prefix='f1r.P1'."""
+        t = self.type_id(word)
+        positions = self.positions(t) if t is not None else np.zeros(0, dtype=np.int64)
+        return self.hits(self._filter(positions, **filters))
+
+    def prefix(self, prefix, **filters):
+        return self.hits(self._filter(self.positions(self.prefix_types(prefix)), **filters))
+
+    def suffix(self, suffix, **filters):
+        return self.hits(self._filter(self.positions(self.suffix_types(suffix)), **filters))
+
+    def substring(self, glyphs, **filters):
+        return self.hits(self._filter(self.positions(self.substring_types_of(glyphs)), **filters))
+
+    def kwic(self, word=None, prefix=None, suffix=None, substring=None, width=DEFAULT_CONTEXT, **filters):
+        """
+        Keyword-in-context lines for exactly one of word / prefix / suffix / substring.
+        `width` words of context are shown on each side, without crossing line boundaries.
+        """
+        queries = {"word": word, "prefix": prefix, "suffix": suffix, "substring": substring}
+        given = [k for k, v in queries.items() if v is not None]
+        if len(given) != 1:
+            raise ValueError("kwic() takes exactly one of word, prefix, suffix or substring")
+        kind = given[0]
+        value = queries[kind]
+        if kind == "word":
+            t = self.type_id(value)
+            type_ids = [t] if t is not None else []
+        else:
+            type_ids = {"prefix": self.prefix_types, "suffix": self.suffix_types,
+                        "substring": self.substring_types_of}[kind](value)
+        positions = self._filter(self.positions(type_ids), **filters)
+
+        tokens = np.asarray(self.corpus.tokens)
+        vocab = self.corpus.vocab
+        lines = np.searchsorted(self._line_offsets, positions, side="right") - 1
+        out = []
+        for pos, line in zip(positions.tolist(), lines.tolist()):
+            start = max(self._line_offsets[line], pos - width)
+            end = min(self._line_offsets[line + 1], pos + width + 1)
+            left = " ".join(vocab[tokens[start:pos]].tolist())
+            right = " ".join(vocab[tokens[pos + 1:end]].tolist())
+            out.append((self.corpus.line_meta_left[line], left, vocab[tokens[pos]], right))
+        return out
+
+
+def format_kwic(rows, width=40):
+    return "\n".join(f"{tag:14} {left[-width:]:>{width}} [{kw}] {right[:width]}" for tag, left, kw, right in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keyword-in-context search over the parsed corpus")
+    parser.add_argument("query", help="word to look up (see --prefix/--suffix/--substring)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--prefix", action="store_true", help="match words starting with the query")
+    mode.add_argument("--suffix", action="store_true", help="match words ending with the query")
+    mode.add_argument("--substring", action="store_true", help="match words containing the glyph sequence")
+    parser.add_argument("--width", type=int, default=DEFAULT_CONTEXT, help="context words on each side")
+    parser.add_argument("--folio", action="append", help="restrict to a folio (repeatable)")
+    parser.add_argument("--section", help="restrict to a section (Herbal, Biological, ...)")
+    parser.add_argument("--locus", help="restrict to loci starting with this prefix, e.g. f1r.P1")
+    args = parser.parse_args()
+
+    kind = "prefix" if args.prefix else "suffix" if args.suffix else "substring" if args.substring else "word"
+    index = InvertedIndex()
+    rows = index.kwic(**{kind: args.query}, width=args.width, folios=args.folio,
+                      section=args.section, locus_prefix=args.locus)
+    print(format_kwic(rows))
+    print(f"{len(rows)} hits")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+"""
+Suffix array, LCP array and FM-index over the word or glyph stream.
+
+ - the suffix array is built by prefix doubling on NumPy rank arrays
+   (O(n log n), every round is one lexsort), the LCP array with Kasai's
+   O(n) algorithm
+ - occurrences never span two lines: every line is followed by its own
+   terminator symbol in the indexed text, so no common prefix (and no match)
+   runs into the next line, and the text ends with a sentinel
+ - counting/locating uses FM-index backward search: one rank query per
+   pattern symbol, each a binary search in that symbol's BWT positions
+ - maximal repeats are the left-maximal LCP intervals, enumerated with one
+   stack pass over the LCP array; each comes with its folio locations
+
+The glyph stream separates the words of a line with WORD_SEPARATOR, so glyph
+motifs can run across word boundaries (inside one line).
+"""
+
+import argparse
+
+import numpy as np
+
+from corpus_store import load_corpus
+from exploratory_analysis.glyphs import DEFAULT_TOKENIZER
+from exploratory_analysis.ngrams import GlyphStream
+
+WORD_SEPARATOR = "."
+
+
+def suffix_array(symbols):
+    """Suffix array of an int sequence by prefix doubling (shorter suffixes sort first)."""
+    s = np.asarray(symbols)
+    n = len(s)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    _, rank = np.unique(s, return_inverse=True)
+    rank = rank.astype(np.int64)
+    k = 1
+    while True:
+        second = np.full(n, -1, dtype=np.int64)
+        second[:n - k] = rank[k:]
+        sa = np.lexsort((second, rank))
+        r1, r2 = rank[sa], second[sa]
+        changed = np.empty(n, dtype=bool)
+        changed[0] = True
+        changed[1:] = (r1[1:] != r1[:-1]) | (r2[1:] != r2[:-1])
+        new_rank = np.cumsum(changed) - 1
+        rank = np.empty(n, dtype=np.int64)
+        rank[sa] = new_rank
+        if new_rank[-1] == n - 1 or k >= n:
+            return sa.astype(np.int64)
+        k *= 2
+
+
+def lcp_array(symbols, sa):
+    """lcp[r] = longest common prefix of suffixes sa[r-1] and sa[r] (lcp[0] = 0), Kasai et al."""
+    s = np.asarray(symbols).tolist()
+    sa_list = np.asarray(sa).tolist()
+    n = len(s)
+    rank = [0] * n
+    for r, i in enumerate(sa_list):
+        rank[i] = r
+    lcp = [0] * n
+    h = 0
+    for i in range(n):
+        r = rank[i]
+        if r > 0:
+            j = sa_list[r - 1]
+            while i + h < n and j + h < n and s[i + h] == s[j + h]:
+                h += 1
+            lcp[r] = h
+            if h > 0:
+                h -= 1
+        else:
+            h = 0
+    return np.array(lcp, dtype=np.int64)
+
+
+class SuffixIndex:
+    """
+    symbols:       int symbol stream
+    alphabet:      string of every symbol id
+    position_line: corpus line of every stream position
+    joiner:        used to render a sequence of symbols (" " for words, "" for glyphs)
+    """
+
+    def __init__(self, symbols, alphabet, position_line, corpus, joiner=" ", separator=None):
+        self.symbols = np.asarray(symbols, dtype=np.int64)
+        self.alphabet = list(alphabet)
+        self.lookup = {a: i for i, a in enumerate(self.alphabet)}
+        self.position_line = np.asarray(position_line, dtype=np.int64)
+        self.corpus = corpus
+        self.joiner = joiner
+        self.separator = separator
+        n = len(self.symbols)
+
+        # Indexed text: every line followed by its own terminator. Terminators take
+        # the ids 0..n_lines-1 (below every symbol, which is shifted up by n_lines)
+        # and are unique, so no common prefix or match runs into the next line and
+        # the text ends with a sentinel that no pattern contains.
+        line_change = np.flatnonzero(np.diff(self.position_line)) + 1
+        segment = np.searchsorted(line_change, np.arange(n), side="right")
+        n_lines = len(line_change) + 1 if n else 0
+        self.n_terminators = n_lines
+        text = np.empty(n + n_lines, dtype=np.int64)
+        text[np.arange(n) + segment] = self.symbols + n_lines
+        text[np.append(line_change, n) + np.arange(n_lines)] = np.arange(n_lines)
+
+        # The suffixes starting at a terminator sort first; the others map back to stream positions
+        text_sa = suffix_array(text)
+        text_lcp = lcp_array(text, text_sa)
+        real = text_sa[n_lines:]
+        self.sa = real - np.searchsorted(np.append(line_change, n) + np.arange(n_lines), real)
+        self.lcp = text_lcp[n_lines:].copy()
+        if n:
+            self.lcp[0] = 0
+
+        # BWT: symbol preceding each suffix, -1 at line starts (always left-maximal there)
+        prev = self.sa - 1
+        starts_line = (self.sa == 0) | (self.position_line[np.maximum(prev, 0)] != self.position_line[self.sa])
+        self.bwt = np.where(starts_line, -1, self.symbols[np.maximum(prev, 0)])
+
+        # FM-index tables over the text: C[c] = number of text symbols < c, and the
+        # BWT positions (text suffix ranks) preceded by every symbol
+        counts = np.bincount(text, minlength=n_lines + len(self.alphabet))
+        self.C = np.concatenate([[0], np.cumsum(counts)[:-1]])[n_lines:]
+        text_bwt = np.where(text_sa == 0, -1, text[np.maximum(text_sa - 1, 0)]) - n_lines
+        order = np.argsort(text_bwt, kind="stable")
+        bounds = np.searchsorted(text_bwt[order], np.arange(len(self.alphabet) + 1))
+        self._occ_positions = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.alphabet))]
+
+    @classmethod
+    def from_words(cls, corpus):
+        return cls(np.asarray(corpus.tokens), corpus.vocab.tolist(), corpus.token_line(), corpus, joiner=" ")
+
+    @classmethod
+    def from_glyphs(cls, corpus, tokenizer=DEFAULT_TOKENIZER):
+        stream = GlyphStream.from_corpus(corpus, tokenizer)
+        sep = stream.n_symbols
+        token_line = corpus.token_line()
+        # A separator follows every word; the one after a line's last word is dropped
+        ends = stream.word_offsets[1:]
+        symbols = np.insert(stream.glyphs.astype(np.int64), ends, sep)
+        lines = np.insert(token_line[stream.word_of_glyph()], ends, token_line)
+        last_in_line = np.append(token_line[1:] != token_line[:-1], True)
+        sep_positions = ends + np.arange(len(ends))
+        keep = np.ones(len(symbols), dtype=bool)
+        keep[sep_positions[last_in_line]] = False
+        return cls(symbols[keep], stream.alphabet + [WORD_SEPARATOR], lines[keep], corpus,
+                   joiner="", separator=sep)
+
+    # --- pattern search -----------------------------------------------
+
+    def encode(self, pattern):
+        """Symbol ids of a pattern: a list of words/glyphs, or a string to split."""
+        if isinstance(pattern, str):
+            if self.separator is None:
+                pattern = pattern.split()
+            else:
+                pieces = []
+                for i, word in enumerate(pattern.split(WORD_SEPARATOR)):
+                    if i:
+                        pieces.append(WORD_SEPARATOR)
+                    pieces.extend(DEFAULT_TOKENIZER.split(word))
+                pattern = pieces
+        ids = [self.lookup.get(p) for p in pattern]
+        return None if any(i is None for i in ids) else ids
+
+    def _occ(self, c, i):
+        return int(np.searchsorted(self._occ_positions[c], i))
+
+    def sa_range(self, pattern):
+        """[lo, hi) range of the suffixes (rows of self.sa) starting with the pattern."""
+        ids = self.encode(pattern)
+        if not ids:
+            return 0, 0
+        lo, hi = 0, len(self.sa) + self.n_terminators
+        for c in reversed(ids):
+            lo = self.C[c] + self._occ(c, lo)
+            hi = self.C[c] + self._occ(c, hi)
+            if lo >= hi:
+                return 0, 0
+        return int(lo) - self.n_terminators, int(hi) - self.n_terminators
+
+    def locate(self, pattern):
+        """Sorted stream positions of every occurrence (occurrences never cross a line end)."""
+        lo, hi = self.sa_range(pattern)
+        return np.sort(self.sa[lo:hi])
+
+    def count(self, pattern):
+        lo, hi = self.sa_range(pattern)
+        return hi - lo
+
+    def folios_of(self, positions):
+        lines = self.position_line[np.asarray(positions, dtype=np.int64)]
+        return self.corpus.folios[np.asarray(self.corpus.line_folio)[lines]].tolist()
+
+    def render(self, start, length):
+        return self.joiner.join(self.alphabet[c] for c in self.symbols[start:start + length])
+
+    # --- repeats ------------------------------------------------------
+
+    def longest_repeats(self, top=10):
+        """Longest sequences occurring at least twice (one entry per adjacent suffix pair)."""
+        order = np.argsort(-self.lcp, kind="stable")[:top]
+        return [(self.render(self.sa[r], self.lcp[r]), int(self.lcp[r]),
+                 self.folios_of([self.sa[r - 1], self.sa[r]])) for r in order if self.lcp[r] > 0]
+
+    def maximal_repeats(self, min_length=2, min_count=2):
+        """
+        Left- and right-maximal repeats of at least `min_length` symbols occurring
+        at least `min_count` times. Returns dicts with sequence, length, count,
+        positions and folios, longest first.
+        """
+        n = len(self.sa)
+        lcp = self.lcp.tolist() + [0]
+        out = []
+        stack = [(0, 0)]  # (lcp value, left bound)
+        for i in range(1, n + 1):
+            lb = i - 1
+            while lcp[i] < stack[-1][0]:
+                value, lb = stack.pop()
+                self._report(value, lb, i - 1, min_length, min_count, out)
+            if lcp[i] > stack[-1][0]:
+                stack.append((lcp[i], lb))
+        out.sort(key=lambda r: (-r["length"], -r["count"], r["sequence"]))
+        return out
+
+    def _report(self, length, lb, rb, min_length, min_count, out):
+        count = rb - lb + 1
+        if length < min_length or count < min_count:
+            return
+        before = self.bwt[lb:rb + 1]
+        if before.min() >= 0 and before.min() == before.max():
+            return  # always preceded by the same symbol: not left-maximal
+        start = int(self.sa[lb])
+        if self.separator is not None and (self.symbols[start] == self.separator
+                                           or self.symbols[start + length - 1] == self.separator):
+            return
+        positions = np.sort(self.sa[lb:rb + 1])
+        out.append({
+            "sequence": self.render(start, length),
+            "length": int(length),
+            "count": int(count),
+            "positions": positions,
+            "folios": sorted(set(self.folios_of(positions))),
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Repeated sequences in the word or glyph stream")
+    parser.add_argument("--glyphs", action="store_true", help="use the EVA glyph stream instead of words")
+    parser.add_argument("--min-length", type=int, default=3)
+    parser.add_argument("--min-count", type=int, default=2)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--count", help="only count/locate this sequence")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    index = SuffixIndex.from_glyphs(corpus) if args.glyphs else SuffixIndex.from_words(corpus)
+    if args.count:
+        positions = index.locate(args.count)
+        print(f"{args.count!r}: {len(positions)} occurrences in folios {sorted(set(index.folios_of(positions)))}")
+        return
+    for rep in index.maximal_repeats(args.min_length, args.min_count)[:args.top]:
+        folios = ", ".join(rep["folios"][:8]) + (" ..." if len(rep["folios"]) > 8 else "")
+        print(f"{rep['count']:5}x  {rep['sequence']:40}  {folios}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Long-running query server over the parsed corpus.
+
+Loads the corpus and the derived artifacts (glyph stream, folio x word
+counts, inverted index, morphology; the embedding vectors on first use) once
+into a Workspace and answers JSON queries over HTTP, on a TCP port or a Unix
+socket. The server is a plain asyncio loop speaking just enough HTTP/1.1
+(GET, keep-alive). Quick lookups run in a thread, so the loop keeps
+accepting connections; CPU-heavy ones (permutation tests) go to a process
+pool whose workers hold their own memory-mapped Workspace. Responses are kept
+in an LRU cache keyed by endpoint and parameters, and identical queries
+arriving while the first is still running wait for its answer.
+
+Endpoints (GET, parameters in the query string; lists are comma-separated):
+    /               corpus summary and endpoint list
+    /stats          requests served, cache hits, uptime
+    /words          word frequencies        top, folio, section, currier
+    /glyphs         glyph n-gram counts     n, top, across_words, folio, section, currier
+    /folios         per-folio counts        word (all tokens if absent), section, currier
+    /compare        discriminating words    by=section|currier|folio, a, b, permutations, top, min_count, seed
+    /kwic           concordance             word | prefix | suffix | substring, width, limit, folio, section, locus
+    /neighbors      embedding neighbors     word (or analogy=a,b,c), k
+    /morphology     affix tables            kind=prefix|stem|suffix, by=section|currier|folio, top
+
+Restart the server after re-parsing the corpus or retraining the embeddings.
+
+Usage:
+    python server.py                                   # http://127.0.0.1:8765
+    python server.py --socket /tmp/voynich.sock --workers 4
+    curl 'http://127.0.0.1:8765/kwic?word=daiin&section=Herbal&width=3'
+    curl --unix-socket /tmp/voynich.sock 'http://localhost/compare?a=Herbal&b=Biological'
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from http import HTTPStatus
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+
+from corpus_store import CORPUS_DIR
+from workspace import POOL_CONTEXT, Workspace
+
+ROOT = Path(__file__).resolve().parent
+DEFAULT_PORT = 8765
+CACHE_ENTRIES = 1024
+MAX_TOP = 10000
+
+# Set in each worker by _init_worker, so every process loads its Workspace once
+_worker_state = {}
+
+
+class QueryError(Exception):
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+# --- parameters -----------------------------------------------------------
+
+def _int(params, name, default, low=1, high=MAX_TOP):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise QueryError(f"{name} must be an integer")
+    if not low <= value <= high:
+        raise QueryError(f"{name} must be between {low} and {high}")
+    return value
+
+
+def _list(params, name):
+    value = params.get(name)
+    return None if value is None else [v.strip() for v in value.split(",") if v.strip()]
+
+
+def _choice(params, name, choices, default):
+    value = params.get(name, default)
+    if value not in choices:
+        raise QueryError(f"{name} must be one of {', '.join(choices)}")
+    return value
+
+
+def folio_mask(ws, params):
+    """Folio ids selected by the folio / section / currier parameters (None = all)."""
+    table = ws.folio_table
+    mask = np.ones(len(table), dtype=bool)
+    if 'folio' in params:
+        mask &= table['folio'].isin(_list(params, 'folio')).to_numpy()
+    for column in ('section', 'currier'):
+        if column in params:
+            wanted = _list(params, column)
+            unknown = set(wanted) - set(table[column].cat.categories)
+            if unknown:
+                raise QueryError(f"Unknown {column}: {', '.join(sorted(unknown))}")
+            mask &= table[column].isin(wanted).to_numpy()
+    return None if mask.all() else mask
+
+
+# --- shared artifacts -------------------------------------------------------
+
+def word_matrix(ws):
+    from exploratory_analysis.significance import folio_word_matrix
+    return ws.shared("folio_word_matrix", lambda: folio_word_matrix(ws.corpus).tocsc())
+
+
+def inverted_index(ws):
+    from search.inverted_index import InvertedIndex
+    return ws.shared("inverted_index", lambda: InvertedIndex(ws.corpus_dir))
+
+
+def vector_index(ws):
+    from embeddings_and_models.neighbors import VectorIndex
+    return ws.shared("vector_index", VectorIndex.load)
+
+
+def warm_up(ws):
+    """Build everything the quick endpoints use, so the first queries are fast too."""
+    for name in ("glyph_stream", "folio_table", "morphology"):
+        getattr(ws, name)
+    word_matrix(ws)
+    try:
+        inverted_index(ws)
+    except FileNotFoundError:
+        pass  # /kwic reports it when asked
+
+
+# --- endpoints ----------------------------------------------------------------
+
+def summary(ws, params):
+    """Corpus summary and the list of endpoints."""
+    corpus = ws.corpus
+    return {
+        'corpus': str(corpus.path),
+        'tokens': int(len(corpus.tokens)),
+        'types': int(len(corpus.vocab)),
+        'lines': int(corpus.n_lines),
+        'folios': int(len(corpus.folios)),
+        'endpoints': {path: handler.__doc__.strip().splitlines()[0] for path, (handler, _) in ENDPOINTS.items()},
+    }
+
+
+def words(ws, params):
+    """Word frequencies, optionally within some folios / sections / Currier languages."""
+    counts = word_matrix(ws)
+    mask = folio_mask(ws, params)
+    totals = np.asarray((counts if mask is None else counts[mask]).sum(axis=0)).ravel()
+    top = _int(params, 'top', 20)
+    order = np.argsort(-totals, kind='stable')[:top]
+    order = order[totals[order] > 0]
+    n = totals.sum()
+    return {'tokens': int(n), 'words': [{'word': w, 'count': int(c), 'freq': float(c / n)}
+                                        for w, c in zip(ws.corpus.vocab[order].tolist(), totals[order])]}
+
+
+def glyphs(ws, params):
+    """Glyph n-gram counts (inside words unless across_words=1)."""
+    from exploratory_analysis.glyphs import encode_corpus
+    from exploratory_analysis.ngrams import GlyphStream, ngram_table
+    n = _int(params, 'n', 1, high=8)
+    top = _int(params, 'top', 20)
+    within_words = params.get('across_words', '0') in ('0', 'false', 'no')
+    mask = folio_mask(ws, params)
+    if mask is None:
+        stream = ws.glyph_stream
+    else:
+        tokens = np.asarray(ws.corpus.tokens)[mask[ws.corpus.token_folio()]]
+        stream = GlyphStream.from_types(*encode_corpus(ws.corpus), tokens)
+    return {'n': n, 'ngrams': [{'ngram': g, 'count': c} for g, c in ngram_table(stream, n, within_words, top)]}
+
+
+def folios(ws, params):
+    """Per-folio counts of a word (or of all tokens), with section and Currier language."""
+    counts = word_matrix(ws)
+    table = ws.folio_table
+    folio_tokens = np.asarray(counts.sum(axis=1)).ravel()
+    if 'word' in params:
+        ids = np.flatnonzero(ws.corpus.vocab == params['word'])
+        if len(ids) == 0:
+            raise QueryError(f"Not in the vocabulary: {params['word']}", HTTPStatus.NOT_FOUND)
+        word_counts = counts[:, ids[0]].toarray().ravel()
+    else:
+        word_counts = folio_tokens
+    mask = folio_mask(ws, params)
+    rows = np.flatnonzero(folio_tokens > 0 if mask is None else mask & (folio_tokens > 0))
+    return {'folios': [{'folio': f, 'section': s, 'currier': c, 'count': int(k), 'tokens': int(t),
+                        'freq': float(k / t)}
+                       for f, s, c, k, t in zip(table['folio'].to_numpy()[rows], table['section'].to_numpy()[rows],
+                                                table['currier'].to_numpy()[rows], word_counts[rows],
+                                                folio_tokens[rows])]}
+
+
+def compare(ws, params):
+    """Words that discriminate two groups of folios (permutation test, Benjamini-Hochberg q-values)."""
+    from exploratory_analysis.significance import permutation_test
+    by = _choice(params, 'by', ('section', 'currier', 'folio'), 'section')
+    if 'a' not in params or 'b' not in params:
+        raise QueryError("compare needs the groups a and b")
+    table = ws.folio_table
+    groups = [table.loc[table[by].isin(_list(params, side)), 'folio'].tolist() for side in ('a', 'b')]
+    try:
+        result = permutation_test(ws.corpus, *groups, n_permutations=_int(params, 'permutations', 1000, high=100000),
+                                  min_count=_int(params, 'min_count', 5), n_jobs=1, seed=_int(params, 'seed', 42, low=0))
+    except ValueError as exc:
+        raise QueryError(str(exc))
+    return {'folios_a': len(groups[0]), 'folios_b': len(groups[1]),
+            'words': result.head(_int(params, 'top', 20)).to_dict(orient='records')}
+
+
+def kwic(ws, params):
+    """Keyword-in-context concordance of a word, prefix, suffix or glyph substring."""
+    queries = {kind: params[kind] for kind in ('word', 'prefix', 'suffix', 'substring') if kind in params}
+    if len(queries) != 1:
+        raise QueryError("kwic takes exactly one of word, prefix, suffix or substring")
+    try:
+        index = inverted_index(ws)
+    except FileNotFoundError as exc:
+        raise QueryError(str(exc), HTTPStatus.SERVICE_UNAVAILABLE)
+    try:
+        rows = index.kwic(**queries, width=_int(params, 'width', 4, low=0, high=50), folios=_list(params, 'folio'),
+                          section=params.get('section'), locus_prefix=params.get('locus'))
+    except ValueError as exc:
+        raise QueryError(str(exc))
+    limit = _int(params, 'limit', 100)
+    return {'hits': len(rows), 'rows': [{'locus': tag, 'left': left, 'word': word, 'right': right}
+                                        for tag, left, word, right in rows[:limit]]}
+
+
+def neighbors(ws, params):
+    """Nearest neighbors of words (or a : b :: c : ?) in the word-embedding space."""
+    k = _int(params, 'k', 10, high=1000)
+    try:
+        index = vector_index(ws)
+    except FileNotFoundError:
+        raise QueryError("No embedding vectors (run embeddings_and_models/word_embeddings.py)",
+                         HTTPStatus.SERVICE_UNAVAILABLE)
+    try:
+        if 'analogy' in params:
+            triple = _list(params, 'analogy')
+            if len(triple) != 3:
+                raise QueryError("analogy takes three words: a,b,c")
+            found = {":".join(triple): index.analogy(*triple, k=k)}
+        else:
+            query = _list(params, 'word')
+            if not query:
+                raise QueryError("neighbors needs word (or analogy)")
+            found = dict(zip(query, index.similar(query, k=k)))
+    except KeyError as exc:
+        raise QueryError(exc.args[0], HTTPStatus.NOT_FOUND)
+    return {q: [{'word': w, 'cosine': s} for w, s in result] for q, result in found.items()}
+
+
+def morphology(ws, params):
+    """Prefix / stem / suffix counts per section, Currier language or folio."""
+    from exploratory_analysis.morphology import KINDS, GROUPINGS, folio_groups
+    kind = _choice(params, 'kind', KINDS, 'suffix')
+    by = _choice(params, 'by', GROUPINGS, 'section')
+    table = ws.morphology.table(kind, folio_groups(ws, by), top=_int(params, 'top', 20))
+    return {'kind': kind, 'by': by, 'groups': [str(c) for c in table.columns],
+            'rows': [{kind: morph, 'counts': [int(c) for c in row]} for morph, row in zip(table.index, table.to_numpy())]}
+
+
+# path -> (handler, runs in the process pool)
+ENDPOINTS = {
+    '/': (summary, False),
+    '/words': (words, False),
+    '/glyphs': (glyphs, False),
+    '/folios': (folios, False),
+    '/compare': (compare, True),
+    '/kwic': (kwic, False),
+    '/neighbors': (neighbors, False),
+    '/morphology': (morphology, False),
+}
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def run_query(ws, path, params):
+    """Answer one query: (HTTP status, JSON body)."""
+    try:
+        return HTTPStatus.OK, json.dumps(ENDPOINTS[path][0](ws, params), default=_json_default).encode("utf-8")
+    except QueryError as exc:
+        return exc.status, json.dumps({'error': str(exc)}).encode("utf-8")
+
+
+def _init_worker(corpus_dir):
+    os.chdir(ROOT)
+    _worker_state['ws'] = Workspace(corpus_dir)
+
+
+def _run_in_worker(path, params):
+    return run_query(_worker_state['ws'], path, params)
+
+
+# --- server -------------------------------------------------------------------
+
+class ResultCache:
+    """LRU cache of encoded responses; concurrent identical queries share one computation."""
+
+    def __init__(self, max_entries=CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.pending = {}
+        self.hits = self.misses = 0
+
+    async def get(self, key, compute):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        if key in self.pending:
+            self.hits += 1
+            return await asyncio.shield(self.pending[key])
+        self.misses += 1
+        future = asyncio.ensure_future(compute())
+        self.pending[key] = future
+        try:
+            status, body = await asyncio.shield(future)
+        finally:
+            del self.pending[key]
+        if status == HTTPStatus.OK:
+            self.entries[key] = (status, body)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+        return status, body
+
+
+class QueryServer:
+    def __init__(self, ws, pool, cache_entries=CACHE_ENTRIES):
+        self.ws = ws
+        self.pool = pool
+        self.cache = ResultCache(cache_entries)
+        self.started = time.time()
+        self.requests = 0
+
+    def stats(self):
+        return {'requests': self.requests, 'cache_hits': self.cache.hits, 'cache_misses': self.cache.misses,
+                'cached': len(self.cache.entries), 'uptime_s': round(time.time() - self.started, 1)}
+
+    async def answer(self, method, target):
+        if method != "GET":
+            return HTTPStatus.METHOD_NOT_ALLOWED, json.dumps({'error': "only GET is supported"}).encode("utf-8")
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        params = dict(parse_qsl(url.query))
+        if path == "/stats":
+            return HTTPStatus.OK, json.dumps(self.stats()).encode("utf-8")
+        if path not in ENDPOINTS:
+            return HTTPStatus.NOT_FOUND, json.dumps({'error': f"unknown endpoint {path}"}).encode("utf-8")
+
+        loop = asyncio.get_running_loop()
+        if ENDPOINTS[path][1]:
+            compute = lambda: loop.run_in_executor(self.pool, _run_in_worker, path, params)
+        else:
+            compute = lambda: loop.run_in_executor(None, run_query, self.ws, path, params)
+        try:
+            return await self.cache.get((path, tuple(sorted(params.items()))), compute)
+        except Exception as exc:
+            return HTTPStatus.INTERNAL_SERVER_ERROR, json.dumps({'error': repr(exc)}).encode("utf-8")
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                parts = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if int(headers.get("content-length", 0) or 0):
+                    await reader.readexactly(int(headers["content-length"]))  # bodies are ignored
+
+                start = time.perf_counter()
+                if len(parts) != 3:
+                    status, body = HTTPStatus.BAD_REQUEST, json.dumps({'error': "malformed request line"}).encode("utf-8")
+                else:
+                    status, body = await self.answer(parts[0], parts[1])
+                self.requests += 1
+                keep_alive = (len(parts) == 3 and parts[2] == "HTTP/1.1"
+                              and headers.get("connection", "").lower() != "close")
+                writer.write((f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                              f"Content-Type: application/json\r\n"
+                              f"Content-Length: {len(body)}\r\n"
+                              f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+                print(f"{parts[0] if parts else '-'} {parts[1] if len(parts) > 1 else '-'} {status.value} "
+                      f"{(time.perf_counter() - start) * 1000:.1f}ms", flush=True)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host="127.0.0.1", port=DEFAULT_PORT, socket_path=None, workers=None,
+                cache_entries=CACHE_ENTRIES, corpus_dir: Path = CORPUS_DIR):
+    ws = Workspace(corpus_dir)
+    start = time.perf_counter()
+    warm_up(ws)
+    print(f"Corpus loaded in {time.perf_counter() - start:.1f}s ({len(ws.corpus.tokens)} tokens)", flush=True)
+
+    workers = workers or max(1, min(4, os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=POOL_CONTEXT, initializer=_init_worker, initargs=(corpus_dir,)) as pool:
+        app = QueryServer(ws, pool, cache_entries)
+        if socket_path is not None:
+            Path(socket_path).unlink(missing_ok=True)
+            server = await asyncio.start_unix_server(app.handle, path=socket_path)
+            where = f"unix:{socket_path}"
+        else:
+            server = await asyncio.start_server(app.handle, host, port)
+            where = f"http://{host}:{port}"
+        print(f"Serving on {where} ({workers} worker processes)", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if socket_path is not None:
+                Path(socket_path).unlink(missing_ok=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve corpus queries from one warm process")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="listen on this Unix socket instead of a TCP port")
+    parser.add_argument("--workers", type=int, default=None, help="processes for the CPU-heavy queries")
+    parser.add_argument("--cache", type=int, default=CACHE_ENTRIES, help="responses kept in the LRU cache")
+    args = parser.parse_args()
+
+    os.chdir(ROOT)  # corpus, index and embeddings use paths relative to the repository root
+    try:
+        asyncio.run(serve(args.host, args.port, args.socket, args.workers, args.cache))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
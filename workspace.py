@@ -0,0 +1,105 @@
+"""
+Shared, lazily built corpus artifacts.
+
+A Workspace loads the corpus once and builds derived tables (token table with
+sections, folio table, glyph stream, morphology, word lists per line) the first time a
+stage asks for them; later stages in the same process reuse them. Every
+artifact has its own lock, so stages running in parallel threads share one
+copy and building one artifact does not hold up the others.
+
+Stages run in threads, so process pools must not fork this process: they use
+POOL_CONTEXT (forkserver, or spawn where there is none). Cached files they
+share are written with atomic_write.
+"""
+
+import multiprocessing
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from corpus_store import CORPUS_DIR, load_corpus
+
+POOL_CONTEXT = multiprocessing.get_context(
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn")
+
+
+@contextmanager
+def atomic_write(path):
+    """
+    Binary file handle whose contents replace `path` only when the block ends,
+    so concurrent readers (server threads, pipeline stages, other runs) never
+    load a half-written file. The temporary "<name>.<random>.tmp" next to
+    `path` is unique per writer and removed if the block fails.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            yield fh
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+class Workspace:
+    def __init__(self, corpus_dir: Path = CORPUS_DIR):
+        self.corpus_dir = Path(corpus_dir)
+        self._artifacts = {}
+        self._locks = {}
+        self._lock = threading.Lock()  # guards the two dicts, never held while building
+        # pyplot keeps global state, so figures are drawn one stage at a time
+        self.plot_lock = threading.Lock()
+
+    def shared(self, name, build):
+        """Return the artifact `name`, building it with build() on first use."""
+        with self._lock:
+            if name in self._artifacts:
+                return self._artifacts[name]
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            with self._lock:
+                if name in self._artifacts:
+                    return self._artifacts[name]  # built by another thread meanwhile
+            value = build()
+            with self._lock:
+                self._artifacts[name] = value
+            return value
+
+    def reset(self):
+        """Forget everything (e.g. after the corpus was re-parsed)."""
+        with self._lock:
+            self._artifacts.clear()
+
+    @property
+    def corpus(self):
+        return self.shared("corpus", lambda: load_corpus(self.corpus_dir))
+
+    @property
+    def folio_table(self):
+        from exploratory_analysis.sections import folio_table
+        return self.shared("folio_table", lambda: folio_table(self.corpus))
+
+    @property
+    def token_table(self):
+        from exploratory_analysis.sections import token_table
+        return self.shared("token_table", lambda: token_table(self.corpus))
+
+    @property
+    def glyph_stream(self):
+        from exploratory_analysis.ngrams import GlyphStream
+        return self.shared("glyph_stream", lambda: GlyphStream.from_corpus(self.corpus))
+
+    @property
+    def morphology(self):
+        from exploratory_analysis.morphology import segment_corpus
+        return self.shared("morphology", lambda: segment_corpus(self.corpus))
+
+    @property
+    def sentences(self):
+        """Word strings per non-empty line."""
+        corpus = self.corpus
+        return self.shared("sentences",
+                           lambda: [corpus.vocab[ids].tolist() for ids in corpus.lines() if len(ids)])